@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+class EngineConfig(AppConfig):
+    """
+    Application config for the engine, providing its management commands.
+    """
+    name         = 'lense.engine.api'
+    label        = 'lense_engine'
+    verbose_name = 'Lense Engine'
@@ -0,0 +1,88 @@
+import re
+import logging
+from time import time
+from Queue import Queue
+from json import dumps as json_dumps
+from logging.handlers import RotatingFileHandler
+
+# Django Libraries
+from django.conf import settings
+
+# Lense Libraries
+from lense.engine.api.core.log import QueueHandler, QueueWriter
+
+# Request data keys that are never captured, matched anywhere in the key
+SENSITIVE_KEYS = re.compile(r'passw(or)?d|passphrase|secret|token|credential|apikey|(^|[_\-.])key($|s?[_\-.]|s$)', re.I)
+
+def sanitize(data):
+    """
+    Strip credentials from request data. Keys are sensitive if they contain
+    a credential name in any case, i.e. "new_password" or "SMTP_Secret".
+
+    :param data: The request data
+    :type  data: mixed
+    :rtype: mixed
+    """
+    if isinstance(data, dict):
+        return dict([(k, '<redacted>' if SENSITIVE_KEYS.search(unicode(k)) else sanitize(v)) for k, v in data.iteritems()])
+    if isinstance(data, list):
+        return [sanitize(v) for v in data]
+    return data
+
+def shape(data):
+    """
+    Describe the shape of request data: keys and value types.
+
+    :param data: The request data
+    :type  data: mixed
+    :rtype: mixed
+    """
+    if isinstance(data, dict):
+        return dict([(k, shape(v)) for k, v in data.iteritems()])
+    if isinstance(data, list):
+        return [shape(data[0])] if data else []
+    return type(data).__name__
+
+class TrafficCapture(object):
+    """
+    Write sanitized request records to a rotating NDJSON file for replay. Records
+    are written by a background thread so capture adds no file I/O to requests.
+    """
+    def __init__(self):
+        handler = RotatingFileHandler(settings.API_CAPTURE_FILE,
+            maxBytes    = settings.API_CAPTURE_MAX_BYTES,
+            backupCount = settings.API_CAPTURE_BACKUPS)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+
+        # Capture logger, writing through a queue
+        queue       = Queue(settings.API_LOG_QUEUE)
+        self.writer = QueueWriter(queue, [handler])
+        self.writer.start()
+        self.logger = logging.getLogger('lense.engine.capture')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        self.logger.addHandler(QueueHandler(queue))
+
+    def record(self, code, time_ms):
+        """
+        Capture the current request.
+
+        :param    code: The response status code
+        :type     code: int
+        :param time_ms: The request processing time in milliseconds
+        :type  time_ms: int
+        """
+        self.logger.info(json_dumps({
+            'ts': time(),
+            'method': LENSE.REQUEST.method,
+            'path': LENSE.REQUEST.path,
+            'data': sanitize(LENSE.REQUEST.data),
+            'shape': shape(LENSE.REQUEST.data),
+            'user': LENSE.REQUEST.USER.name,
+            'group': LENSE.REQUEST.USER.group,
+            'code': code,
+            'time_ms': time_ms
+        }))
+
+# Traffic capture, if enabled
+CAPTURE = None if not settings.API_CAPTURE else TrafficCapture()
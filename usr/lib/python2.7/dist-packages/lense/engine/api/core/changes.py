@@ -0,0 +1,178 @@
+from time import time, sleep
+from datetime import timedelta
+from threading import BoundedSemaphore, local
+from json import dumps as json_dumps, loads as json_loads
+
+# Django Libraries
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+# Lense Libraries
+from lense.engine.api.core.shared import SharedTable
+from lense.engine.api.objects.changes.models import APIChange
+
+# Shared table key holding the latest change sequence
+LATEST_KEY = 'changes:latest'
+
+# Changes deferred until the current transaction commits
+_PENDING   = local()
+
+class ChangeFeed(object):
+    """
+    Write and read the change journal. Writers publish the latest sequence
+    number to a shared memory table, so long-polling readers on any engine
+    process of the host see new changes without querying the database.
+    Changes written on other hosts are found by also querying the journal at
+    the journal poll interval while waiting.
+
+    Sequence numbers are assigned when a journal row is inserted, which is not
+    necessarily the order rows become visible in. Changes made inside a
+    transaction are therefore only journaled once it has committed, and
+    readers never move past a gap in the sequence until the gap is older than
+    the gap wait: a newer row may have committed before an older one.
+    """
+    def __init__(self):
+        self.table   = SharedTable(settings.API_CHANGES_STORE, slots=64)
+        self.waiters = BoundedSemaphore(settings.API_CHANGES_WAITERS)
+
+    def _insert(self, change):
+        """
+        Insert a journal row and publish its sequence.
+        """
+        change = APIChange.objects.create(**change)
+        self.table.update(LATEST_KEY, lambda v: (max(change.seq, 0 if not v else v[0]), time(), None))
+        return change.seq
+
+    def record(self, obj_type, uuid, action, data=None):
+        """
+        Append a change to the journal. Inside a transaction the change is held
+        back until flush() is called once the transaction has committed, and
+        no sequence number is returned.
+
+        :param obj_type: The object type (user, group, handler)
+        :type  obj_type: str
+        :param     uuid: The object UUID
+        :type      uuid: str
+        :param   action: The change action
+        :type    action: str
+        :param     data: Changed attributes
+        :type      data: dict
+        :rtype: int|None
+        """
+        change = {
+            'type': obj_type,
+            'uuid': uuid,
+            'action': action,
+            'data': json_dumps(data or {}),
+            'user': LENSE.REQUEST.USER.name
+        }
+        if connection.in_atomic_block:
+            if not hasattr(_PENDING, 'changes'):
+                _PENDING.changes = []
+            _PENDING.changes.append(change)
+            return None
+        return self._insert(change)
+
+    def flush(self, committed=True):
+        """
+        Journal the changes held back during a transaction, or drop them if it
+        was rolled back.
+
+        :param committed: If the transaction was committed
+        :type  committed: bool
+        """
+        changes, _PENDING.changes = getattr(_PENDING, 'changes', []), []
+        if committed:
+            for change in changes:
+                self._insert(change)
+
+    def latest(self):
+        """
+        Get the latest published change sequence.
+
+        :rtype: int
+        """
+        values = self.table.get(LATEST_KEY)
+        return 0 if not values else int(values[0])
+
+    def read(self, seq, limit=None):
+        """
+        Read journal rows after a sequence number, stopping at the first recent
+        gap in the sequence.
+
+        :param   seq: The last sequence seen by the reader
+        :type    seq: int
+        :param limit: Maximum number of rows to read
+        :type  limit: int
+        :rtype: list
+        """
+        rows    = list(APIChange.objects.filter(seq__gt=seq).order_by('seq')[:limit or settings.API_CHANGES_LIMIT])
+        horizon = timezone.now() - timedelta(seconds=settings.API_CHANGES_GAP_WAIT)
+        for i, row in enumerate(rows):
+            previous = seq if not i else rows[i - 1].seq
+            if previous and row.seq != previous + 1 and row.created > horizon:
+                return rows[:i]
+        return rows
+
+    def since(self, seq, types=None, limit=None):
+        """
+        Get changes after a sequence number. Returns the sequence to resume
+        from, which also moves past changes of other types, and the changes.
+
+        :param   seq: The last sequence seen by the client
+        :type    seq: int
+        :param types: Optional list of object types to include
+        :type  types: list
+        :rtype: tuple
+        """
+        rows = self.read(seq, limit)
+        return (seq if not rows else rows[-1].seq), [{
+            'seq': c.seq,
+            'type': c.type,
+            'uuid': c.uuid,
+            'action': c.action,
+            'data': json_loads(c.data),
+            'user': c.user,
+            'created': c.created.isoformat()
+        } for c in rows if not types or c.type in types]
+
+    def poll(self, seq, types=None, limit=None, timeout=0):
+        """
+        Get changes after a sequence number, blocking until a matching change
+        is available or the timeout expires. The shared memory table is checked
+        at the poll interval for changes published on this host, the journal at
+        the journal poll interval for changes from other hosts. The number of
+        waiting requests is capped; over the cap, requests return without
+        waiting.
+
+        :param     seq: The last sequence seen by the client
+        :type      seq: int
+        :param   types: Optional list of object types to include
+        :type    types: list
+        :param timeout: Maximum time to wait in seconds
+        :type  timeout: int
+        :rtype: tuple
+        """
+        cursor, changes = self.since(seq, types, limit)
+        if changes or not timeout or not self.waiters.acquire(False):
+            return cursor, changes
+        try:
+            deadline = time() + timeout
+            journal  = time() + settings.API_CHANGES_JOURNAL_POLL / 1000.0
+            while not changes and time() < deadline:
+                if self.latest() > cursor or time() >= journal:
+                    journal         = time() + settings.API_CHANGES_JOURNAL_POLL / 1000.0
+                    previous        = cursor
+                    cursor, changes = self.since(cursor, types, limit)
+
+                    # Changes of other types only, or held back behind a gap
+                    if changes or cursor != previous:
+                        continue
+                sleep(settings.API_CHANGES_POLL / 1000.0)
+            return cursor, changes
+        finally:
+            self.waiters.release()
+
+# Change journal
+CHANGES = ChangeFeed()
@@ -0,0 +1,104 @@
+from threading import Lock, Event
+
+# Django Libraries
+from django.conf import settings
+from django.http import HttpResponse
+
+# Lense Libraries
+from lense.engine.api.core.metrics import METRICS
+from lense.engine.api.core.context import get_context
+
+class Flight(object):
+    """
+    A single in-flight execution shared by identical requests.
+    """
+    def __init__(self):
+        self.done   = Event()
+        self.result = None
+        self.error  = None
+
+class RequestCoalescer(object):
+    """
+    Collapse identical concurrent GET requests into a single execution. The
+    first request runs the handler; requests with the same handler, data and
+    ACL scope arriving while it runs wait for it and get a copy of the same
+    serialized response. Followers that wait longer than the timeout run the
+    request themselves.
+
+    The ACL scope decides who may share a result: "user" only shares between
+    requests of the same user and group, "group" between users of the same
+    group, "global" between all users, and "none" disables coalescing for a
+    handler.
+    """
+    def __init__(self):
+        self.lock    = Lock()
+        self.flights = {}
+
+    def _key(self, context):
+        """
+        Construct the coalescing key for the current request.
+        """
+        scope = settings.API_COALESCE_HANDLERS.get(context.handler, settings.API_COALESCE_SCOPE)
+        if scope == 'none':
+            return None
+        return (
+            context.handler,
+            context.data_key,
+            None if scope == 'global' else LENSE.REQUEST.USER.group,
+            None if scope != 'user' else LENSE.REQUEST.USER.name
+        )
+
+    def _follow(self, handler, flight, func):
+        """
+        Wait for the leading request and copy its response.
+        """
+        if not flight.done.wait(settings.API_COALESCE_TIMEOUT):
+            METRICS.incr(handler, coalesce_timeouts=1)
+            return func()
+        METRICS.incr(handler, coalesced=1)
+        if flight.error:
+            raise flight.error
+        content, status, content_type = flight.result
+        return HttpResponse(content, status=status, content_type=content_type)
+
+    def run(self, func):
+        """
+        Run a GET request, sharing the execution with identical concurrent
+        requests.
+
+        :param func: Runs the request and returns the response
+        :type  func: callable
+        :rtype: HttpResponse
+        """
+        context = get_context()
+        handler = context.handler
+        key     = self._key(context)
+        if key is None:
+            return func()
+
+        # Join an in-flight execution, or lead one
+        with self.lock:
+            flight = self.flights.get(key)
+            if flight:
+                leader = False
+            else:
+                leader = True
+                flight = self.flights[key] = Flight()
+        if not leader:
+            return self._follow(handler, flight, func)
+
+        # Leading request
+        try:
+            response = func()
+            flight.result = (response.content, response.status_code, response.get('Content-Type'))
+            return response
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+            flight.done.set()
+
+# GET request coalescing, if enabled
+COALESCER = None if not settings.API_COALESCE else RequestCoalescer()
@@ -0,0 +1,157 @@
+from time import time
+from threading import local
+from json import dumps as json_dumps
+
+# Lense Libraries
+from lense.engine.api.core.metrics import METRICS
+
+# Metrics key for request context counters
+METRICS_KEY = 'request:context'
+
+# Request context of the current thread
+_CURRENT    = local()
+
+# Metrics key for requests that did not map to a handler
+UNMATCHED   = 'unmatched'
+
+class RequestContext(object):
+    """
+    Engine side values derived from the request being dispatched, the time
+    spent in each dispatch phase, and the costly pieces of the request that
+    were actually built: engine setup, authentication, ACL checks, the
+    normalized request data and the client details. Each piece is counted
+    at most once per request in the request:context metrics, next to the
+    number of requests, when the request ends.
+
+    Public requests are answered without engine setup, so their values are
+    derived from the Django request instead of LENSE.REQUEST.
+    """
+    def __init__(self, request):
+        self.request = request
+        self.phases  = {}
+        self.pieces  = set()
+
+        # Set once the request is mapped to a handler / for public requests
+        self.mapped  = False
+        self.public  = False
+
+    def materialize(self, piece):
+        """
+        Record that a piece of the request was built.
+
+        :param piece: The piece name
+        :type  piece: str
+        """
+        self.pieces.add(piece)
+
+    def finish(self):
+        """
+        Count the request and the pieces built for it.
+        """
+        METRICS.incr(METRICS_KEY, requests=1, **dict([(piece, 1) for piece in self.pieces]))
+
+    def phase(self, name, start):
+        """
+        Record the time spent in a dispatch phase.
+
+        :param  name: The phase name
+        :type   name: str
+        :param start: The phase start time
+        :type  start: float
+        """
+        self.phases['{0}_ms'.format(name)] = int(round((time() - start) * 1000))
+
+    @property
+    def method(self):
+        """
+        The request method.
+        """
+        return self.request.method if self.public else LENSE.REQUEST.method
+
+    @property
+    def path(self):
+        """
+        The request path.
+        """
+        return self.request.path.strip('/') if self.public else LENSE.REQUEST.path
+
+    @property
+    def handler(self):
+        """
+        The handler key, i.e. METHOD:path, or "unmatched" for requests that
+        did not map to a handler. Metrics are kept per handler key, so client
+        supplied paths never become keys.
+        """
+        if not self.mapped:
+            return UNMATCHED
+        return '{0}:{1}'.format(self.method, self.path)
+
+    @property
+    def data_key(self):
+        """
+        The request data normalized to a string, for request identity.
+        """
+        self.materialize('data')
+        return json_dumps(LENSE.REQUEST.data, sort_keys=True)
+
+    @property
+    def client(self):
+        """
+        Client details for request stats.
+        """
+        self.materialize('client')
+        if self.public:
+            return {
+                'client_ip': self.request.META.get('REMOTE_ADDR'),
+                'client_user': None,
+                'client_group': None,
+                'endpoint': self.request.META.get('HTTP_HOST'),
+                'user_agent': self.request.META.get('HTTP_USER_AGENT'),
+                'req_size': int(self.request.META.get('CONTENT_LENGTH') or 0)
+            }
+        return {
+            'client_ip': LENSE.REQUEST.client,
+            'client_user': LENSE.REQUEST.USER.name,
+            'client_group': LENSE.REQUEST.USER.group,
+            'endpoint': LENSE.REQUEST.host,
+            'user_agent': LENSE.REQUEST.agent,
+            'req_size': int(LENSE.REQUEST.size)
+        }
+
+def start_context(request):
+    """
+    Start the context of a dispatched request.
+
+    :param request: The Django request object
+    :type  request: HttpRequest
+    :rtype: RequestContext
+    """
+    _CURRENT.context = RequestContext(request)
+    return _CURRENT.context
+
+def end_context():
+    """
+    End the context of the dispatched request.
+    """
+    context, _CURRENT.context = get_context(), None
+    if context:
+        context.finish()
+
+def materialize(piece):
+    """
+    Record that a piece of the dispatched request was built, if any.
+
+    :param piece: The piece name
+    :type  piece: str
+    """
+    context = get_context()
+    if context:
+        context.materialize(piece)
+
+def get_context():
+    """
+    Get the context of the request dispatched on this thread.
+
+    :rtype: RequestContext|None
+    """
+    return getattr(_CURRENT, 'context', None)
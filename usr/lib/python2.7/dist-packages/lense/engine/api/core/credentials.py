@@ -0,0 +1,244 @@
+import os
+import sys
+import signal
+import subprocess
+from time import time
+from struct import Struct
+from select import select
+from threading import Lock
+from Queue import Queue, Empty
+from cPickle import dumps as pickle_dumps, loads as pickle_loads, HIGHEST_PROTOCOL
+
+# Django Libraries
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.contrib.auth.hashers import make_password
+
+# Lense Libraries
+from lense.common.exceptions import RequestError
+from lense.engine.api.core.metrics import METRICS
+
+# Metrics key for the credentials pool
+METRICS_KEY = 'pool:credentials'
+
+# Module run by the worker processes
+WORKER_MODULE = 'lense.engine.api.core.credentials'
+
+# Length prefix of messages exchanged with the worker processes
+FRAME = Struct('>I')
+
+def _hash_password(raw):
+    return make_password(raw)
+
+def _check_strength(raw):
+    return LENSE.AUTH.check_pw_strength(raw)
+
+# Operations run by the worker processes
+OPERATIONS = {
+    'ping': lambda: True,
+    'hash_password': _hash_password,
+    'check_strength': _check_strength
+}
+
+def _write(stream, message):
+    """
+    Write a length prefixed message to a pipe.
+    """
+    data = pickle_dumps(message, HIGHEST_PROTOCOL)
+    stream.write(FRAME.pack(len(data)) + data)
+    stream.flush()
+
+def _read(fd, size, deadline=None):
+    """
+    Read exactly size bytes from a pipe descriptor, waiting until the deadline
+    if given. Returns None on timeout or end of file.
+    """
+    data = ''
+    while len(data) < size:
+        if deadline is not None:
+            remaining = deadline - time()
+            if remaining <= 0 or not select([fd], [], [], remaining)[0]:
+                return None
+        chunk = os.read(fd, size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+class CredentialsWorker(object):
+    """
+    A credentials worker process. Workers are started as new Python processes
+    rather than forked from the engine process, so starting one from a process
+    with running threads is safe. Workers run the configured interpreter, not
+    sys.executable, which is the web server binary under mod_wsgi.
+    """
+    def __init__(self):
+        env = dict(os.environ)
+        env.setdefault('DJANGO_SETTINGS_MODULE', 'lense.engine.api.core.settings')
+        self.process = subprocess.Popen([settings.API_CREDENTIALS_PYTHON, '-m', WORKER_MODULE],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, close_fds=True, env=env)
+
+    def call(self, name, args, timeout):
+        """
+        Run an operation in the worker and wait for the result. Returns a tuple
+        of (status, value), or None if the worker timed out or exited.
+        """
+        try:
+            _write(self.process.stdin, (name, args))
+        except (IOError, OSError):
+            return None
+        deadline = time() + timeout
+        fd       = self.process.stdout.fileno()
+        header   = _read(fd, FRAME.size, deadline)
+        data     = None if header is None else _read(fd, FRAME.unpack(header)[0], deadline)
+        return None if data is None else pickle_loads(data)
+
+    def kill(self):
+        """
+        Kill the worker process.
+        """
+        try:
+            self.process.kill()
+        except OSError:
+            pass
+        self.process.wait()
+
+class CredentialsPool(object):
+    """
+    Run CPU heavy credential operations (password hashing and strength checks) in a bounded pool of worker processes, so they don't hold
+    the GIL of the request threads in the engine process. Request threads
+    only wait on the result. Requests are rejected with a 503 once the number
+    of pending operations reaches the configured queue depth, or if no result
+    arrives within the credentials timeout. A worker that timed out is killed
+    and replaced.
+    """
+    def __init__(self):
+        self.lock    = Lock()
+        self.idle    = None
+        self.pending = 0
+
+    def start(self):
+        """
+        Start the worker processes. Fails if the worker interpreter is missing,
+        or if a started worker does not answer within the credentials timeout.
+        """
+        with self.lock:
+            if self.idle or not settings.API_CREDENTIALS_WORKERS:
+                return
+            if not os.access(settings.API_CREDENTIALS_PYTHON, os.X_OK):
+                raise ImproperlyConfigured('Credentials worker interpreter {0} is not executable, set credentials.python'.format(settings.API_CREDENTIALS_PYTHON))
+            workers = [CredentialsWorker() for i in range(settings.API_CREDENTIALS_WORKERS)]
+            for worker in workers:
+                if worker.call('ping', (), settings.API_CREDENTIALS_TIMEOUT) != ('ok', True):
+                    for w in workers:
+                        w.kill()
+                    raise ImproperlyConfigured('Credentials worker {0} -m {1} did not start'.format(settings.API_CREDENTIALS_PYTHON, WORKER_MODULE))
+            self.idle = Queue()
+            for worker in workers:
+                self.idle.put(worker)
+
+    def _call(self, name, args, deadline):
+        """
+        Run an operation on an idle worker.
+        """
+        try:
+            worker = self.idle.get(timeout=max(0, deadline - time()))
+        except Empty:
+            return None
+        result = None
+        try:
+            result = worker.call(name, args, max(0, deadline - time()))
+            return result
+        finally:
+            if result is None:
+                METRICS.incr(METRICS_KEY, timeouts=1)
+                worker.kill()
+                worker = CredentialsWorker()
+            self.idle.put(worker)
+
+    def _run(self, name, *args):
+        """
+        Run a credential operation in the pool and wait for the result.
+        """
+        if not settings.API_CREDENTIALS_WORKERS:
+            return OPERATIONS[name](*args)
+        self.start()
+
+        # Admit the operation
+        with self.lock:
+            if self.pending >= settings.API_CREDENTIALS_QUEUE:
+                METRICS.incr(METRICS_KEY, rejected=1)
+                raise RequestError('Credentials pool busy, try again later', code=503)
+            self.pending += 1
+            METRICS.gauge(METRICS_KEY, queue_depth=self.pending)
+
+        # Wait for the result
+        start = time()
+        try:
+            result = self._call(name, args, start + settings.API_CREDENTIALS_TIMEOUT)
+        finally:
+            with self.lock:
+                self.pending -= 1
+                METRICS.gauge(METRICS_KEY, queue_depth=self.pending)
+            METRICS.incr(METRICS_KEY, tasks=1, wait_ms=int(round((time() - start) * 1000)))
+        if result is None:
+            raise RequestError('Credentials operation timed out, try again later', code=503)
+        status, value = result
+        if status == 'error':
+            raise value
+        return value
+
+    def hash_password(self, raw):
+        """
+        Hash a raw password for storage.
+
+        :param raw: The raw password
+        :type  raw: str
+        :rtype: str
+        """
+        return self._run('hash_password', raw)
+
+    def check_strength(self, raw):
+        """
+        Check that a raw password meets the strength requirements.
+
+        :param raw: The raw password
+        :type  raw: str
+        :rtype: bool
+        """
+        return self._run('check_strength', raw)
+
+def work():
+    """
+    Credentials worker process loop. Runs operations read from stdin and
+    writes the results to stdout until stdin is closed.
+    """
+
+    # Keep stdout for results, anything else printed goes to stderr
+    stdin, stdout = sys.stdin.fileno(), os.fdopen(os.dup(1), 'wb')
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+
+    # Leave interrupts to the engine process
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    from lense.common import init_project
+    init_project('ENGINE')
+    import django
+    django.setup()
+    while True:
+        header = _read(stdin, FRAME.size)
+        data   = None if header is None else _read(stdin, FRAME.unpack(header)[0])
+        if data is None:
+            return
+        name, args = pickle_loads(data)
+        try:
+            result = ('ok', OPERATIONS[name](*args))
+        except Exception as e:
+            result = ('error', RuntimeError(str(e)))
+        _write(stdout, result)
+
+# Credentials worker pool
+CREDENTIALS = CredentialsPool()
+
+if __name__ == '__main__':
+    work()
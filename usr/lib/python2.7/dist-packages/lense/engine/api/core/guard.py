@@ -0,0 +1,345 @@
+import os
+from time import time, sleep
+from collections import deque
+from fcntl import flock, LOCK_EX, LOCK_UN
+from threading import Thread, Lock, BoundedSemaphore
+from json import dumps as json_dumps, loads as json_loads
+
+# Django Libraries
+from django.conf import settings
+from django.db import OperationalError, InterfaceError
+
+# Lense Libraries
+from lense.common.exceptions import RequestError
+from lense.engine.api.core.log import LOG
+from lense.engine.api.core.pool import PoolTask
+from lense.engine.api.core.metrics import METRICS
+from lense.engine.api.core.tracing import TRACER, KIND_CLIENT
+
+# LDAP client, if installed
+try:
+    import ldap
+except ImportError:
+    ldap = None
+
+# Circuit breaker states
+CLOSED    = 'closed'
+OPEN      = 'open'
+HALF_OPEN = 'half_open'
+
+class DependencyTimeout(Exception):
+    """
+    Raised when a guarded call does not finish within its timeout.
+    """
+    pass
+
+class Dependency(object):
+    """
+    Guard for an external dependency: a failure rate circuit breaker with
+    half-open probing, and an optional call timeout.
+
+    The breaker opens once at least the minimum number of calls in the window
+    were made and the share of failed calls reaches the failure rate. While
+    open, calls fail fast. After the reset timeout a single probe call is let
+    through; it closes the breaker on success and re-opens it on failure.
+
+    Calls with a timeout run on a separate thread, and the caller stops
+    waiting once the timeout expires. A limited number of calls may be in
+    flight per dependency, so a hanging dependency can hold at most that many
+    threads.
+    """
+    def __init__(self, name, timeout=None, errors=(Exception,)):
+        self.name     = name
+        self.timeout  = timeout
+        self.errors   = errors
+        self.key      = 'guard:{0}'.format(name)
+        self.lock     = Lock()
+        self.state    = CLOSED
+        self.opened   = None
+        self.probing  = False
+        self.outcomes = deque(maxlen=settings.API_GUARD_WINDOW)
+        self.inflight = BoundedSemaphore(settings.API_GUARD_MAX_INFLIGHT)
+
+    def _set(self, state):
+        """
+        Change the breaker state. Called with the lock held.
+        """
+        if state == self.state:
+            return
+        LOG.warning('Dependency {0} circuit breaker {1} -> {2}', self.name, self.state, state)
+        self.state  = state
+        self.opened = time() if state == OPEN else self.opened
+        METRICS.gauge(self.key, state=state)
+
+    def allow(self):
+        """
+        Check if a call may be made now.
+
+        :rtype: bool
+        """
+        with self.lock:
+            if self.state == OPEN and (time() - self.opened) >= settings.API_GUARD_RESET:
+                self._set(HALF_OPEN)
+            if self.state == HALF_OPEN and not self.probing:
+                self.probing = True
+                return True
+            return self.state == CLOSED
+
+    def success(self):
+        with self.lock:
+            self.probing = False
+            if self.state == HALF_OPEN:
+                self.outcomes.clear()
+                self._set(CLOSED)
+            self.outcomes.append(True)
+        METRICS.incr(self.key, calls=1)
+
+    def failure(self):
+        with self.lock:
+            self.probing = False
+            self.outcomes.append(False)
+            if self.state == HALF_OPEN:
+                self._set(OPEN)
+            elif len(self.outcomes) >= settings.API_GUARD_MIN_CALLS:
+                if self.outcomes.count(False) >= settings.API_GUARD_FAILURE_RATE * len(self.outcomes):
+                    self._set(OPEN)
+        METRICS.incr(self.key, calls=1, failures=1)
+
+    def _timed(self, func, args, kwargs):
+        """
+        Run a call on a separate thread and wait for it up to the timeout.
+        """
+        task = PoolTask(func, args, kwargs)
+        def _run():
+            try:
+                task.run()
+            finally:
+                self.inflight.release()
+        thread = Thread(target=_run, name='lense-guard-{0}'.format(self.name))
+        thread.daemon = True
+        thread.start()
+        if not task.done.wait(self.timeout):
+            raise DependencyTimeout('{0} call timed out after {1}s'.format(self.name, self.timeout))
+        return task.wait()
+
+    def call(self, func, *args, **kwargs):
+        """
+        Make a guarded call. Raises a 503 request error if the breaker is open,
+        too many calls are in flight, or the call times out. Only exceptions of
+        the guarded error types count as dependency failures.
+
+        :param func: The function to call
+        :type  func: callable
+        :rtype: mixed
+        """
+        if self.timeout and not self.inflight.acquire(False):
+            METRICS.incr(self.key, rejected=1)
+            raise RequestError('Dependency {0} is not responding, too many calls in flight'.format(self.name), code=503)
+        if not self.allow():
+            if self.timeout:
+                self.inflight.release()
+            METRICS.incr(self.key, rejected=1)
+            raise RequestError('Dependency {0} is unavailable'.format(self.name), code=503)
+        try:
+            if not self.timeout:
+                retval = func(*args, **kwargs)
+            else:
+                retval = self._timed(func, args, kwargs)
+        except DependencyTimeout as e:
+            METRICS.incr(self.key, timeouts=1)
+            self.failure()
+            raise RequestError(str(e), code=503)
+        except self.errors:
+            self.failure()
+            raise
+        except Exception:
+            self.success()
+            raise
+        self.success()
+        return retval
+
+    def status(self):
+        """
+        Get the breaker state.
+
+        :rtype: dict
+        """
+        with self.lock:
+            calls = len(self.outcomes)
+            return {
+                'state': self.state,
+                'calls': calls,
+                'failure_rate': 0.0 if not calls else round(self.outcomes.count(False) / float(calls), 2),
+                'opened': None if not self.opened else int(self.opened)
+            }
+
+class MailSpool(object):
+    """
+    Emails that could not be sent are spooled to a file and retried from a
+    background thread once the SMTP dependency accepts calls again. The spool
+    is shared by all engine processes; a retry takes over everything spooled
+    so far, and anything that still fails is spooled again.
+
+    Spooled emails may carry credentials (new account and password reset
+    mails), so the spool is only readable by its owner, a retry removes
+    every email from it, and emails are dropped once they are older than the
+    maximum age or have been tried the maximum number of times.
+    """
+    def __init__(self):
+        self.lock   = Lock()
+        self.thread = None
+
+    def _open(self, flags):
+        """
+        Open the spool file, restricting it to its owner.
+        """
+        fd = os.open(settings.API_GUARD_MAIL_SPOOL, flags | os.O_CREAT, 0o600)
+        os.fchmod(fd, 0o600)
+        return fd
+
+    def put(self, args, queued=None, attempts=0):
+        """
+        Spool an email.
+
+        :param     args: The LENSE.MAIL.send arguments
+        :type      args: list
+        :param   queued: When the email was first spooled
+        :type    queued: float
+        :param attempts: Failed retries so far
+        :type  attempts: int
+        """
+        self.start()
+        with os.fdopen(self._open(os.O_WRONLY | os.O_APPEND), 'a') as spool:
+            flock(spool, LOCK_EX)
+            try:
+                spool.write(json_dumps({
+                    'args': args,
+                    'queued': queued or time(),
+                    'attempts': attempts
+                }) + '\n')
+                spool.flush()
+            finally:
+                flock(spool, LOCK_UN)
+        METRICS.incr(GUARDS['smtp'].key, spooled=1)
+
+    def _take(self):
+        """
+        Take over the spooled emails, leaving the spool empty.
+        """
+        if not os.path.isfile(settings.API_GUARD_MAIL_SPOOL):
+            return []
+        with os.fdopen(self._open(os.O_RDWR), 'r+') as spool:
+            flock(spool, LOCK_EX)
+            try:
+                emails = [json_loads(line) for line in spool if line.strip()]
+                spool.seek(0)
+                spool.truncate(0)
+            finally:
+                flock(spool, LOCK_UN)
+        return emails
+
+    def _expired(self, email):
+        """
+        Check if a spooled email has run out of age or attempts.
+        """
+        return ((time() - email['queued']) > settings.API_GUARD_MAIL_MAX_AGE) or (email['attempts'] >= settings.API_GUARD_MAIL_MAX_ATTEMPTS)
+
+    def _run(self):
+        """
+        Background retry loop.
+        """
+        while True:
+            sleep(settings.API_GUARD_MAIL_RETRY)
+            if GUARDS['smtp'].status()['state'] == OPEN:
+                continue
+            try:
+                emails = self._take()
+            except (IOError, OSError, ValueError) as e:
+                LOG.exception('Failed to read mail spool: {0}', str(e))
+                continue
+            for email in emails:
+                if self._expired(email):
+                    METRICS.incr(GUARDS['smtp'].key, dropped=1)
+                    LOG.error('Dropped spooled email after {0} attempt(s)', email['attempts'])
+                    continue
+                if not _deliver(email['args']):
+                    self.put(email['args'], email['queued'], email['attempts'] + 1)
+
+    def start(self):
+        """
+        Start the background retry thread if not already running.
+        """
+        with self.lock:
+            if not self.thread:
+                self.thread = Thread(target=self._run, name='lense-mail-spool')
+                self.thread.daemon = True
+                self.thread.start()
+
+def _deliver(args):
+    """
+    Send an email through the SMTP guard.
+
+    :rtype: bool
+    """
+    try:
+        with TRACER.span('smtp.send', KIND_CLIENT):
+            GUARDS['smtp'].call(LENSE.MAIL.send, *args)
+        return True
+    except Exception as e:
+        LOG.warning('Failed to send email: {0}', str(e))
+        return False
+
+def send_mail(*args):
+    """
+    Send an email through the SMTP guard, spooling it for a later retry if the
+    relay is unavailable or too slow. Never fails the request.
+    """
+    if not _deliver(args):
+        MAIL_SPOOL.put(list(args))
+
+def disconnect_socket():
+    """
+    Close SocketIO connections through the socket guard, skipping the
+    disconnect if the socket server is unavailable or too slow.
+    """
+    try:
+        with TRACER.span('socket.disconnect', KIND_CLIENT):
+            GUARDS['socket'].call(LENSE.SOCKET.disconnect)
+    except Exception as e:
+        LOG.warning('Skipped SocketIO disconnect: {0}', str(e))
+
+def authenticate_user():
+    """
+    Authenticate the request user, through the LDAP guard if LDAP is used.
+
+    :rtype: mixed
+    """
+    if not settings.CONF.ldap.host:
+        return LENSE.OBJECTS.USER.authenticate()
+    with TRACER.span('ldap.authenticate', KIND_CLIENT):
+        return GUARDS['ldap'].call(LENSE.OBJECTS.USER.authenticate)
+
+def guard_status():
+    """
+    Get the state of all dependency circuit breakers.
+
+    :rtype: dict
+    """
+    return dict([(name, guard.status()) for name, guard in GUARDS.iteritems()])
+
+# LDAP client timeouts
+if ldap and settings.CONF.ldap.host:
+    ldap.set_option(ldap.OPT_NETWORK_TIMEOUT, settings.API_GUARD_LDAP_TIMEOUT)
+    ldap.set_option(ldap.OPT_TIMEOUT, settings.API_GUARD_LDAP_TIMEOUT)
+
+# Dependency guards. Only connection level database errors count as database
+# failures; integrity, data and programming errors come from requests or handlers
+GUARDS = {
+    'mysql': Dependency('mysql', errors=(OperationalError, InterfaceError)),
+    'smtp': Dependency('smtp', timeout=settings.API_GUARD_SMTP_TIMEOUT),
+    'socket': Dependency('socket', timeout=settings.API_GUARD_SOCKET_TIMEOUT),
+    'ldap': Dependency('ldap', errors=(Exception,) if not ldap else (ldap.LDAPError,))
+}
+
+# Spool for emails that could not be sent
+MAIL_SPOOL = MailSpool()
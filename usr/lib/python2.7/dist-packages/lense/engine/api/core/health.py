@@ -0,0 +1,152 @@
+import socket
+from time import time, sleep
+from threading import Thread, Lock
+from urlparse import urlparse
+
+# Django Libraries
+from django.conf import settings
+from django.db import connection
+from django.http import JsonResponse
+
+# Lense Libraries
+from lense.engine.api.core.guard import guard_status, OPEN
+
+# Health check paths
+HEALTH_LIVE  = 'health/live'
+HEALTH_READY = 'health/ready'
+
+# Default LDAP port
+LDAP_PORT    = 389
+
+# Dependencies that decide readiness, others are only reported
+REQUIRED     = ['mysql']
+
+def _tcp_probe(host, port):
+    """
+    Check that a TCP service accepts connections.
+    """
+    conn = socket.create_connection((host, int(port)), settings.API_HEALTH_TIMEOUT)
+    conn.close()
+
+def _mysql_probe():
+    """
+    Check that the database answers a trivial query.
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.execute('SELECT 1')
+        cursor.fetchone()
+    finally:
+        cursor.close()
+
+def _ldap_probe():
+    """
+    Check that the LDAP server accepts connections.
+    """
+    host = settings.CONF.ldap.host
+    url  = urlparse(host if '://' in host else 'ldap://{0}'.format(host))
+    _tcp_probe(url.hostname, url.port or LDAP_PORT)
+
+class HealthProber(object):
+    """
+    Probe engine dependencies from a background thread and cache the results,
+    so readiness checks never wait on a dependency. Only dependencies that are
+    enabled in the engine configuration are probed.
+    """
+    def __init__(self):
+        self.lock    = Lock()
+        self.thread  = None
+        self.results = {}
+        self.probes  = {'mysql': _mysql_probe}
+
+        # Optional dependencies
+        if settings.CONF.email.smtp_enable:
+            self.probes['smtp'] = lambda: _tcp_probe(settings.CONF.email.smtp_host, settings.CONF.email.smtp_port)
+        if settings.CONF.socket.enable:
+            self.probes['socket'] = lambda: _tcp_probe(settings.CONF.socket.host, settings.CONF.socket.port)
+        if settings.CONF.ldap.host:
+            self.probes['ldap'] = _ldap_probe
+
+    def _probe(self, name, probe):
+        """
+        Run a single probe and record the result.
+        """
+        start = time()
+        try:
+            probe()
+            result = {'ok': True}
+        except Exception as e:
+            result = {'ok': False, 'error': str(e)}
+        result.update({
+            'latency_ms': int(round((time() - start) * 1000)),
+            'checked': int(time())
+        })
+        with self.lock:
+            self.results[name] = result
+
+    def _run(self):
+        """
+        Background probe loop.
+        """
+        while True:
+            for name, probe in self.probes.items():
+                self._probe(name, probe)
+            connection.close()
+            sleep(settings.API_HEALTH_INTERVAL)
+
+    def start(self):
+        """
+        Start the background prober if not already running.
+        """
+        with self.lock:
+            if not self.thread:
+                self.thread = Thread(target=self._run, name='lense-health')
+                self.thread.daemon = True
+                self.thread.start()
+
+    def status(self):
+        """
+        Get the cached dependency status. Results older than three probe
+        intervals are reported as stale and not OK.
+
+        :rtype: dict
+        """
+        self.start()
+        now    = time()
+        status = {}
+        with self.lock:
+            for name in self.probes:
+                result = dict(self.results.get(name, {'ok': False, 'error': 'pending'}))
+                if 'checked' in result and (now - result['checked']) > (3 * settings.API_HEALTH_INTERVAL):
+                    result.update({'ok': False, 'error': 'stale'})
+                result['required'] = name in REQUIRED
+                status[name] = result
+        return status
+
+def health_check(path):
+    """
+    Answer liveness and readiness checks. Returns None for any other path.
+    Health checks bypass engine setup, authentication, manifests and stats.
+    Readiness only fails on the required dependencies (the database probe and
+    the database breaker); optional dependencies such as SMTP, the socket
+    server and LDAP are reported without taking the engine out of service.
+
+    :param path: The request path
+    :type  path: str
+    :rtype: JsonResponse|None
+    """
+    if path == HEALTH_LIVE:
+        return JsonResponse({'status': 'ok'})
+    if path == HEALTH_READY:
+        dependencies = PROBER.status()
+        breakers     = guard_status()
+        ready        = all([dependencies[name]['ok'] for name in REQUIRED]) and breakers['mysql']['state'] != OPEN
+        return JsonResponse({
+            'status': 'ok' if ready else 'unavailable',
+            'dependencies': dependencies,
+            'breakers': breakers
+        }, status=200 if ready else 503)
+    return None
+
+# Dependency prober
+PROBER = HealthProber()
@@ -0,0 +1,161 @@
+from time import time, sleep
+from hashlib import sha1
+from random import random
+from datetime import timedelta
+
+# Django Libraries
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils import timezone
+from django.db import transaction, IntegrityError
+
+# Lense Libraries
+from lense.common.exceptions import RequestError
+from lense.engine.api.core.log import LOG
+from lense.engine.api.core.metrics import METRICS
+from lense.engine.api.core.context import get_context
+from lense.engine.api.objects.idempotency.models import APIIdempotencyKey
+
+# Idempotency key request header
+HEADER_KEY      = 'HTTP_IDEMPOTENCY_KEY'
+
+# Header marking a replayed response
+HEADER_REPLAYED = 'Idempotent-Replayed'
+
+# Maximum key length
+KEY_LENGTH      = 128
+
+class IdempotentRequests(object):
+    """
+    Honor client supplied idempotency keys on write requests. The response to
+    the first request with a key is stored per user for a TTL and returned for
+    any retry with the same key without running the handler again. A retry
+    that arrives while the first request is still running waits for it to
+    finish instead of running twice. The pending row's unique (user, key)
+    constraint is the lock, so this holds across engine processes.
+
+    A pending row is only a lease, long enough for the request to finish
+    within its manifest time budget. If the process running the request dies,
+    a retry takes the key over once the lease has expired.
+
+    Only completed responses below 500 are stored; server errors and failed
+    requests release the key so the client can retry.
+    """
+    def __init__(self):
+        self.lease = settings.API_IDEMPOTENCY_WAIT + settings.API_MANIFEST_TIMEOUT
+
+    def key(self, request):
+        """
+        Get the idempotency key of a write request.
+
+        :param request: The Django request object
+        :type  request: HttpRequest
+        :rtype: str|None
+        """
+        if request is None or request.method == 'GET':
+            return None
+        key = request.META.get(HEADER_KEY)
+        if key and len(key) > KEY_LENGTH:
+            raise RequestError('Idempotency key must not be longer than {0} characters'.format(KEY_LENGTH), code=400)
+        return key or None
+
+    def _fingerprint(self, context):
+        return sha1('{0} {1}'.format(context.handler, context.data_key)).hexdigest()
+
+    def _claim(self, user, key, fingerprint):
+        """
+        Create the pending row for a key, taking over an expired row. Returns
+        the row and True if it was created, or the existing row and False.
+        """
+        now = timezone.now()
+
+        # Drop expired keys now and then
+        if random() < 0.01:
+            APIIdempotencyKey.objects.filter(expires__lt=now).delete()
+        APIIdempotencyKey.objects.filter(user=user, key=key, expires__lt=now).delete()
+        while True:
+            try:
+                with transaction.atomic():
+                    return APIIdempotencyKey.objects.create(
+                        user        = user,
+                        key         = key,
+                        fingerprint = fingerprint,
+                        expires     = now + timedelta(seconds=self.lease)
+                    ), True
+            except IntegrityError:
+                row = APIIdempotencyKey.objects.filter(user=user, key=key).first()
+
+                # Released since the insert failed, try again
+                if row:
+                    return row, False
+
+    def _replay(self, row):
+        """
+        Rebuild a stored response.
+        """
+        response = HttpResponse(row.content, status=row.code, content_type=row.content_type)
+        response[HEADER_REPLAYED] = 'true'
+        return response
+
+    def _wait(self, user, key):
+        """
+        Wait for a pending request with the same key to finish, release the
+        key or let its lease expire.
+        """
+        deadline = time() + settings.API_IDEMPOTENCY_WAIT
+        while time() < deadline:
+            sleep(settings.API_IDEMPOTENCY_POLL / 1000.0)
+            if not APIIdempotencyKey.objects.filter(user=user, key=key, status='pending', expires__gte=timezone.now()).exists():
+                return
+        raise RequestError('A request with this idempotency key is still in progress', code=409)
+
+    def run(self, key, func):
+        """
+        Run a request under an idempotency key.
+
+        :param  key: The idempotency key
+        :type   key: str
+        :param func: Runs the request and returns the response
+        :type  func: callable
+        :rtype: HttpResponse
+        """
+        context     = get_context()
+        user        = LENSE.REQUEST.USER.name
+        handler     = context.handler
+        fingerprint = self._fingerprint(context)
+
+        # Existing request with this key
+        row, claimed = self._claim(user, key, fingerprint)
+        while not claimed:
+            if row.fingerprint != fingerprint:
+                raise RequestError('Idempotency key was already used for a different request', code=422)
+            if row.status == 'pending':
+                METRICS.incr(handler, idempotent_waits=1)
+                self._wait(user, key)
+                row, claimed = self._claim(user, key, fingerprint)
+                continue
+            METRICS.incr(handler, idempotent_replays=1)
+            LOG.info('<REQUEST> Replaying stored response for idempotency key: {0}', key)
+            return self._replay(row)
+
+        # First request with this key. Only our own row is updated, in case the
+        # lease expired and another request took the key over
+        try:
+            response = func()
+        except Exception:
+            APIIdempotencyKey.objects.filter(pk=row.pk).delete()
+            raise
+        if response.status_code >= 500:
+            APIIdempotencyKey.objects.filter(pk=row.pk).delete()
+            return response
+        APIIdempotencyKey.objects.filter(pk=row.pk, status='pending').update(
+            status       = 'complete',
+            code         = response.status_code,
+            content      = response.content.decode('utf-8'),
+            content_type = response.get('Content-Type'),
+            expires      = timezone.now() + timedelta(seconds=settings.API_IDEMPOTENCY_TTL)
+        )
+        return response
+
+# Idempotent write requests, if enabled
+IDEMPOTENCY = None if not settings.API_IDEMPOTENCY else IdempotentRequests()
@@ -0,0 +1,266 @@
+import os
+import errno
+import socket
+from copy import deepcopy
+from time import time, sleep
+from threading import Thread, Lock, local
+
+# Django Libraries
+from django.conf import settings
+from django.db import connection, connections
+from django.db.models import Max
+
+# Lense Libraries
+from lense.engine.api.core.log import LOG
+from lense.engine.api.core.metrics import METRICS
+from lense.engine.api.core.shared import SharedTable
+from lense.engine.api.core.changes import CHANGES
+from lense.engine.api.objects.changes.models import APIChange
+
+# Shared table keys: per type generation / last synced change sequence / host sync claim
+GENERATION_KEY = 'generation:{0}'
+SEQ_KEY        = 'invalidation:seq'
+SYNC_KEY       = 'invalidation:sync'
+
+# Metrics key for cache counters
+METRICS_KEY    = 'cache'
+
+# Invalidations deferred until the current transaction ends
+_PENDING       = local()
+
+class InvalidationBus(object):
+    """
+    Cross-process cache invalidation. Every object type has a generation
+    number in a shared memory table; writers bump it, and per-process caches
+    compare it with the generation their contents were loaded at, which costs
+    one table read per check.
+
+    Changes made on other engine hosts are picked up from the change journal
+    in the shared database: one process per host, in turn, looks for journal
+    entries newer than the last one seen and bumps their types, so caches on
+    all hosts stay coherent within the sync interval without a network
+    service. Optionally, bumps are also broadcast as datagrams to all engine
+    processes on the host over Unix sockets, so caches are evicted right away
+    instead of on their next check.
+    """
+    def __init__(self):
+        self.table     = SharedTable(settings.API_INVALIDATION_STORE, slots=64)
+        self.lock      = Lock()
+        self.thread    = None
+        self.sock      = None
+        self.listeners = {}
+
+    def generation(self, obj_type):
+        """
+        Get the current generation of an object type.
+
+        :param obj_type: The object type (user, group, handler)
+        :type  obj_type: str
+        :rtype: int
+        """
+        self.start()
+        values = self.table.get(GENERATION_KEY.format(obj_type))
+        return 0 if not values else int(values[0])
+
+    def _bump(self, obj_type, broadcast=True):
+        self.table.update(GENERATION_KEY.format(obj_type), lambda v: ((0 if not v else v[0]) + 1, time(), None))
+        METRICS.incr(METRICS_KEY, invalidations=1)
+        if broadcast and settings.API_INVALIDATION_BROADCAST:
+            self._broadcast(obj_type)
+
+    def bump(self, obj_type):
+        """
+        Invalidate cached objects of a type in all engine processes. Inside a
+        transaction the bump is deferred until flush() is called once the
+        transaction has ended, so no process can reload uncommitted state
+        under the new generation.
+
+        :param obj_type: The object type (user, group, handler)
+        :type  obj_type: str
+        """
+        if connection.in_atomic_block:
+            if not hasattr(_PENDING, 'types'):
+                _PENDING.types = set()
+            _PENDING.types.add(obj_type)
+            return
+        self._bump(obj_type)
+
+    def flush(self):
+        """
+        Apply invalidations deferred during a transaction.
+        """
+        types, _PENDING.types = getattr(_PENDING, 'types', set()), set()
+        for obj_type in types:
+            self._bump(obj_type)
+
+    def subscribe(self, obj_type, callback):
+        """
+        Run a callback in this process whenever a broadcast invalidation for an
+        object type arrives.
+
+        :param obj_type: The object type
+        :type  obj_type: str
+        :param callback: Called without arguments
+        :type  callback: callable
+        """
+        with self.lock:
+            self.listeners.setdefault(obj_type, []).append(callback)
+
+    def _broadcast(self, obj_type):
+        """
+        Send an invalidation to every engine process socket on this host,
+        removing sockets of processes that are gone.
+        """
+        sock_dir = settings.API_INVALIDATION_SOCKETS
+        sender   = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sender.setblocking(0)
+        try:
+            for name in os.listdir(sock_dir):
+                target = os.path.join(sock_dir, name)
+                if not name.endswith('.sock') or name == '{0}.sock'.format(os.getpid()):
+                    continue
+                try:
+                    sender.sendto(obj_type, target)
+                except socket.error as e:
+                    if e.args[0] in (errno.ECONNREFUSED, errno.ENOENT):
+                        try:
+                            os.unlink(target)
+                        except OSError:
+                            pass
+                    elif e.args[0] != errno.EAGAIN:
+                        LOG.warning('Failed to broadcast {0} invalidation to {1}: {2}', obj_type, target, str(e))
+        finally:
+            sender.close()
+
+    def _listen(self):
+        """
+        Receive broadcast invalidations and run the subscribed callbacks.
+        """
+        while True:
+            obj_type = self.sock.recv(256)
+            with self.lock:
+                callbacks = list(self.listeners.get(obj_type, []))
+            for callback in callbacks:
+                callback()
+
+    def sync(self):
+        """
+        Bump the types of changes journaled since the last sync, including
+        changes made on other engine hosts. Only one process per host syncs
+        per interval.
+
+        :rtype: int
+        """
+        now     = time()
+        claimed = self.table.update(SYNC_KEY, lambda v: (now, 0, True) if (not v or (now - v[0]) >= settings.API_INVALIDATION_SYNC) else (v[0], v[1], False))
+        if not claimed:
+            return 0
+
+        # First sync on this host, start from the latest change
+        values = self.table.get(SEQ_KEY)
+        if not values:
+            latest = APIChange.objects.aggregate(latest=Max('seq'))['latest'] or 0
+            self.table.update(SEQ_KEY, lambda v: (max(latest, 0 if not v else v[0]), now, None))
+            return 0
+
+        # Changes since the last sync, in commit order
+        changes = CHANGES.read(int(values[0]))
+        if not changes:
+            return 0
+        latest = changes[-1].seq
+        self.table.update(SEQ_KEY, lambda v: (max(latest, 0 if not v else v[0]), now, None))
+        for obj_type in set([change.type for change in changes]):
+            self._bump(obj_type)
+        return len(changes)
+
+    def _run(self):
+        """
+        Background journal sync loop.
+        """
+        while True:
+            sleep(settings.API_INVALIDATION_SYNC)
+            try:
+                self.sync()
+            except Exception as e:
+                LOG.exception('Failed to sync cache invalidations: {0}', str(e))
+            connections.close_all()
+
+    def start(self):
+        """
+        Start the journal sync thread, and the broadcast listener if enabled,
+        if not already running.
+        """
+        if self.thread:
+            return
+        with self.lock:
+            if self.thread:
+                return
+            if settings.API_INVALIDATION_BROADCAST:
+                if not os.path.isdir(settings.API_INVALIDATION_SOCKETS):
+                    os.makedirs(settings.API_INVALIDATION_SOCKETS)
+                sock_path = os.path.join(settings.API_INVALIDATION_SOCKETS, '{0}.sock'.format(os.getpid()))
+                if os.path.exists(sock_path):
+                    os.unlink(sock_path)
+                self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+                self.sock.bind(sock_path)
+                listener = Thread(target=self._listen, name='lense-invalidation-listener')
+                listener.daemon = True
+                listener.start()
+            self.thread = Thread(target=self._run, name='lense-invalidation-sync')
+            self.thread.daemon = True
+            self.thread.start()
+
+class GenerationCache(object):
+    """
+    Per-process cache for objects of one type. The whole cache is dropped
+    when the type's generation has moved since it was filled, and entries
+    expire after the TTL as a bound on staleness for changes made outside the
+    engine. Cached values are copied on the way out, so callers may modify
+    them.
+    """
+    def __init__(self, obj_type, ttl=None):
+        self.obj_type   = obj_type
+        self.ttl        = ttl or settings.API_INVALIDATION_TTL
+        self.lock       = Lock()
+        self.entries    = {}
+        self.generation = None
+        INVALIDATION.subscribe(obj_type, self.clear)
+
+    def clear(self):
+        with self.lock:
+            self.entries = {}
+
+    def get(self, key, loader):
+        """
+        Get a cached value, loading it on a miss.
+
+        :param    key: The cache key
+        :type     key: str
+        :param loader: Loads the value on a miss
+        :type  loader: callable
+        :rtype: mixed
+        """
+        generation = INVALIDATION.generation(self.obj_type)
+        now        = time()
+        with self.lock:
+            if generation != self.generation:
+                self.entries, self.generation = {}, generation
+            entry = self.entries.get(key)
+        if entry and (now - entry[1]) < self.ttl:
+            METRICS.incr(METRICS_KEY, hits=1)
+            return deepcopy(entry[0])
+
+        # Load under the generation seen before loading, so a bump during the
+        # load drops the entry on the next check
+        METRICS.incr(METRICS_KEY, misses=1)
+        value = loader()
+        with self.lock:
+            if generation == self.generation:
+                self.entries[key] = (value, now)
+        return deepcopy(value)
+
+# Cache invalidation bus
+INVALIDATION = InvalidationBus()
+
+# Handler manifests, if enabled
+MANIFESTS = None if not settings.API_INVALIDATION_CACHE_MANIFESTS else GenerationCache('handler')
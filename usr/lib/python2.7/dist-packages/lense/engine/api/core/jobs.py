@@ -0,0 +1,236 @@
+import os
+from time import sleep
+from uuid import uuid4
+from datetime import timedelta
+from threading import local
+from multiprocessing import Process
+from fcntl import flock, LOCK_EX, LOCK_UN
+from json import dumps as json_dumps, loads as json_loads
+
+# Django Libraries
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count
+from django.utils import timezone
+from django.test import RequestFactory
+
+# Lense Libraries
+from lense.engine.api.core.log import LOG
+from lense.engine.api.core.metrics import METRICS
+from lense.engine.api.core.ratelimit import HEADER_USER, HEADER_GROUP
+from lense.engine.api.objects.jobs.models import APIJob
+
+# Job currently run by this worker
+_CURRENT = local()
+
+class JobQueue(object):
+    """
+    Background jobs for long running request handlers. Handlers mapped to a
+    job type are not run in the request: the request is stored as a queued
+    job and answered with a 202 and the job ID. Job workers are processes
+    which claim queued jobs from the database and run the original request as
+    the submitting user. They are forked from the job process of the prefork
+    server, or run by the run_jobs management command for other deployments,
+    never from a serving process.
+
+    Claims are serialized across the workers of a host with a lock file, and a
+    job is only claimed while fewer jobs of its type are running than the
+    configured limit for that type.
+    """
+    def __init__(self):
+        self.workers = []
+
+    def job_type(self, method, path):
+        """
+        Get the job type for a request handler, if run as a background job.
+
+        :param method: The request method
+        :type  method: str
+        :param   path: The request path
+        :type    path: str
+        :rtype: str|None
+        """
+        return settings.API_JOBS_HANDLERS.get('{0}:{1}'.format(method, path))
+
+    def submit(self, job_type, method, path, data):
+        """
+        Queue a request as a background job for the current user.
+
+        :param job_type: The job type
+        :type  job_type: str
+        :param   method: The request method
+        :type    method: str
+        :param     path: The request path
+        :type      path: str
+        :param     data: The request data
+        :type      data: dict
+        :rtype: str
+        """
+        job = APIJob.objects.create(
+            uuid   = str(uuid4()),
+            type   = job_type,
+            method = method,
+            path   = path,
+            data   = json_dumps(data or {}),
+            user   = LENSE.REQUEST.USER.name,
+            group  = LENSE.REQUEST.USER.group
+        )
+        METRICS.incr('jobs:{0}'.format(job_type), submitted=1)
+        return job.uuid
+
+    def get(self, uuid, user):
+        """
+        Get the status of a job submitted by a user.
+
+        :param uuid: The job UUID
+        :type  uuid: str
+        :param user: The submitting user
+        :type  user: str
+        :rtype: dict|None
+        """
+        job = APIJob.objects.filter(uuid=uuid, user=user).first()
+        if not job:
+            return None
+        return {
+            'uuid': job.uuid,
+            'type': job.type,
+            'method': job.method,
+            'path': job.path,
+            'status': job.status,
+            'progress': job.progress,
+            'message': job.message,
+            'result': None if job.result is None else json_loads(job.result),
+            'created': job.created.isoformat(),
+            'started': None if not job.started else job.started.isoformat(),
+            'finished': None if not job.finished else job.finished.isoformat()
+        }
+
+    def progress(self, progress, message=None):
+        """
+        Report progress of the job run by this worker. Does nothing outside of
+        a job.
+
+        :param progress: Progress in percent
+        :type  progress: int
+        :param  message: Optional status message
+        :type   message: str
+        """
+        uuid = getattr(_CURRENT, 'uuid', None)
+        if not uuid:
+            return
+        update = {'progress': max(0, min(100, int(progress)))}
+        if message:
+            update['message'] = message
+        APIJob.objects.filter(uuid=uuid).update(**update)
+
+    def _limit(self, job_type):
+        return settings.API_JOBS_LIMITS.get(job_type, settings.API_JOBS_LIMIT)
+
+    def claim(self):
+        """
+        Claim the oldest queued job whose type is below its concurrency limit.
+        A job is only claimed if it is still queued when it is marked running.
+        Running jobs past the job timeout are failed first, so jobs of a dead
+        worker don't hold their type's slots forever.
+
+        :rtype: APIJob|None
+        """
+        with open(settings.API_JOBS_LOCK, 'a') as lock:
+            flock(lock, LOCK_EX)
+            try:
+                now = timezone.now()
+                APIJob.objects.filter(status='running', started__lt=now - timedelta(seconds=settings.API_JOBS_TIMEOUT)).update(
+                    status='failed', message='Job timed out', finished=now)
+
+                # Job types at their concurrency limit
+                running = APIJob.objects.filter(status='running').values('type').annotate(running=Count('uuid'))
+                full    = [r['type'] for r in running if r['running'] >= self._limit(r['type'])]
+
+                # Claim the oldest available job. The lock only covers this host,
+                # a job taken by a worker on another host is skipped
+                for job in APIJob.objects.filter(status='queued').exclude(type__in=full).order_by('created')[:10]:
+                    if APIJob.objects.filter(uuid=job.uuid, status='queued').update(status='running', worker=os.getpid(), started=now):
+                        return job
+                return None
+            finally:
+                flock(lock, LOCK_UN)
+
+    def _finish(self, job, status, message, result=None):
+        """
+        Store the outcome of a job, unless it was already failed by the job
+        timeout while this worker was still running it.
+        """
+        update = {
+            'status': status,
+            'message': message,
+            'result': None if result is None else json_dumps(result),
+            'finished': timezone.now()
+        }
+
+        # Failed jobs keep the last progress reported by the handler
+        if status == 'complete':
+            update['progress'] = 100
+        finished = APIJob.objects.filter(uuid=job.uuid, status='running', worker=os.getpid()).update(**update)
+        if not finished:
+            LOG.error('Job {0} <{1}:{2}> finished after it timed out, discarding {3} result', job.uuid, job.method, job.path, status)
+            return
+        METRICS.incr('jobs:{0}'.format(job.type), **{status: 1})
+
+    def run(self, job):
+        """
+        Run a claimed job as the submitting user. The request was authenticated
+        when the job was submitted and is not authenticated again.
+
+        :param job: The claimed job
+        :type  job: APIJob
+        """
+
+        # Imported here, the request manager queues jobs
+        from lense.engine.api.core.request import RequestManager
+
+        data    = json_loads(job.data)
+        request = RequestFactory().generic(job.method, '/{0}'.format(job.path), json_dumps(data), 'application/json', **{
+            HEADER_USER: job.user or '',
+            HEADER_GROUP: job.group or ''
+        })
+        _CURRENT.uuid = job.uuid
+        try:
+            LENSE.SETUP.engine(request)
+            LENSE.REQUEST.data = data
+            output = RequestManager(request, authenticate=False).execute()
+            self._finish(job, 'complete', output.message, output.data)
+        except Exception as e:
+            LOG.exception('Job {0} <{1}:{2}> failed: {3}', job.uuid, job.method, job.path, str(e))
+            self._finish(job, 'failed', str(e))
+        finally:
+            _CURRENT.uuid = None
+
+    def _work(self):
+        """
+        Worker process loop.
+        """
+        connections.close_all()
+        while True:
+            job = self.claim()
+            if not job:
+                sleep(settings.API_JOBS_POLL / 1000.0)
+                continue
+            self.run(job)
+            connections.close_all()
+
+    def start(self):
+        """
+        Fork the job workers. Only called from single threaded processes (the
+        prefork job process and the run_jobs command), since forking a process
+        with running threads is unsafe.
+        """
+        if self.workers:
+            return
+        for i in range(settings.API_JOBS_WORKERS):
+            worker = Process(target=self._work, name='lense-job-worker')
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+
+# Background job queue, if enabled
+JOBS = None if not settings.API_JOBS else JobQueue()
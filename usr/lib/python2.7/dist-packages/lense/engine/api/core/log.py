@@ -0,0 +1,151 @@
+import atexit
+import logging
+from itertools import count
+from threading import Thread, Lock, local
+from Queue import Queue, Full
+
+# Django Libraries
+from django.conf import settings
+
+# Per-thread debug sampling state
+_SAMPLE = local()
+
+class QueueHandler(logging.Handler):
+    """
+    Logging handler that hands records off to a queue. The request thread only
+    pays for creating the record; formatting and file I/O happen on the writer
+    thread. Records are dropped (and counted) when the queue is full rather than
+    blocking the request.
+    """
+    def __init__(self, queue):
+        logging.Handler.__init__(self)
+        self.queue   = queue
+        self.dropped = 0
+
+    def prepare(self, record):
+        """
+        Merge message arguments and exception info into the record so it can be
+        formatted safely on another thread.
+        """
+        record.msg  = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record):
+        try:
+            self.queue.put_nowait(self.prepare(record))
+        except Full:
+            self.dropped += 1
+
+class QueueWriter(Thread):
+    """
+    Background thread writing queued log records to the original handlers.
+    """
+    def __init__(self, queue, handlers):
+        super(QueueWriter, self).__init__(name='lense-log-writer')
+        self.daemon   = True
+        self.queue    = queue
+        self.handlers = handlers
+
+    def run(self):
+        while True:
+            record = self.queue.get()
+            if record is None:
+                break
+            for handler in self.handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+
+    def stop(self):
+        """
+        Flush pending records and stop the writer.
+        """
+        self.queue.put(None)
+        self.join()
+
+class EngineLog(object):
+    """
+    Logging facade for the request path. Messages are format strings with
+    their arguments passed separately, and are only formatted once the level
+    check passes. Debug messages are additionally subject to per-handler
+    sampling: only one in N requests to a handler logs at debug level.
+    """
+    def __init__(self):
+        self.lock     = Lock()
+        self.counters = {}
+        self.writer   = None
+
+    @property
+    def logger(self):
+        """
+        The standard library logger behind LENSE.LOG.
+        """
+        return LENSE.LOG if isinstance(LENSE.LOG, logging.Logger) else getattr(LENSE.LOG, 'logger', logging.getLogger())
+
+    def install(self):
+        """
+        Move the engine logger's handlers behind a queue and background writer.
+        """
+        with self.lock:
+            if self.writer:
+                return
+            queue         = Queue(settings.API_LOG_QUEUE)
+            handlers      = list(self.logger.handlers)
+            self.writer   = QueueWriter(queue, handlers)
+            self.writer.start()
+            for handler in handlers:
+                self.logger.removeHandler(handler)
+            self.logger.addHandler(QueueHandler(queue))
+            atexit.register(self.writer.stop)
+
+    def sample(self, handler):
+        """
+        Decide whether debug logging is sampled for the current request.
+
+        :param handler: The handler key, i.e. METHOD:path
+        :type  handler: str
+        """
+        rate = settings.API_LOG_DEBUG_SAMPLE.get(handler, settings.API_LOG_DEBUG_SAMPLE_RATE)
+
+        # Handlers without their own rate share a counter
+        key  = handler if handler in settings.API_LOG_DEBUG_SAMPLE else None
+        with self.lock:
+            counter = self.counters.setdefault(key, count())
+        _SAMPLE.enabled = (rate <= 1) or (next(counter) % rate == 0)
+
+    def enabled(self, level):
+        """
+        Check if a log level is enabled for the current request.
+
+        :param level: The logging level
+        :type  level: int
+        :rtype: bool
+        """
+        if (level == logging.DEBUG) and not getattr(_SAMPLE, 'enabled', True):
+            return False
+        return self.logger.isEnabledFor(level)
+
+    def _log(self, level, method, msg, args):
+        if self.enabled(level):
+            getattr(LENSE.LOG, method)(msg if not args else msg.format(*args))
+
+    def debug(self, msg, *args):
+        self._log(logging.DEBUG, 'debug', msg, args)
+
+    def info(self, msg, *args):
+        self._log(logging.INFO, 'info', msg, args)
+
+    def warning(self, msg, *args):
+        self._log(logging.WARNING, 'warning', msg, args)
+
+    def error(self, msg, *args):
+        self._log(logging.ERROR, 'error', msg, args)
+
+    def exception(self, msg, *args):
+        self._log(logging.ERROR, 'exception', msg, args)
+
+# Engine request path logger
+LOG = EngineLog()
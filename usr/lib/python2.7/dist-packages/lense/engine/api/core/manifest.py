@@ -0,0 +1,297 @@
+import re
+from time import time
+from json import dumps as json_dumps, loads as json_loads
+from threading import Lock, local
+
+# Django Libraries
+from django.conf import settings
+from django.db import connection
+
+# Lense Libraries
+from lense.common.exceptions import ManifestError
+from lense.common.manifest.interface import ManifestInterface
+from lense.engine.api.core.log import LOG
+from lense.engine.api.core.tracing import TRACER
+
+# Active manifest execution for the current thread
+_ACTIVE = local()
+
+# Object manager tracing install lock
+_TRACE_LOCK = Lock()
+
+# Step identifier keys / step reference pattern
+STEP_ID_KEYS = ['ref', 'id', 'name']
+STEP_REF     = re.compile(r'#([A-Za-z0-9_\-]+)')
+
+# Object manager methods that write, i.e. "create", "createManifest" or "add_member"
+WRITE_METHOD = re.compile(r'^(create|update|delete|save|add|remove)([A-Z_]|$)')
+
+def _ms(start):
+    """
+    Milliseconds elapsed since a start time.
+    """
+    return int(round((time() - start) * 1000))
+
+def _rows(result):
+    """
+    Estimate the number of rows returned by an object call.
+    """
+    if result is None or result is False:
+        return 0
+    if isinstance(result, (list, tuple, dict)):
+        return len(result)
+
+    # Only count query sets that have already been evaluated
+    cache = getattr(result, '_result_cache', False)
+    if cache is not False:
+        return None if cache is None else len(cache)
+    return 1
+
+class ManifestGraph(object):
+    """
+    Build a dependency graph for the steps of a compiled manifest. A step
+    depends on every earlier step whose identifier it references by variable
+    (#<step>), and steps are grouped into stages: every step in a stage only
+    depends on steps in earlier stages, so the steps of a stage are
+    independent of each other.
+
+    The graph is informational. Manifest steps are run in order by the
+    manifest interface; handlers run independent lookups concurrently through
+    the worker pool instead.
+    """
+    def __init__(self, manifest):
+        self.steps = self._steps(manifest)
+        self.ids   = [self._id(step, i) for i, step in enumerate(self.steps)]
+        self.deps  = dict([(sid, self._refs(step, self.ids[:i])) for i, (sid, step) in enumerate(zip(self.ids, self.steps))])
+
+    def _steps(self, manifest):
+        """
+        Extract the ordered list of steps from a manifest.
+        """
+        if isinstance(manifest, basestring):
+            try:
+                manifest = json_loads(manifest)
+            except ValueError:
+                return []
+        if isinstance(manifest, dict):
+            manifest = manifest.get('steps', [])
+        return [step for step in manifest if isinstance(step, dict)] if isinstance(manifest, list) else []
+
+    def _id(self, step, index):
+        """
+        Get the identifier for a step, falling back to its position.
+        """
+        for key in STEP_ID_KEYS:
+            if isinstance(step.get(key), basestring):
+                return step[key]
+        return str(index)
+
+    def _refs(self, value, known):
+        """
+        Recursively collect references to known step identifiers.
+        """
+        refs = set()
+        if isinstance(value, dict):
+            for v in value.values():
+                refs |= self._refs(v, known)
+        elif isinstance(value, list):
+            for v in value:
+                refs |= self._refs(v, known)
+        elif isinstance(value, basestring):
+            refs |= set([ref for ref in STEP_REF.findall(value) if ref in known])
+        return refs
+
+    @property
+    def stages(self):
+        """
+        Group the steps into stages of mutually independent steps.
+
+        :rtype: list
+        """
+        level = {}
+        for sid in self.ids:
+            level[sid] = 1 + max([level[dep] for dep in self.deps[sid]] or [-1])
+        stages = [[] for i in range(1 + max(level.values() or [-1]))]
+        for sid in self.ids:
+            stages[level[sid]].append(sid)
+        return stages
+
+    def dump(self):
+        """
+        Dump the graph for inclusion in compiled manifest output. The stages
+        show potential parallelism only, steps are still run in order.
+
+        :rtype: dict
+        """
+        return {
+            'depends': dict([(sid, sorted(deps)) for sid, deps in self.deps.items()]),
+            'potential_stages': self.stages,
+            'execution': 'sequential'
+        }
+
+class TracedManager(object):
+    """
+    Wrapper around a LENSE.OBJECTS manager. Method calls made while a manifest
+    is executing on the current thread are recorded as manifest steps.
+    """
+    def __init__(self, name, manager, execution):
+        self._name      = name
+        self._manager   = manager
+        self._execution = execution
+
+    def __getattr__(self, attr):
+        value = getattr(self._manager, attr)
+        if not callable(value):
+            return value
+
+        def _traced(*args, **kwargs):
+            return self._execution.step('{0}.{1}'.format(self._name, attr), value, *args, **kwargs)
+        return _traced
+
+class TracedObjects(object):
+    """
+    Wrapper around LENSE.OBJECTS. Outside of a manifest execution, attribute
+    lookups pass straight through to the wrapped object.
+    """
+    def __init__(self, objects):
+        self._objects = objects
+
+    def __getattr__(self, name):
+        value     = getattr(self._objects, name)
+        execution = getattr(_ACTIVE, 'execution', None)
+        if not execution or name.startswith('_'):
+            return value
+        return TracedManager(name, value, execution)
+
+    @classmethod
+    def install(cls):
+        """
+        Wrap LENSE.OBJECTS if not already wrapped.
+        """
+        with _TRACE_LOCK:
+            if not isinstance(LENSE.OBJECTS, cls):
+                LENSE.OBJECTS = cls(LENSE.OBJECTS)
+
+class ManifestExecution(object):
+    """
+    Execute a manifest with a total and per-step time budget and a step level
+    profile. Every object manager call made by the manifest is treated as a
+    step: the total budget is checked before and after each step, the step
+    budget after each step, and each step records its run time and rows
+    returned. Queries are only recorded and counted when profiling.
+
+    Once a write step has succeeded, the execution is no longer failed for its
+    budgets: the remaining steps are run and the overrun is logged, rather
+    than failing a request whose writes went through.
+    """
+    def __init__(self, manifest, timeout=None, step_timeout=None, profile=False):
+        self.manifest     = manifest
+        self.timeout      = timeout or settings.API_MANIFEST_TIMEOUT
+        self.step_timeout = step_timeout or settings.API_MANIFEST_STEP_TIMEOUT
+        self.profiling    = profile
+
+        # Execution state
+        self.started = None
+        self.steps   = []
+        self.queries = None
+        self.time_ms = 0
+        self.written = False
+        self._depth  = 0
+
+    def _queries(self):
+        """
+        Number of queries run on the current thread's connection, if profiling.
+        """
+        return None if not self.profiling else len(connection.queries)
+
+    def check(self, step=None):
+        """
+        Make sure the execution hasn't run out of time, and that a finished
+        step stayed within its budget. Only logged once a step has written.
+
+        :param step: The profile of the step that just finished
+        :type  step: dict
+        """
+        if (time() - self.started) > self.timeout:
+            error = ManifestError('Manifest execution exceeded time budget of {0}s'.format(self.timeout), code=504)
+        elif step and step['time_ms'] > (self.step_timeout * 1000):
+            error = ManifestError('Manifest step {0} exceeded time budget of {1}s'.format(step['step'], self.step_timeout), code=504)
+        else:
+            return
+        if not self.written:
+            raise error
+        LOG.warning('<MANIFEST> Continuing after a write step: {0}', error.message)
+
+    def step(self, name, func, *args, **kwargs):
+        """
+        Run and profile a single manifest step. Nested object calls made by a
+        step are accounted to the outermost step.
+
+        :param name: The step name
+        :type  name: str
+        :param func: The step callable
+        :type  func: callable
+        :rtype: mixed
+        """
+        if self._depth:
+            return func(*args, **kwargs)
+        self.check()
+
+        # Run the step
+        start, queries = time(), self._queries()
+        self._depth += 1
+        try:
+            with TRACER.span('step', **{'lense.step': name}):
+                result = func(*args, **kwargs)
+        finally:
+            self._depth -= 1
+        elapsed = _ms(start)
+
+        # Record the step profile
+        self.steps.append({
+            'step': name,
+            'time_ms': elapsed,
+            'queries': None if queries is None else self._queries() - queries,
+            'rows': _rows(result)
+        })
+        if WRITE_METHOD.match(name.split('.')[-1]):
+            self.written = True
+        self.check(self.steps[-1])
+        return result
+
+    @property
+    def profile(self):
+        """
+        Return the execution profile.
+        """
+        return {
+            'time_ms': self.time_ms,
+            'queries': self.queries,
+            'steps': self.steps
+        }
+
+    def execute(self):
+        """
+        Execute the manifest.
+
+        :rtype: dict
+        """
+        TracedObjects.install()
+
+        # Record queries for the duration of a profiled execution
+        debug_cursor = connection.force_debug_cursor
+        connection.force_debug_cursor = debug_cursor or self.profiling
+        parent = getattr(_ACTIVE, 'execution', None)
+        _ACTIVE.execution = self
+        self.started, queries = time(), self._queries()
+        try:
+            return ManifestInterface(self.manifest).execute()
+        finally:
+            _ACTIVE.execution = parent
+            connection.force_debug_cursor = debug_cursor
+            self.time_ms = _ms(self.started)
+            self.queries = None if queries is None else self._queries() - queries
+
+            # Record slow manifests
+            if self.time_ms > settings.API_MANIFEST_SLOW_MS:
+                LOG.warning('<MANIFEST> Slow manifest execution: {0}', json_dumps(self.profile))
@@ -0,0 +1,137 @@
+import gc
+import os
+import resource
+from itertools import count
+from threading import Lock
+
+# Django Libraries
+from django.conf import settings
+
+# Lense Libraries
+from lense.engine.api.core.log import LOG
+from lense.engine.api.core.metrics import METRICS
+
+# Allocation tracing, where available
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+# Metrics key for process wide memory gauges
+METRICS_KEY = 'process:memory'
+
+# Memory page size
+PAGE_SIZE   = os.sysconf('SC_PAGE_SIZE')
+
+def rss_kb():
+    """
+    Get the current resident set size of the process in KB. Falls back to the
+    peak RSS where /proc is unavailable.
+
+    :rtype: int
+    """
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * PAGE_SIZE / 1024
+    except (IOError, IndexError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def object_counts():
+    """
+    Count live objects tracked by the garbage collector, by type name.
+
+    :rtype: dict
+    """
+    counts = {}
+    for obj in gc.get_objects():
+        name = type(obj).__name__
+        counts[name] = counts.get(name, 0) + 1
+    return counts
+
+def count_growth(before, after, top):
+    """
+    Get the object types with the largest count growth between two snapshots.
+
+    :param before: Object counts before
+    :type  before: dict
+    :param  after: Object counts after
+    :type   after: dict
+    :param    top: The number of types to return
+    :type     top: int
+    :rtype: list
+    """
+    growth = [(k, v - before.get(k, 0)) for k, v in after.iteritems() if v > before.get(k, 0)]
+    return sorted(growth, key=lambda g: g[1], reverse=True)[:top]
+
+class MemoryAccounting(object):
+    """
+    Per-request memory accounting. Every request records the change in process
+    RSS while it ran, accumulated per handler. Since request threads share the
+    process, deltas of concurrent requests overlap; the per-handler totals show
+    which handlers the process grows under rather than exact allocations.
+
+    One in N requests per handler is additionally traced: allocations are
+    compared with tracemalloc snapshots where available, otherwise by live
+    object counts per type, and the top allocators are kept as a handler gauge.
+    Tracing is expensive and should only be sampled sparsely.
+    """
+    def __init__(self):
+        self.lock     = Lock()
+        self.counters = {}
+
+    def _sampled(self, handler):
+        """
+        Decide whether allocations are traced for this request.
+        """
+        if not settings.API_MEMORY_SAMPLE_RATE:
+            return False
+        with self.lock:
+            counter = self.counters.setdefault(handler, count())
+        return next(counter) % settings.API_MEMORY_SAMPLE_RATE == 0
+
+    def start(self, handler):
+        """
+        Start accounting for a request.
+
+        :param handler: The handler key, i.e. METHOD:path
+        :type  handler: str
+        :rtype: dict
+        """
+        state = {'handler': handler, 'rss_kb': rss_kb(), 'trace': None}
+        if self._sampled(handler):
+            if tracemalloc:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                state['trace'] = tracemalloc.take_snapshot()
+            else:
+                state['trace'] = object_counts()
+        return state
+
+    def _top(self, trace):
+        """
+        Get the top allocators since a trace snapshot.
+        """
+        if tracemalloc:
+            stats = tracemalloc.take_snapshot().compare_to(trace, 'lineno')[:settings.API_MEMORY_TOP]
+            return [(str(stat.traceback), stat.size_diff) for stat in stats if stat.size_diff > 0]
+        return count_growth(trace, object_counts(), settings.API_MEMORY_TOP)
+
+    def finish(self, state):
+        """
+        Finish accounting for a request.
+
+        :param state: The state returned by start
+        :type  state: dict
+        """
+        current = rss_kb()
+        METRICS.incr(state['handler'], rss_delta_kb=current - state['rss_kb'])
+        METRICS.gauge(METRICS_KEY, rss_kb=current)
+
+        # Sampled allocation trace
+        if state['trace'] is not None:
+            top = self._top(state['trace'])
+            METRICS.gauge(state['handler'], top_allocators=top)
+            LOG.info('<MEMORY> [{0}] rss_kb={1} delta_kb={2} top={3}', state['handler'], current, current - state['rss_kb'], top)
+
+# Per-request memory accounting, if enabled
+MEMORY = None if not settings.API_MEMORY else MemoryAccounting()
@@ -0,0 +1,48 @@
+from threading import Lock
+
+class HandlerMetrics(object):
+    """
+    In-process counters kept per request handler. Counters are cheap to update
+    from the request path and are exposed through the request stats handler.
+    """
+    def __init__(self):
+        self.lock     = Lock()
+        self.handlers = {}
+
+    def incr(self, handler, **counters):
+        """
+        Increment one or more counters for a handler.
+
+        :param  handler: The handler key, i.e. METHOD:path
+        :type   handler: str
+        :param counters: Counter names and increments
+        :type  counters: dict
+        """
+        with self.lock:
+            current = self.handlers.setdefault(handler, {})
+            for k, v in counters.iteritems():
+                current[k] = current.get(k, 0) + v
+
+    def gauge(self, handler, **gauges):
+        """
+        Set one or more gauge values for a handler.
+
+        :param handler: The handler key
+        :type  handler: str
+        :param  gauges: Gauge names and values
+        :type   gauges: dict
+        """
+        with self.lock:
+            self.handlers.setdefault(handler, {}).update(gauges)
+
+    def dump(self):
+        """
+        Return a copy of all handler counters.
+
+        :rtype: dict
+        """
+        with self.lock:
+            return dict([(k, dict(v)) for k, v in self.handlers.iteritems()])
+
+# Process wide handler metrics
+METRICS = HandlerMetrics()
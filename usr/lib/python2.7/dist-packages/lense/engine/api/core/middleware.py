@@ -0,0 +1,60 @@
+import re
+from collections import Counter
+
+# Django Libraries
+from django.conf import settings
+from django.db import connection
+
+# Lense Libraries
+from lense.engine.api.core.log import LOG
+from lense.engine.api.core.metrics import METRICS
+from lense.engine.api.core.context import UNMATCHED
+
+# SQL literal patterns used to reduce queries to their shape
+SQL_STRING  = re.compile(r"'(?:[^']|'')*'")
+SQL_NUMBER  = re.compile(r'\b\d+(?:\.\d+)?\b')
+SQL_IN_LIST = re.compile(r'IN \((?:\?, )*\?\)')
+
+def sql_shape(sql):
+    """
+    Reduce an SQL statement to its shape by replacing literal values.
+
+    :param sql: The SQL statement
+    :type  sql: str
+    :rtype: str
+    """
+    shape = SQL_NUMBER.sub('?', SQL_STRING.sub('?', sql))
+    return SQL_IN_LIST.sub('IN (...)', shape)
+
+class QueryCountMiddleware(object):
+    """
+    Count the queries and total database time for each request, and flag
+    repeated identical query shapes (the signature of N+1 query patterns).
+    Counts are added to the per-handler request metrics.
+    """
+    def process_request(self, request):
+        request.lense_debug_cursor = connection.force_debug_cursor
+        request.lense_queries      = len(connection.queries)
+        connection.force_debug_cursor = True
+
+    def process_response(self, request, response):
+        if not hasattr(request, 'lense_queries'):
+            return response
+        queries = connection.queries[request.lense_queries:]
+        connection.force_debug_cursor = request.lense_debug_cursor
+
+        # Handler key set by the dispatcher / query counts
+        handler  = getattr(request, 'lense_handler', UNMATCHED)
+        db_time  = int(round(sum([float(q['time']) for q in queries]) * 1000))
+        repeated = [(shape, count) for shape, count in Counter([sql_shape(q['sql']) for q in queries]).most_common()
+                    if count >= settings.API_QUERY_REPEAT_THRESHOLD]
+
+        # Possible N+1 query pattern
+        for shape, count in repeated:
+            LOG.warning('<QUERIES> Handler <{0}> repeated query {1} times: {2}', handler, count, shape)
+
+        METRICS.incr(handler,
+            queries      = len(queries),
+            db_time_ms   = db_time,
+            repeated_sql = 1 if repeated else 0)
+        return response
@@ -0,0 +1,25 @@
+from django.db import transaction
+
+def patch_object(obj, attrs):
+    """
+    Apply attribute changes to a loaded model object. Only attributes whose
+    value differs from the loaded object are written, using a single UPDATE
+    restricted to those columns inside a transaction. Nothing is written if
+    no attribute changed.
+
+    :param   obj: The loaded model object
+    :type    obj: Model
+    :param attrs: The new attribute values
+    :type  attrs: dict
+    :rtype: dict
+    """
+    changed = dict([(k, v) for k, v in attrs.iteritems() if getattr(obj, k) != v])
+    if not changed:
+        return changed
+
+    # Update only the changed columns
+    with transaction.atomic():
+        for k, v in changed.iteritems():
+            setattr(obj, k, v)
+        obj.save(update_fields=changed.keys())
+    return changed
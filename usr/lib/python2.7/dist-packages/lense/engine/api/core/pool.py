@@ -0,0 +1,102 @@
+from threading import Thread, Lock, Event
+from Queue import Queue
+
+# Django Libraries
+from django.conf import settings
+from django.db import connection, close_old_connections
+
+class PoolTask(object):
+    """
+    A single call submitted to the worker pool.
+    """
+    def __init__(self, func, args, kwargs):
+        self.func   = func
+        self.args   = args
+        self.kwargs = kwargs
+        self.done   = Event()
+        self.result = None
+        self.error  = None
+
+    def run(self):
+        """
+        Run the task, capturing the result or exception.
+        """
+        try:
+            self.result = self.func(*self.args, **self.kwargs)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done.set()
+
+    def wait(self):
+        """
+        Wait for the task and return its result, re-raising any exception in
+        the calling thread.
+        """
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+class WorkerPool(object):
+    """
+    Bounded thread pool for running independent lookups concurrently. Django
+    connections are thread local, so every worker thread holds its own database
+    connection; stale connections are recycled before each task.
+    """
+    def __init__(self, size):
+        self.size    = size
+        self.queue   = Queue()
+        self.lock    = Lock()
+        self.workers = []
+
+    def _worker(self):
+        """
+        Worker thread loop.
+        """
+        while True:
+            task = self.queue.get()
+            close_old_connections()
+            task.run()
+
+    def _start(self):
+        """
+        Lazily start the worker threads.
+        """
+        with self.lock:
+            while len(self.workers) < self.size:
+                worker = Thread(target=self._worker, name='lense-pool-{0}'.format(len(self.workers)))
+                worker.daemon = True
+                worker.start()
+                self.workers.append(worker)
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Submit a call to the pool.
+
+        :rtype: PoolTask
+        """
+        if len(self.workers) < self.size:
+            self._start()
+        task = PoolTask(func, args, kwargs)
+        self.queue.put(task)
+        return task
+
+    def run(self, *calls):
+        """
+        Run a list of (func, kwargs) calls concurrently and return their results
+        in order. The first exception raised by any call is re-raised.
+
+        Inside a transaction the calls run one after another on the calling
+        thread: worker threads have their own connections and would not see
+        rows the transaction has not committed yet.
+
+        :rtype: list
+        """
+        if connection.in_atomic_block:
+            return [func(**kwargs) for func, kwargs in calls]
+        tasks = [self.submit(func, **kwargs) for func, kwargs in calls]
+        return [task.wait() for task in tasks]
+
+# Shared worker pool
+POOL = WorkerPool(settings.API_POOL_THREADS)
@@ -0,0 +1,47 @@
+from django.conf import settings
+
+# Lense Libraries
+from lense.engine.api.core.invalidation import GenerationCache
+from lense.engine.api.handlers.handler import list_handlers
+
+# Request headers carrying API credentials
+CREDENTIAL_HEADERS = ['HTTP_LENSE_API_USER', 'HTTP_LENSE_API_GROUP', 'HTTP_LENSE_API_KEY', 'HTTP_LENSE_API_TOKEN']
+
+# Engine side responders for public handlers, by handler class
+RESPONDERS = {
+    'Handler_List': list_handlers
+}
+
+class PublicHandlers(object):
+    """
+    Answer anonymous requests for cheap public handlers without engine setup,
+    authentication, ACLs or manifests. A handler is public if it allows
+    anonymous requests and its class has an engine side responder. Public
+    handler keys are loaded from the handler table and cached until handlers
+    change. Requests with any API credentials take the normal path.
+    """
+    def __init__(self):
+        self.cache = GenerationCache('handler')
+
+    def _load(self):
+        """
+        Map the keys of public handlers to their handler class.
+        """
+        return dict([('{0}:{1}'.format(h.method, h.path), h.cls) for h in LENSE.OBJECTS.HANDLER.get_internal()
+                     if h.allow_anon and h.cls in RESPONDERS])
+
+    def responder(self, request):
+        """
+        Get the responder for an anonymous request to a public handler.
+
+        :param request: The Django request object
+        :type  request: HttpRequest
+        :rtype: callable|None
+        """
+        if any([request.META.get(header) for header in CREDENTIAL_HEADERS]):
+            return None
+        cls = self.cache.get('public', self._load).get('{0}:{1}'.format(request.method, request.path.strip('/')))
+        return None if not cls else RESPONDERS[cls]
+
+# Public handlers, if enabled
+PUBLIC = None if not settings.API_PUBLIC else PublicHandlers()
@@ -0,0 +1,210 @@
+from time import time
+from math import ceil
+from threading import BoundedSemaphore
+from contextlib import contextmanager
+from json import loads as json_loads
+
+# Django Libraries
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+# Lense Libraries
+from lense.common.exceptions import RequestError
+from lense.engine.api.core.shared import SharedTable
+from lense.engine.api.core.metrics import METRICS
+
+# Request headers identifying the API user and group
+HEADER_USER  = 'HTTP_LENSE_API_USER'
+HEADER_GROUP = 'HTTP_LENSE_API_GROUP'
+
+# Rate limit scopes
+SCOPES       = ['user', 'group', 'ip']
+
+# Metrics key for rate limiter counters
+METRICS_KEY  = 'ratelimit'
+
+class RateLimited(RequestError):
+    """
+    Raised when an authenticated client is over a rate limit.
+    """
+    def __init__(self, scope, retry):
+        super(RateLimited, self).__init__('Rate limit exceeded for {0}, retry in {1}s'.format(scope, retry), code=429)
+        self.retry = retry
+
+class AdmissionControl(object):
+    """
+    Cap the number of requests processed concurrently by an engine process.
+    Requests over the cap are rejected immediately rather than queued.
+    """
+    def __init__(self, limit):
+        self.limit     = limit
+        self.semaphore = None if not limit else BoundedSemaphore(limit)
+
+    def acquire(self):
+        """
+        Attempt to admit a request without blocking.
+
+        :rtype: bool
+        """
+        return True if not self.semaphore else self.semaphore.acquire(False)
+
+    def release(self):
+        """
+        Release an admitted request.
+        """
+        if self.semaphore:
+            self.semaphore.release()
+
+    @contextmanager
+    def suspend(self):
+        """
+        Give up the slot of an admitted request while it idles, e.g. in a
+        long-poll, and take it back afterwards, waiting for a free slot if
+        needed.
+        """
+        self.release()
+        try:
+            yield
+        finally:
+            if self.semaphore:
+                self.semaphore.acquire()
+
+class RateLimiter(object):
+    """
+    Token bucket rate limiter keyed by API user, group and client IP. Bucket
+    state lives in a shared memory table so limits apply across all engine
+    processes on the host. Limits are configured per handler in the rules file,
+    falling back to the default rules:
+
+    {
+        "default": {
+            "user": {"rate": 20, "burst": 40}
+        },
+        "handlers": {
+            "GET:stats/requests": {
+                "user": {"rate": 1, "burst": 5}
+            }
+        }
+    }
+
+    The client IP is checked before any work is done for a request. User and
+    group are only known once the request is authenticated, so their buckets
+    are checked after authentication. X-Forwarded-For is only used for the
+    client IP when the request comes from a trusted proxy.
+    """
+    def __init__(self):
+        self.proxies = set(settings.API_RATELIMIT_PROXIES)
+
+        # Load the rate limit rules
+        with open(settings.API_RATELIMIT_RULES, 'r') as f:
+            rules = json_loads(f.read())
+        self.default  = rules.get('default', {})
+        self.handlers = rules.get('handlers', {})
+        for name, scopes in [('default', self.default)] + self.handlers.items():
+            for scope, rule in scopes.items():
+                self._validate('{0}/{1}'.format(name, scope), rule)
+
+        # An idle bucket is full again after burst / rate seconds, and can then
+        # be dropped from the table like a bucket that was never used
+        refill     = [rule['burst'] / float(rule['rate']) for scopes in [self.default] + self.handlers.values() for rule in scopes.values()]
+        self.table = SharedTable(settings.API_RATELIMIT_STORE, slots=settings.API_RATELIMIT_SLOTS, ttl=int(ceil(max(refill or [1]))))
+
+    def _validate(self, name, rule):
+        """
+        Make sure a rule refills at a positive rate and allows at least one
+        request.
+        """
+        for key in ['rate', 'burst']:
+            value = rule.get(key)
+            if isinstance(value, bool) or not isinstance(value, (int, long, float)) or value <= 0:
+                raise ImproperlyConfigured('Rate limit rule {0} in {1} needs a positive "{2}", got: {3!r}'.format(name, settings.API_RATELIMIT_RULES, key, value))
+        if rule['burst'] < 1:
+            raise ImproperlyConfigured('Rate limit rule {0} in {1} needs a "burst" of at least 1'.format(name, settings.API_RATELIMIT_RULES))
+
+    def _client(self, request):
+        """
+        Extract the client IP address from the Django request: the last address
+        in X-Forwarded-For not added by a trusted proxy, if the request came
+        through one.
+        """
+        remote = request.META.get('REMOTE_ADDR', '')
+        if not remote in self.proxies:
+            return remote
+        forwarded = [addr.strip() for addr in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if addr.strip()]
+        for addr in reversed(forwarded):
+            if not addr in self.proxies:
+                return addr
+        return remote
+
+    def _rules(self, handler):
+        """
+        Get the rules in effect for a handler.
+        """
+        rules = dict(self.default)
+        rules.update(self.handlers.get(handler, {}))
+        return rules
+
+    def _take(self, key, rate, burst):
+        """
+        Take a single token from a bucket. Returns 0 if the request is allowed,
+        otherwise the number of seconds until a token is available.
+        """
+        now = time()
+
+        def _refill(values):
+            tokens, last = (float(burst), now) if not values else values
+            tokens       = min(float(burst), tokens + (now - last) * rate)
+            if tokens >= 1:
+                return tokens - 1, now, 0
+            return tokens, now, (1 - tokens) / rate
+
+        # Buckets that find no room in the table are not limited
+        full  = self.table.full
+        retry = self.table.update(key, _refill)
+        if self.table.full != full:
+            METRICS.incr(METRICS_KEY, table_full=1)
+        return retry
+
+    def _check(self, handler, clients):
+        """
+        Take a token from the bucket of each client scope with a rule.
+        """
+        rules = self._rules(handler)
+        for scope in SCOPES:
+            if not scope in rules or not clients.get(scope):
+                continue
+            rule  = rules[scope]
+            retry = self._take('{0}:{1}:{2}'.format(handler, scope, clients[scope]), rule['rate'], rule['burst'])
+            if retry:
+                return scope, int(ceil(retry))
+        return None
+
+    def check(self, request):
+        """
+        Check an incoming request against the client IP rate limits. Returns
+        None if the request is allowed, otherwise a tuple of the limited scope
+        and the number of seconds the client should wait before retrying.
+
+        :param request: The incoming Django request object
+        :type  request: HttpRequest
+        :rtype: tuple|None
+        """
+        return self._check('{0}:{1}'.format(request.method, request.path.strip('/')), {
+            'ip': self._client(request)
+        })
+
+    def check_user(self):
+        """
+        Check an authenticated request against the user and group rate limits.
+        Raises a 429 request error if the request is limited.
+        """
+        limited = self._check('{0}:{1}'.format(LENSE.REQUEST.method, LENSE.REQUEST.path), {
+            'user': LENSE.REQUEST.USER.name,
+            'group': LENSE.REQUEST.USER.group
+        })
+        if limited:
+            raise RateLimited(*limited)
+
+# Per-process admission control / shared rate limiter
+ADMISSION = AdmissionControl(settings.API_MAX_CONCURRENT)
+LIMITER   = None if not settings.API_RATELIMIT else RateLimiter()
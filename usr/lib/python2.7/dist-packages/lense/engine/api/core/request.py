@@ -1,16 +1,32 @@
 from time import time
-from sys import getsizeof
 from json import loads as json_loads
+from django.conf import settings
 
 # Lense Libraries
 from lense import import_class
-from lense.common.manifest.interface import ManifestInterface
 from lense.common.exceptions import RequestError, EnsureError, AuthError, ManifestError
+from lense.engine.api.core.log import LOG
+from lense.engine.api.core.health import health_check
+from lense.engine.api.core.tokens import TOKENS
+from lense.engine.api.core.ratelimit import ADMISSION, LIMITER, RateLimited
+from lense.engine.api.core.metrics import METRICS
+from lense.engine.api.core.context import start_context, end_context, get_context, materialize, UNMATCHED
+from lense.engine.api.core.capture import CAPTURE
+from lense.engine.api.core.memory import MEMORY
+from lense.engine.api.core.sketch import SKETCHES
+from lense.engine.api.core.sampling import SAMPLER
+from lense.engine.api.core.jobs import JOBS
+from lense.engine.api.core.idempotency import IDEMPOTENCY
+from lense.engine.api.core.coalesce import COALESCER
+from lense.engine.api.core.guard import GUARDS, authenticate_user, disconnect_socket
+from lense.engine.api.core.invalidation import MANIFESTS
+from lense.engine.api.core.tracing import TRACER
+from lense.engine.api.core.manifest import ManifestExecution
+from lense.engine.api.core.public import PUBLIC
 from lense.engine.api.handlers.stats import log_request_stats
 
-# Request timers
-REQ_START = None
-REQ_END   = None
+# Header used to request a manifest execution profile
+HEADER_PROFILE = 'HTTP_LENSE_MANIFEST_PROFILE'
 
 class RequestOK(object):
     def __init__(self, message, data):
@@ -27,13 +43,42 @@ def dispatch(request):
     :type request: object
     :rtype: object
     """
+
+    # Liveness/readiness checks
+    health = health_check(request.path.strip('/'))
+    if health is not None:
+        return health
+
+    # Reject early if the process is at capacity
+    if not ADMISSION.acquire():
+        return LENSE.HTTP.error('Server busy, too many concurrent requests', 503)
     try:
-        LENSE.LOG.info('<DISPATCH> [{0}] {1}'.format(LENSE.uuid4(), request))
-        return RequestManager.dispatch(request)
+
+        # Per-client IP rate limits
+        limited = None if not LIMITER else LIMITER.check(request)
+        if limited:
+            response = LENSE.HTTP.error('Rate limit exceeded for {0}, retry in {1}s'.format(*limited), 429)
+            response['Retry-After'] = str(limited[1])
+            return response
+
+        LOG.sample('{0}:{1}'.format(request.method, request.path.strip('/')))
+        LOG.info('<DISPATCH> [{0}] {1}', LENSE.uuid4(), request)
+
+        # Fail fast while the database circuit breaker is open
+        with TRACER.start(request) as root:
+            response = GUARDS['mysql'].call(RequestManager.dispatch, request)
+            root.set(**{'http.status_code': response.status_code})
+        return TRACER.propagate(response)
+
+    # Unavailable dependency
+    except RequestError as e:
+        return LENSE.HTTP.error(e.message, e.code)
 
     # Critical server error
     except Exception as e:
         return LENSE.HTTP.exception(str(e))
+    finally:
+        ADMISSION.release()
 
 class RequestManager(object):
     """
@@ -44,87 +89,244 @@ class RequestManager(object):
 
     The RequestManager class is instantiated by the dispatch method, which is called
     by the Django URLs module file. It is initialized with the Django request object.
+    Sub-requests of an already authenticated request (see the batch handler) are
+    initialized without a Django request; they skip the credential check, but
+    are still authorized against the ACLs of their own handler and count against
+    the user and group rate limits of that handler.
     """
-    def __init__(self, request):
+    def __init__(self, request, authenticate=True):
 
         # Request map
-        self.map = LENSE.API.map_request()
+        with TRACER.span('map_request'):
+            self.map = LENSE.API.map_request()
+
+        # The dispatched request mapped to a handler
+        context = get_context()
+        if context and request is not None and context.request is request:
+            context.mapped = True
+
+        # Return a manifest execution profile
+        self.profile = request is not None and request.META.get(HEADER_PROFILE, '').lower() in ['1', 'true', 'yes']
+
+        # Client supplied idempotency key for write requests
+        self.idempotency_key = None if not IDEMPOTENCY else IDEMPOTENCY.key(request)
+
+        # Authenticate the request, then apply the user and group rate limits
+        if authenticate:
+            with TRACER.span('authenticate'):
+                self.authenticate()
+            if LIMITER and not LENSE.REQUEST.is_anonymous:
+                LIMITER.check_user()
+
+        # Sub-request of an anonymous request
+        elif LENSE.REQUEST.is_anonymous:
+            LENSE.REQUEST.ensure(self.map['anon'],
+                isnot = False,
+                error = None if self.map['anon'] else 'Request handler <{0}:{1}> does not support anonymous requests'.format(LENSE.REQUEST.method, LENSE.REQUEST.path),
+                code  = 401)
+
+        # Sub-request of an authenticated request
+        else:
+            with TRACER.span('authorize'):
+                self.authorize()
+            if LIMITER:
+                LIMITER.check_user()
 
-        # Authenticate the request
-        self.authenticate()
+    def authorize(self):
+        """
+        Check the ACL access of the already authenticated request user to the
+        mapped handler, without checking credentials again.
+        """
+        materialize('acl')
+        authorized = LENSE.AUTH.ACL.authorized(path=LENSE.REQUEST.path, method=LENSE.REQUEST.method)
+        LENSE.REQUEST.ensure(authorized,
+            isnot = False,
+            error = None if authorized is not False else 'User {0} is not authorized for request handler <{1}:{2}>'.format(LENSE.REQUEST.USER.name, LENSE.REQUEST.method, LENSE.REQUEST.path),
+            code  = 401)
 
     def authenticate(self):
         """
         Authenticate the API request.
         """
-        LENSE.LOG.info('Authenticating API user: {0}, group={1}'.format(
-            LENSE.REQUEST.USER.name,
-            repr(LENSE.REQUEST.USER.group)
-        ))
-        handler_path = '{0}:{1}'.format(LENSE.REQUEST.method, LENSE.REQUEST.path)
+        LOG.info('Authenticating API user: {0}, group={1!r}', LENSE.REQUEST.USER.name, LENSE.REQUEST.USER.group)
 
         # Anonymous request
         if LENSE.REQUEST.is_anonymous:
-            return LENSE.REQUEST.ensure(self.map['anon'],
+            retval = LENSE.REQUEST.ensure(self.map['anon'],
                 isnot = False,
-                error = 'Request handler <{0}> does not support anonymous requests'.format(handler_path),
-                log   = 'Processing anonymous request for <{0}>'.format(handler_path),
+                error = None if self.map['anon'] else 'Request handler <{0}:{1}> does not support anonymous requests'.format(LENSE.REQUEST.method, LENSE.REQUEST.path),
                 code  = 401)
+            LOG.info('Processing anonymous request for <{0}:{1}>', LENSE.REQUEST.method, LENSE.REQUEST.path)
+            return retval
+
+        # Credentials are checked for any other request
+        materialize('auth')
 
         # Token request
         if LENSE.REQUEST.is_token:
-            return LENSE.REQUEST.ensure(LENSE.OBJECTS.USER.authenticate(),
+            retval = LENSE.REQUEST.ensure(authenticate_user(),
                 error = 'Token request failed',
-                log   = 'Token request OK for {0}'.format(LENSE.REQUEST.USER.name),
                 code  = 401)
+            LOG.info('Token request OK for {0}', LENSE.REQUEST.USER.name)
+            return retval
+
+        # Stateless token, verified in-process, then authorized for the handler
+        if settings.API_TOKEN_STATELESS and TOKENS.is_stateless(LENSE.REQUEST.USER.token):
+            LENSE.REQUEST.ensure(TOKENS.verify(LENSE.REQUEST.USER.token, LENSE.REQUEST.USER.name, LENSE.REQUEST.USER.group),
+                isnot = None,
+                error = 'Invalid, expired or revoked token',
+                code  = 401)
+            LOG.info('Stateless token authentication successful for user {0}', LENSE.REQUEST.USER.name)
+            return self.authorize()
 
         # Authenticated request
-        LENSE.REQUEST.ensure(LENSE.OBJECTS.USER.authenticate(),
+        LENSE.REQUEST.ensure(authenticate_user(),
             error = LENSE.OBJECTS.USER.auth_error,
-            log   = 'Authentication successful for user {0}'.format(LENSE.REQUEST.USER.name),
             code  = 401)
+        LOG.info('Authentication successful for user {0}', LENSE.REQUEST.USER.name)
+
+    def get_manifest(self, handler):
+        """
+        Get a handler manifest, from the per-process cache if enabled.
+
+        :param handler: The handler UUID
+        :type  handler: str
+        """
+        if not MANIFESTS:
+            return LENSE.OBJECTS.HANDLER.get_manifest(handler=handler)
+        return MANIFESTS.get(handler, lambda: LENSE.OBJECTS.HANDLER.get_manifest(handler=handler))
+
+    def execute(self):
+        """
+        Execute the handler manifest for the mapped request.
+
+        :rtype: RequestOK
+        """
+        with TRACER.span('manifest', **{'lense.handler': self.map['uuid']}):
+            execution = ManifestExecution(self.get_manifest(self.map['uuid']), profile=self.profile)
+            output    = execution.execute()
+
+        # Construct a response object
+        return RequestOK(message=output['message'], data=output['data'] if not self.profile else {
+            'data': output['data'],
+            'profile': execution.profile
+        })
 
     def run(self):
         """
         Worker method for processing the incoming API request.
         """
-        LENSE.LOG.info('<REQUEST> Incoming request: uuid={0}, path={1}, method={2}, user_agent={3}'.format(
-            LENSE.REQUEST.uuid, LENSE.REQUEST.path, LENSE.REQUEST.method, LENSE.REQUEST.agent
-        ))
-        output   = ManifestInterface(LENSE.OBJECTS.HANDLER.get_manifest(handler=self.map['uuid'])).execute()
+        LOG.info('<REQUEST> Incoming request: uuid={0}, path={1}, method={2}, user_agent={3}',
+            LENSE.REQUEST.uuid, LENSE.REQUEST.path, LENSE.REQUEST.method, LENSE.REQUEST.agent)
 
-        # Construct a response object
-        response = RequestOK(data=output['data'], message=output['message'])
+        # Retried write requests get the stored response
+        if self.idempotency_key:
+            return IDEMPOTENCY.run(self.idempotency_key, self.respond)
+
+        # Identical concurrent reads share one execution
+        if COALESCER and LENSE.REQUEST.method == 'GET' and not self.profile:
+            return COALESCER.run(self.respond)
+        return self.respond()
+
+    def respond(self):
+        """
+        Run the request, or queue it as a background job, and construct the
+        HTTP response.
+        """
+
+        # Long running handlers are queued as background jobs
+        job_type = None if not JOBS else JOBS.job_type(LENSE.REQUEST.method, LENSE.REQUEST.path)
+        if job_type:
+            return self.queue_job(job_type)
+        response = self.execute()
 
         # Close any open SocketIO connections
-        LENSE.SOCKET.disconnect()
+        disconnect_socket()
 
         # OK
         return LENSE.HTTP.success(response.message, response.data)
 
+    def queue_job(self, job_type):
+        """
+        Queue the request as a background job and accept it with a 202.
+
+        :param job_type: The job type
+        :type  job_type: str
+        """
+        uuid = JOBS.submit(job_type, LENSE.REQUEST.method, LENSE.REQUEST.path, LENSE.REQUEST.data)
+        LOG.info('<REQUEST> Queued request as {0} job: {1}', job_type, uuid)
+        response = LENSE.HTTP.success('Request accepted as background job', {
+            'job': uuid,
+            'type': job_type,
+            'status': 'queued'
+        })
+        response.status_code = 202
+        response['Location'] = '/job?uuid={0}'.format(uuid)
+        return response
+
+    @classmethod
+    def subrequest(cls, method, path, data):
+        """
+        Run a sub-request within the current, already authenticated, request
+        context. The request method, path and data are swapped for the duration
+        of the sub-request and restored afterwards. The sub-request is
+        authorized for its own method and path.
+
+        :param method: The sub-request method
+        :type  method: str
+        :param   path: The sub-request path
+        :type    path: str
+        :param   data: The sub-request data
+        :type    data: dict
+        :rtype: RequestOK
+        """
+        saved = (LENSE.REQUEST.method, LENSE.REQUEST.path, LENSE.REQUEST.data)
+        LENSE.REQUEST.method, LENSE.REQUEST.path, LENSE.REQUEST.data = method, path, data
+        try:
+            return cls(None, authenticate=False).execute()
+        finally:
+            LENSE.REQUEST.method, LENSE.REQUEST.path, LENSE.REQUEST.data = saved
+
     @classmethod
-    def log_request(cls, response=None, code=200):
+    def log_request(cls, response, time_ms):
         """
         Class method for logging request data.
 
-        :param response: The internal response object
-        :type  response: object
+        :param response: The HTTP response object
+        :type  response: HttpResponse
+        :param  time_ms: The request processing time in milliseconds
+        :type   time_ms: int
         """
+        context = get_context()
+
+        # Per-handler request counters and dispatch phase times
+        METRICS.incr(context.handler, requests=1, errors=0 if response.status_code < 400 else 1, time_ms=time_ms, **context.phases)
+
+        # Per-handler latency sketches, unmatched requests share one key
+        path, method = (context.path, context.method) if context.mapped else (UNMATCHED, UNMATCHED)
+        if SKETCHES:
+            SKETCHES.add(path, method, time_ms)
+
+        # Exact counters, and sampling of successful fast requests
+        weight = 1 if not SAMPLER else SAMPLER.record(path, method, response.status_code, time_ms)
+        if not weight:
+            return
 
         # Log the request stats
-        log_request_stats({
-            'path': LENSE.REQUEST.path,
-            'method': LENSE.REQUEST.method,
-            'client_ip': LENSE.REQUEST.client,
-            'client_user': LENSE.REQUEST.USER.name,
-            'client_group': LENSE.REQUEST.USER.group,
-            'endpoint': LENSE.REQUEST.host,
-            'user_agent': LENSE.REQUEST.agent,
-            'retcode': code,
-            'req_size': int(LENSE.REQUEST.size),
-            'rsp_size': int(getsizeof(getattr(response, 'data', ''))) + int(getsizeof(getattr(response, 'message', ''))),
-            'rsp_time_ms': REQ_END - REQ_START
-        })
+        try:
+            stats = dict(context.client)
+            stats.update({
+                'path': context.path,
+                'method': context.method,
+                'retcode': response.status_code,
+                'rsp_size': len(response.content),
+                'rsp_time_ms': time_ms
+            })
+            log_request_stats(stats, weight)
+
+        # Never fail a request on stats logging
+        except Exception as e:
+            LOG.exception('Failed to log request stats for <{0}>: {1}', context.handler, str(e))
 
     @classmethod
     def dispatch(cls, request):
@@ -134,24 +336,60 @@ class RequestManager(object):
         :param request: The incoming Django request object
         :type  request: HttpRequest
         """
+
+        # Request timer start and request context
+        start   = time()
+        context = start_context(request)
         try:
 
-            # Request timer start
-            REQ_START = int(round(time() * 1000))
+            # Anonymous requests for public handlers are answered by the engine,
+            # without engine setup, authentication, ACLs or manifests
+            public = None if not PUBLIC else PUBLIC.responder(request)
+            if public:
+                context.public = context.mapped = True
 
             # Setup Lense commons
-            LENSE.SETUP.engine(request)
+            else:
+                with TRACER.span('setup'):
+                    LENSE.SETUP.engine(request)
+                context.materialize('setup')
+                context.phase('setup', start)
 
-            # Run the request manager
-            response = cls(request).run()
+            memory = None
+            try:
 
-            # Request timer end
-            REQ_END = int(round(time() * 1000))
+                # Map and authenticate
+                if not public:
+                    phase   = time()
+                    with TRACER.span('init'):
+                        manager = cls(request)
+                    context.phase('init', phase)
 
-            # Return the response
-            return response
+                # Start memory accounting for the mapped handler, then run the request
+                memory  = None if not MEMORY else MEMORY.start(context.handler)
+                phase    = time()
+                with TRACER.span('run'):
+                    response = manager.run() if not public else LENSE.HTTP.success('Request successfull', public())
+                context.phase('run', phase)
 
-        # Internal request error
-        except (EnsureError, RequestError, AuthError, ManifestError) as e:
-            LENSE.LOG.exception(e.message)
-            return LENSE.HTTP.error(e.message, e.code)
+            # Internal request error
+            except (EnsureError, RequestError, AuthError, ManifestError) as e:
+                LOG.exception(e.message)
+                response = LENSE.HTTP.error(e.message, e.code)
+                if isinstance(e, RateLimited):
+                    response['Retry-After'] = str(e.retry)
+
+            # Log the request and return the response
+            time_ms = int(round((time() - start) * 1000))
+            request.lense_handler = context.handler
+            with TRACER.span('log_request'):
+                cls.log_request(response, time_ms)
+            if memory:
+                MEMORY.finish(memory)
+
+            # Capture the request for replay, public requests have no engine request
+            if CAPTURE and not context.public:
+                CAPTURE.record(response.status_code, time_ms)
+            return response
+        finally:
+            end_context()
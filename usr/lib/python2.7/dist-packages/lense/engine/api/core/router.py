@@ -0,0 +1,31 @@
+from django.conf import settings
+
+# Stats database alias
+STATS_DB = 'stats'
+
+class StatsRouter(object):
+    """
+    Pin request statistics and telemetry models to the stats database, so
+    stats inserts and scans never contend with the primary database used for
+    users, groups and handlers. All other models are left to the default.
+    """
+    def _is_stats(self, app_label):
+        return app_label in settings.API_STATS_APPS
+
+    def db_for_read(self, model, **hints):
+        return STATS_DB if self._is_stats(model._meta.app_label) else None
+
+    def db_for_write(self, model, **hints):
+        return STATS_DB if self._is_stats(model._meta.app_label) else None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if self._is_stats(obj1._meta.app_label) != self._is_stats(obj2._meta.app_label):
+            return False
+        return None
+
+    def allow_migrate(self, db, app_label, model=None, **hints):
+        """
+        Stats tables are only created in the stats database, and nothing else
+        is created there.
+        """
+        return (db == STATS_DB) == self._is_stats(app_label)
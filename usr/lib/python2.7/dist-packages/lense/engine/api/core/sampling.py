@@ -0,0 +1,150 @@
+import atexit
+from random import random
+from time import time, sleep
+from threading import Thread, Lock
+
+# Django Libraries
+from django.conf import settings
+from django.db import connections
+
+# Lense Libraries
+from lense.engine.api.core.log import LOG
+from lense.engine.api.objects.sampling.models import APIRequestCounter
+
+# Counter fields, in order
+COUNTERS = ('requests', 'errors', 'slow', 'logged', 'time_ms')
+
+class StatsSampler(object):
+    """
+    Decide which requests get a request stats row. Error responses and
+    requests slower than the latency threshold are always logged; other
+    requests are logged at a rate of 1 in N per handler, with a weight of N so
+    aggregates over the logged rows stay unbiased.
+
+    Exact per handler counters of all requests are kept in-process for fixed
+    time windows and flushed as rows by a background thread, the same way as
+    the latency sketches.
+    """
+    def __init__(self):
+        self.lock     = Lock()
+        self.thread   = None
+        self.counters = {}
+
+    def _window(self, timestamp):
+        return int(timestamp) - (int(timestamp) % settings.API_STATS_WINDOW)
+
+    def weight(self, path, method, code, time_ms):
+        """
+        Get the weight to log a request with, or 0 to skip it.
+
+        :rtype: int
+        """
+        if code >= 400 or time_ms >= settings.API_STATS_SLOW_MS:
+            return 1
+        rate = settings.API_STATS_SAMPLE_HANDLERS.get('{0}:{1}'.format(method, path), settings.API_STATS_SAMPLE_RATE)
+        if rate <= 1:
+            return 1
+        return rate if random() * rate < 1 else 0
+
+    def record(self, path, method, code, time_ms):
+        """
+        Count a finished request and decide if it is logged.
+
+        :param    path: The request path
+        :type     path: str
+        :param  method: The request method
+        :type   method: str
+        :param    code: The response status code
+        :type     code: int
+        :param time_ms: The request processing time in milliseconds
+        :type  time_ms: int
+        :rtype: int
+        """
+        self.start()
+        weight = self.weight(path, method, code, time_ms)
+        counts = (1, int(code >= 400), int(time_ms >= settings.API_STATS_SLOW_MS), int(weight > 0), time_ms)
+        key    = (path, method, self._window(time()))
+        with self.lock:
+            current = self.counters.get(key)
+            self.counters[key] = counts if not current else tuple([a + b for a, b in zip(current, counts)])
+        return weight
+
+    def flush(self):
+        """
+        Persist and reset the in-process counters.
+        """
+        with self.lock:
+            counters, self.counters = self.counters, {}
+        if not counters:
+            return
+        try:
+            APIRequestCounter.objects.bulk_create([APIRequestCounter(
+                path   = path,
+                method = method,
+                window = window,
+                **dict(zip(COUNTERS, counts))
+            ) for (path, method, window), counts in counters.iteritems()])
+        except Exception as e:
+            LOG.exception('Failed to flush request counters: {0}', str(e))
+
+    def _run(self):
+        """
+        Background flush loop.
+        """
+        while True:
+            sleep(settings.API_STATS_FLUSH)
+            self.flush()
+            connections.close_all()
+
+    def start(self):
+        """
+        Start the background flush thread if not already running.
+        """
+        if self.thread:
+            return
+        with self.lock:
+            if not self.thread:
+                self.thread = Thread(target=self._run, name='lense-stats-sampler')
+                self.thread.daemon = True
+                self.thread.start()
+                atexit.register(self.flush)
+
+    def totals(self, start, end, path=None, method=None):
+        """
+        Get the exact request counters per handler over a time range.
+
+        :param  start: Range start timestamp
+        :type   start: int
+        :param    end: Range end timestamp
+        :type     end: int
+        :param   path: Optional request path filter
+        :type    path: str
+        :param method: Optional request method filter
+        :type  method: str
+        :rtype: dict
+        """
+        totals = {}
+        def _add(p, m, counts):
+            key = '{0}:{1}'.format(m, p)
+            current = totals.get(key)
+            totals[key] = counts if not current else tuple([a + b for a, b in zip(current, counts)])
+
+        # Persisted counters
+        rows = APIRequestCounter.objects.filter(window__gte=self._window(start), window__lte=end)
+        if path:
+            rows = rows.filter(path=path)
+        if method:
+            rows = rows.filter(method=method)
+        for row in rows.values_list('path', 'method', *COUNTERS):
+            _add(row[0], row[1], row[2:])
+
+        # Counters not yet flushed
+        with self.lock:
+            pending = self.counters.items()
+        for (p, m, window), counts in pending:
+            if (self._window(start) <= window <= end) and (not path or p == path) and (not method or m == method):
+                _add(p, m, counts)
+        return dict([(key, dict(zip(COUNTERS, counts))) for key, counts in totals.iteritems()])
+
+# Sampled request stats logging, if enabled
+SAMPLER = None if not settings.API_STATS_SAMPLING else StatsSampler()
@@ -0,0 +1,106 @@
+from copy import deepcopy
+
+# Lense Libraries
+from lense.common.exceptions import RequestError
+
+# Schema types
+SCHEMA_TYPES = {
+    'str': lambda v: isinstance(v, basestring),
+    'int': lambda v: isinstance(v, (int, long)) and not isinstance(v, bool),
+    'float': lambda v: isinstance(v, (int, long, float)) and not isinstance(v, bool),
+    'bool': lambda v: isinstance(v, bool),
+    'dict': lambda v: isinstance(v, dict),
+    'list': lambda v: isinstance(v, list),
+    'any': lambda v: True
+}
+
+def compile_schema(schema, path='data'):
+    """
+    Compile a request schema into a validator function. Schemas use the same
+    format as the API templates (templates/api/base/socket.json):
+
+    _type:     The value type (str, int, float, bool, dict, list, any)
+    _required: Required keys for a dict
+    _optional: Optional keys for a dict, "*" allows any key
+    _children: Schemas for dict keys
+    _default:  Default value for an optional key
+    _nullable: Allow a null value
+
+    The validator type checks the whole payload in a single pass and returns
+    a copy of it with defaults applied, raising a RequestError on the first
+    invalid value.
+
+    :param schema: The schema definition
+    :type  schema: dict
+    :param   path: The key path used in error messages
+    :type    path: str
+    :rtype: function
+    """
+    stype    = schema.get('_type', 'any')
+    check    = SCHEMA_TYPES[stype]
+    nullable = schema.get('_nullable', False)
+
+    # Scalar values
+    if stype != 'dict':
+        def _validate_value(value):
+            if value is None and nullable:
+                return value
+            if not check(value):
+                raise RequestError('Invalid value for "{0}", expected {1}'.format(path, stype), code=400)
+            return value
+        return _validate_value
+
+    # Dictionary keys
+    required = schema.get('_required', [])
+    optional = schema.get('_optional', [])
+    any_key  = '*' in optional
+    allowed  = set(required) | set(optional)
+    children = dict([(k, compile_schema(v, '{0}/{1}'.format(path, k))) for k, v in schema.get('_children', {}).iteritems()])
+    defaults = dict([(k, v['_default']) for k, v in schema.get('_children', {}).iteritems() if '_default' in v])
+
+    def _validate_dict(value):
+        if value is None and nullable:
+            return value
+        if not check(value):
+            raise RequestError('Invalid value for "{0}", expected dict'.format(path), code=400)
+        for key in required:
+            if not key in value:
+                raise RequestError('Missing value for required key: {0}/{1}'.format(path, key), code=400)
+
+        # Validate each key
+        validated = {}
+        for key, item in value.iteritems():
+            if not any_key and not key in allowed:
+                raise RequestError('Unexpected key: {0}/{1}'.format(path, key), code=400)
+            validated[key] = item if not key in children else children[key](item)
+
+        # Apply defaults
+        for key, default in defaults.iteritems():
+            if not key in validated:
+                validated[key] = deepcopy(default)
+        return validated
+    return _validate_dict
+
+class RequestSchema(object):
+    """
+    Compiled request data schema for a handler.
+    """
+    def __init__(self, schema):
+        self.schema   = schema
+        self.validate = compile_schema(schema)
+
+# Compiled schemas by handler class
+_COMPILED = {}
+
+def get_schema(cls):
+    """
+    Get the compiled request schema for a handler class, compiling it on first
+    use.
+
+    :param cls: The handler class
+    :type  cls: class
+    :rtype: RequestSchema
+    """
+    if not cls in _COMPILED:
+        _COMPILED[cls] = RequestSchema(cls.schema)
+    return _COMPILED[cls]
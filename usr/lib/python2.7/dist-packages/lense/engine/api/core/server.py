@@ -0,0 +1,501 @@
+import os
+import sys
+import errno
+import atexit
+import random
+import signal
+import socket
+import logging
+import argparse
+import subprocess
+from time import time, sleep
+from select import select, error as SelectError
+from threading import Thread, Lock
+from wsgiref.simple_server import WSGIServer, WSGIRequestHandler
+
+# Lense Libraries
+from lense.common import config
+
+# Environment: set while running under the prefork server / listener and ready pipe descriptors
+PREFORK_ENV  = 'LENSE_ENGINE_PREFORK'
+LISTENER_ENV = 'LENSE_ENGINE_LISTENER'
+READY_ENV    = 'LENSE_ENGINE_READY'
+
+# Not exposed by the socket module on Python 2
+SO_REUSEPORT = getattr(socket, 'SO_REUSEPORT', 15)
+
+# Server log, written to stderr
+LOG = logging.getLogger('lense.engine.server')
+
+def _signals(handlers):
+    """
+    Install signal handlers, as a map of signal to handler or SIG_IGN/SIG_DFL.
+    """
+    for signum, handler in handlers.items():
+        signal.signal(signum, handler)
+
+def _listen(host, port, backlog, reuse_port=False):
+    """
+    Create a listening TCP socket.
+
+    :rtype: socket
+    """
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.setblocking(0)
+    return sock
+
+def _accept(sock):
+    """
+    Accept a connection from a non-blocking listener shared with other
+    threads and processes. Returns None if another one got it first.
+    """
+    try:
+        conn, addr = sock.accept()
+    except socket.error as e:
+        if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK, errno.ECONNABORTED, errno.EINTR):
+            return None
+        raise
+    conn.setblocking(1)
+    return conn, addr
+
+def _readable(fd, timeout):
+    """
+    Wait for a socket or descriptor to become readable. Returns False on
+    timeout, or when the wait is interrupted by a signal.
+    """
+    try:
+        return bool(select([fd], [], [], timeout)[0])
+    except SelectError:
+        return False
+
+def load_wsgi():
+    """
+    Import the engine WSGI module, without starting its background services
+    (started per process by the server instead).
+
+    :rtype: module
+    """
+    os.environ[PREFORK_ENV] = '1'
+    from lense.engine.api.core import wsgi
+    return wsgi
+
+class RequestHandler(WSGIRequestHandler):
+    """
+    One request per connection; access logging is left to the engine.
+    """
+    def log_message(self, *args):
+        pass
+
+class WSGIHost(WSGIServer):
+    """
+    WSGI server state shared by the request threads of a worker. Connections
+    are accepted by the worker, so no socket is bound here.
+    """
+    def __init__(self, sock, app, timeout):
+        self.socket         = sock
+        self.server_address = sock.getsockname()
+        self.server_name    = socket.getfqdn(self.server_address[0])
+        self.server_port    = self.server_address[1]
+        self.RequestHandlerClass = RequestHandler
+        RequestHandler.timeout   = timeout
+        self.setup_environ()
+        self.set_app(app)
+
+class Worker(object):
+    """
+    Serving process: a fixed number of threads accept and handle connections
+    from the listener. The worker stops gracefully (stops accepting and lets
+    in-flight requests finish) on SIGTERM, after serving its request limit, or
+    once its resident memory exceeds the limit; the generation then replaces
+    it.
+    """
+    def __init__(self, opts, listener, wsgi, ready):
+        self.opts     = opts
+        self.listener = listener
+        self.wsgi     = wsgi
+        self.ready    = ready
+        self.running  = True
+        self.lock     = Lock()
+        self.served   = 0
+        self.limit    = 0 if not opts.max_requests else opts.max_requests + random.randint(0, opts.max_requests_jitter)
+
+    def stop(self, *args):
+        self.running = False
+
+    def _serve(self, host):
+        """
+        Request thread loop.
+        """
+        while self.running:
+            if not _readable(self.listener, 1.0):
+                continue
+            accepted = _accept(self.listener)
+            if accepted:
+                self._handle(host, *accepted)
+
+    def _handle(self, host, conn, addr):
+        try:
+            host.finish_request(conn, addr)
+        except Exception:
+            LOG.exception('Worker {0} failed to handle connection from {1}'.format(os.getpid(), addr))
+        finally:
+            host.shutdown_request(conn)
+        with self.lock:
+            self.served += 1
+
+    def _recycle(self, rss_kb):
+        """
+        Check the request and memory limits.
+        """
+        if self.limit and self.served >= self.limit:
+            LOG.info('Worker {0} recycling after {1} requests'.format(os.getpid(), self.served))
+            return True
+        if self.opts.max_memory and rss_kb() > self.opts.max_memory * 1024:
+            LOG.info('Worker {0} recycling at {1}KB resident memory'.format(os.getpid(), rss_kb()))
+            return True
+        return False
+
+    def run(self):
+        _signals({signal.SIGTERM: self.stop, signal.SIGINT: signal.SIG_IGN, signal.SIGHUP: signal.SIG_IGN})
+        random.seed()
+
+        # Own listener per worker, balanced by the kernel
+        if self.opts.reuse_port:
+            self.listener = _listen(self.opts.host, self.opts.port, self.opts.backlog, reuse_port=True)
+        wsgi = self.wsgi or load_wsgi()
+
+        # Per process background services
+        wsgi.start_process()
+        from lense.engine.api.core.memory import rss_kb
+
+        # Start the request threads
+        host    = WSGIHost(self.listener, wsgi.application, self.opts.timeout)
+        threads = [Thread(target=self._serve, args=(host,), name='lense-server-{0}'.format(i)) for i in range(self.opts.threads)]
+        for thread in threads:
+            thread.start()
+        os.write(self.ready, b'1')
+
+        # Wait for a stop signal or a recycling limit
+        while self.running:
+            sleep(1)
+            if self._recycle(rss_kb):
+                self.running = False
+
+        # Drain in-flight requests
+        for thread in threads:
+            thread.join()
+
+        # Serve connections already queued on our own listener
+        if self.opts.reuse_port:
+            accepted = _accept(self.listener)
+            while accepted:
+                self._handle(host, *accepted)
+                accepted = _accept(self.listener)
+        self.listener.close()
+        return 0
+
+class Generation(object):
+    """
+    A generation of workers running one copy of the engine code. The
+    generation process optionally preloads the application, so workers forked
+    from it share its memory copy-on-write, forks the background job workers
+    once, and keeps the configured number of serving workers running,
+    replacing workers that exit. It reports ready to the master once all
+    workers are serving, and drains its workers on SIGTERM.
+    """
+    def __init__(self, opts):
+        self.opts     = opts
+        self.running  = True
+        self.workers  = {}
+        self.jobs     = None
+        self.wsgi     = None
+        self.listener = None
+
+        # Job process run flag
+        self.jobs_running = True
+
+    def stop(self, *args):
+        self.running = False
+
+    def _stop_jobs(self, *args):
+        self.jobs_running = False
+
+    def _fork(self, target):
+        """
+        Fork a child running target, and return its PID. The child runs its
+        own exit handlers and leaves without returning into the generation.
+        """
+        pid = os.fork()
+        if pid:
+            return pid
+        status = 1
+        try:
+            status = target()
+        except Exception:
+            LOG.exception('Engine process {0} failed'.format(os.getpid()))
+        finally:
+            try:
+                atexit._run_exitfuncs()
+            finally:
+                os._exit(status)
+
+    def _spawn_worker(self):
+        worker = Worker(self.opts, self.listener, self.wsgi, self.ready_w)
+        self.workers[self._fork(worker.run)] = time()
+
+    def _run_jobs(self):
+        """
+        Background job workers, run from their own process so the serving
+        workers forked later do not inherit them.
+        """
+        _signals({signal.SIGTERM: self._stop_jobs, signal.SIGINT: signal.SIG_IGN, signal.SIGHUP: signal.SIG_IGN})
+        wsgi = self.wsgi or load_wsgi()
+        wsgi.start_jobs()
+        while self.jobs_running:
+            signal.pause()
+        return 0
+
+    def _reap(self):
+        """
+        Collect exited children and replace them while running.
+        """
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except OSError:
+                return
+            if not pid:
+                return
+            if pid == self.jobs:
+                self.jobs = None
+                if self.running:
+                    LOG.error('Job process {0} exited with status {1}'.format(pid, status))
+                    sleep(1)
+                    self.jobs = self._fork(self._run_jobs)
+                continue
+            started = self.workers.pop(pid, None)
+            if started is None or not self.running:
+                continue
+            if status:
+                LOG.error('Worker {0} exited with status {1}'.format(pid, status))
+
+                # Crashing on start, back off
+                if (time() - started) < 1:
+                    sleep(1)
+            self._spawn_worker()
+
+    def _wait_ready(self):
+        """
+        Wait for the initial workers to report serving.
+        """
+        ready, deadline = 0, time() + self.opts.graceful_timeout
+        while ready < self.opts.workers and time() < deadline and self.running:
+            if _readable(self.ready_r, 0.5):
+                ready += len(os.read(self.ready_r, self.opts.workers))
+            self._reap()
+        return ready >= self.opts.workers
+
+    def _exited(self, pid):
+        try:
+            return bool(os.waitpid(pid, os.WNOHANG)[0])
+        except OSError:
+            return True
+
+    def _shutdown(self):
+        """
+        Stop all children gracefully, killing any left after the timeout.
+        """
+        children = list(self.workers.keys()) + ([self.jobs] if self.jobs else [])
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+        deadline = time() + self.opts.graceful_timeout
+        while children and time() < deadline:
+            children = [pid for pid in children if not self._exited(pid)]
+            sleep(0.1)
+        for pid in children:
+            LOG.warning('Killing engine process {0} after {1}s graceful timeout'.format(pid, self.opts.graceful_timeout))
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+
+    def run(self):
+        _signals({signal.SIGTERM: self.stop, signal.SIGINT: signal.SIG_IGN, signal.SIGHUP: signal.SIG_IGN})
+        if not self.opts.reuse_port:
+            fd = int(os.environ[LISTENER_ENV])
+            self.listener = socket.socket(_sock=socket.fromfd(fd, socket.AF_INET6 if ':' in self.opts.host else socket.AF_INET, socket.SOCK_STREAM))
+            os.close(fd)
+            self.listener.setblocking(0)
+        master_ready = int(os.environ[READY_ENV])
+
+        # Load the application before forking, and drop connections made while loading
+        if self.opts.preload:
+            self.wsgi = load_wsgi()
+            from django.db import connections
+            connections.close_all()
+
+        # Fork the job and serving workers
+        self.ready_r, self.ready_w = os.pipe()
+        try:
+            self.jobs = self._fork(self._run_jobs)
+            for i in range(self.opts.workers):
+                self._spawn_worker()
+            if not self._wait_ready():
+                LOG.error('Generation {0} workers failed to start'.format(os.getpid()))
+                return 1
+            LOG.info('Generation {0} serving with {1} workers x {2} threads'.format(os.getpid(), self.opts.workers, self.opts.threads))
+            os.write(master_ready, b'1')
+            os.close(master_ready)
+
+            # Supervise the workers
+            while self.running:
+                if _readable(self.ready_r, 0.5):
+                    os.read(self.ready_r, 64)
+                self._reap()
+            return 0
+        finally:
+            self._shutdown()
+            LOG.info('Generation {0} stopped'.format(os.getpid()))
+
+class Master(object):
+    """
+    Prefork master process. Holds the listening socket (unless workers bind
+    their own with SO_REUSEPORT) and runs worker generations as separately
+    executed processes, so a reload always loads fresh code and
+    configuration.
+
+    SIGHUP starts a new generation; once all of its workers are serving, the
+    old generation is told to stop and drains its in-flight requests. If the
+    new generation fails to start, the old one keeps serving. SIGTERM and
+    SIGINT stop the server gracefully.
+    """
+    def __init__(self, opts, argv):
+        self.opts     = opts
+        self.argv     = argv
+        self.running  = True
+        self.reload   = False
+        self.current  = None
+        self.pending  = None
+        self.retiring = []
+        self.listener = None
+
+    def stop(self, *args):
+        self.running = False
+
+    def hup(self, *args):
+        self.reload = True
+
+    def _spawn(self):
+        """
+        Start a generation process and return (process, ready pipe).
+        """
+        ready_r, ready_w = os.pipe()
+        env = dict(os.environ)
+        env[READY_ENV] = str(ready_w)
+        if self.listener:
+            env[LISTENER_ENV] = str(self.listener.fileno())
+        process = subprocess.Popen([sys.executable, '-m', 'lense.engine.api.core.server', '--generation'] + self.argv, env=env, close_fds=False)
+        os.close(ready_w)
+        return process, ready_r
+
+    def _retire(self, generation):
+        process, ready_r = generation
+        os.close(ready_r)
+        if process.poll() is None:
+            process.send_signal(signal.SIGTERM)
+            self.retiring.append(process)
+
+    def _check(self):
+        """
+        Track generation startup, exits and reloads.
+        """
+        self.retiring = [process for process in self.retiring if process.poll() is None]
+
+        # New generation serving, retire the previous one
+        if self.pending:
+            process, ready_r = self.pending
+            if _readable(ready_r, 0) and os.read(ready_r, 1):
+                if self.current:
+                    self._retire(self.current)
+                self.current, self.pending = self.pending, None
+            elif process.poll() is not None:
+                LOG.error('Generation {0} failed to start, exit status {1}'.format(process.pid, process.returncode))
+                os.close(ready_r)
+                self.pending = None
+                sleep(1)
+
+        # Serving generation exited
+        if self.current and self.current[0].poll() is not None:
+            LOG.error('Generation {0} exited with status {1}'.format(self.current[0].pid, self.current[0].returncode))
+            os.close(self.current[1])
+            self.current = None
+
+        # Reload requested, or nothing serving
+        if (self.reload or not self.current) and not self.pending:
+            if self.reload:
+                LOG.info('Reloading engine workers')
+            self.reload  = False
+            self.pending = self._spawn()
+
+    def run(self):
+        _signals({signal.SIGTERM: self.stop, signal.SIGINT: self.stop, signal.SIGHUP: self.hup})
+        if not self.opts.reuse_port:
+            self.listener = _listen(self.opts.host, self.opts.port, self.opts.backlog)
+        LOG.info('Engine server master {0} listening on {1}:{2}'.format(os.getpid(), self.opts.host, self.opts.port))
+        while self.running:
+            self._check()
+            sleep(0.5)
+
+        # Stop all generations
+        generations = [g for g in [self.current, self.pending] if g]
+        for generation in generations:
+            self._retire(generation)
+        for process in self.retiring:
+            process.wait()
+        LOG.info('Engine server master {0} stopped'.format(os.getpid()))
+        return 0
+
+def options(argv):
+    """
+    Parse the server options. Defaults come from the "server" section of the
+    engine configuration, read directly so the master never loads Django.
+    """
+    conf   = config.parse('ENGINE')
+    parser = argparse.ArgumentParser(prog='lense-engine', description='Lense API engine prefork HTTP server')
+    parser.add_argument('--host', default=conf.server.host, help='Address to listen on')
+    parser.add_argument('--port', type=int, default=conf.engine.port, help='Port to listen on')
+    parser.add_argument('--backlog', type=int, default=conf.server.backlog, help='Listen backlog')
+    parser.add_argument('--workers', type=int, default=conf.server.workers, help='Worker processes')
+    parser.add_argument('--threads', type=int, default=conf.server.threads, help='Request threads per worker')
+    parser.add_argument('--timeout', type=int, default=conf.server.timeout, help='Client socket timeout in seconds')
+    parser.add_argument('--graceful-timeout', type=int, default=conf.server.graceful_timeout, help='Seconds to drain workers before killing them')
+    parser.add_argument('--max-requests', type=int, default=conf.server.max_requests, help='Recycle workers after this many requests (0 disables)')
+    parser.add_argument('--max-requests-jitter', type=int, default=conf.server.max_requests_jitter, help='Random extra requests per worker, to stagger recycling')
+    parser.add_argument('--max-memory', type=int, default=conf.server.max_memory_mb, help='Recycle workers above this resident memory in MB (0 disables)')
+    parser.add_argument('--preload', dest='preload', action='store_true', default=conf.server.preload, help='Load the application before forking workers')
+    parser.add_argument('--no-preload', dest='preload', action='store_false')
+    parser.add_argument('--reuse-port', dest='reuse_port', action='store_true', default=conf.server.reuse_port, help='Give each worker its own SO_REUSEPORT listener')
+    parser.add_argument('--no-reuse-port', dest='reuse_port', action='store_false')
+    parser.add_argument('--generation', action='store_true', help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """
+    Server entry point.
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(process)d] %(levelname)s %(message)s')
+    opts = options(argv)
+    if opts.generation:
+        return Generation(opts).run()
+    return Master(opts, [arg for arg in argv if arg != '--generation']).run()
+
+if __name__ == '__main__':
+    sys.exit(main())
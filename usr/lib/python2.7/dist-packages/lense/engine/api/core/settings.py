@@ -1,4 +1,5 @@
 import os
+import sys
 
 # Lense Libraries
 from lense.common import config
@@ -12,7 +13,7 @@ CONF             = config.parse('ENGINE')
 BASE_DIR         = os.path.dirname(os.path.dirname(__file__))
 
 # Debug mode
-DEBUG            = True
+DEBUG            = CONF.engine.debug
 
 # Hosts allowed to use the API
 ALLOWED_HOSTS    = []
@@ -30,6 +31,95 @@ USE_TZ           = True
 # API token lifetime in hours
 API_TOKEN_LIFE   = 1
 
+# Stateless API tokens / revocation store
+API_TOKEN_STATELESS   = CONF.token.stateless
+API_TOKEN_REVOCATIONS = CONF.token.revocations
+
+# Request admission control / rate limiting
+API_MAX_CONCURRENT    = CONF.ratelimit.max_concurrent
+API_RATELIMIT         = CONF.ratelimit.enable
+API_RATELIMIT_STORE   = CONF.ratelimit.store
+API_RATELIMIT_SLOTS   = CONF.ratelimit.slots
+API_RATELIMIT_RULES   = CONF.ratelimit.rules
+API_RATELIMIT_PROXIES = CONF.ratelimit.trusted_proxies
+
+# Manifest execution budgets in seconds / slow manifest threshold
+API_MANIFEST_TIMEOUT      = CONF.manifest.timeout
+API_MANIFEST_STEP_TIMEOUT = CONF.manifest.step_timeout
+API_MANIFEST_SLOW_MS      = CONF.manifest.slow_ms
+
+# Worker pool threads for concurrent lookups
+API_POOL_THREADS = CONF.engine.pool_threads
+
+# Query auditing / repeated query shape threshold
+API_QUERY_AUDIT            = CONF.query_audit.enable
+API_QUERY_REPEAT_THRESHOLD = CONF.query_audit.threshold
+
+# Queued logging / debug log sampling, 1 in N requests per METHOD:path handler
+API_LOG_QUEUE             = CONF.logging.queue
+API_LOG_DEBUG_SAMPLE_RATE = CONF.logging.debug_sample
+API_LOG_DEBUG_SAMPLE      = dict([(h.rsplit('=', 1)[0], int(h.rsplit('=', 1)[1])) for h in CONF.logging.debug_sample_handlers])
+
+# Maximum sub-requests per batch request
+API_BATCH_MAX = CONF.batch.max_requests
+
+# Change journal: shared sequence store, long-poll limit/interval/journal interval/waiters, page size, sequence gap wait
+API_CHANGES_STORE        = CONF.changes.store
+API_CHANGES_TIMEOUT      = CONF.changes.timeout
+API_CHANGES_POLL         = CONF.changes.poll_ms
+API_CHANGES_JOURNAL_POLL = CONF.changes.journal_poll_ms
+API_CHANGES_WAITERS      = CONF.changes.waiters
+API_CHANGES_LIMIT        = CONF.changes.limit
+API_CHANGES_GAP_WAIT     = CONF.changes.gap_wait
+
+# Answer anonymous requests for public handlers without engine setup
+API_PUBLIC = CONF.public.enable
+
+# Cache invalidation: shared generation store, journal sync interval, cache TTL and Unix socket broadcast
+API_INVALIDATION_STORE           = CONF.invalidation.store
+API_INVALIDATION_SYNC            = CONF.invalidation.sync_interval
+API_INVALIDATION_TTL             = CONF.invalidation.ttl
+API_INVALIDATION_BROADCAST       = CONF.invalidation.broadcast
+API_INVALIDATION_SOCKETS         = CONF.invalidation.sockets
+API_INVALIDATION_CACHE_MANIFESTS = CONF.invalidation.cache_manifests
+
+# Credentials worker processes (0 runs inline), queue depth, timeout in seconds and
+# worker interpreter. Under mod_wsgi sys.executable is not the Python interpreter,
+# the default is derived from the installation prefix instead
+API_CREDENTIALS_WORKERS = CONF.credentials.workers
+API_CREDENTIALS_QUEUE   = CONF.credentials.queue
+API_CREDENTIALS_TIMEOUT = CONF.credentials.timeout
+API_CREDENTIALS_PYTHON  = CONF.credentials.python or os.path.join(sys.exec_prefix, 'bin', 'python{0}.{1}'.format(*sys.version_info[:2]))
+
+# Health check probe interval / probe timeout in seconds
+API_HEALTH_INTERVAL = CONF.health.interval
+API_HEALTH_TIMEOUT  = CONF.health.timeout
+
+# Traffic capture file, rotation size and backups
+API_CAPTURE           = CONF.capture.enable
+API_CAPTURE_FILE      = CONF.capture.file
+API_CAPTURE_MAX_BYTES = CONF.capture.max_bytes
+API_CAPTURE_BACKUPS   = CONF.capture.backups
+
+# Per-request memory accounting and allocation trace sampling
+API_MEMORY             = CONF.memory.enable
+API_MEMORY_SAMPLE_RATE = CONF.memory.sample_rate
+API_MEMORY_TOP         = CONF.memory.top
+
+# Latency sketch windows, flush interval and relative accuracy
+API_SKETCHES        = CONF.sketches.enable
+API_SKETCH_WINDOW   = CONF.sketches.window
+API_SKETCH_FLUSH    = CONF.sketches.flush_interval
+API_SKETCH_ACCURACY = CONF.sketches.accuracy
+
+# Request stats sampling: default and per-handler 1 in N rates, slow request threshold and exact counter windows
+API_STATS_SAMPLING        = CONF.stats_sampling.enable
+API_STATS_SAMPLE_RATE     = CONF.stats_sampling.rate
+API_STATS_SAMPLE_HANDLERS = dict([(h.rsplit('=', 1)[0], int(h.rsplit('=', 1)[1])) for h in CONF.stats_sampling.handlers])
+API_STATS_SLOW_MS         = CONF.stats_sampling.slow_ms
+API_STATS_WINDOW          = CONF.stats_sampling.window
+API_STATS_FLUSH           = CONF.stats_sampling.flush_interval
+
 # Static files
 STATIC_URL       = '/static/'
 
@@ -76,10 +166,74 @@ DATABASES = {
         'USER':     CONF.db.user,
         'PASSWORD': CONF.db.password,
         'HOST':     CONF.db.host,
-        'PORT':     CONF.db.port
+        'PORT':     CONF.db.port,
+        'OPTIONS':  {
+            'connect_timeout': CONF.guard.db_connect_timeout
+        }
+    },
+    'stats': {
+        'ENGINE':   'django.db.backends.{0}'.format(CONF.stats_db.engine),
+        'NAME':     CONF.stats_db.name,
+        'USER':     CONF.stats_db.user,
+        'PASSWORD': CONF.stats_db.password,
+        'HOST':     CONF.stats_db.host,
+        'PORT':     CONF.stats_db.port
     }
 }
 
+# Applications whose models live in the stats database
+API_STATS_APPS = ['stats', 'sketches', 'sampling']
+
+# Database routers
+DATABASE_ROUTERS = ['lense.engine.api.core.router.StatsRouter']
+
+# Background jobs: workers, claim poll/timeout/lock, per-type limits, METHOD:path=type handlers
+API_JOBS          = CONF.jobs.enable
+API_JOBS_WORKERS  = CONF.jobs.workers
+API_JOBS_POLL     = CONF.jobs.poll_ms
+API_JOBS_TIMEOUT  = CONF.jobs.timeout
+API_JOBS_LOCK     = CONF.jobs.lock
+API_JOBS_LIMIT    = CONF.jobs.limit
+API_JOBS_LIMITS   = dict([(l.rsplit('=', 1)[0], int(l.rsplit('=', 1)[1])) for l in CONF.jobs.limits])
+API_JOBS_HANDLERS = dict([h.rsplit('=', 1) for h in CONF.jobs.handlers])
+
+# Idempotency keys: stored response TTL, duplicate wait limit and poll interval
+API_IDEMPOTENCY      = CONF.idempotency.enable
+API_IDEMPOTENCY_TTL  = CONF.idempotency.ttl
+API_IDEMPOTENCY_WAIT = CONF.idempotency.wait
+API_IDEMPOTENCY_POLL = CONF.idempotency.poll_ms
+
+# GET request coalescing: follower wait limit, default ACL scope and METHOD:path=scope overrides
+API_COALESCE          = CONF.coalesce.enable
+API_COALESCE_TIMEOUT  = CONF.coalesce.timeout
+API_COALESCE_SCOPE    = CONF.coalesce.scope
+API_COALESCE_HANDLERS = dict([h.rsplit('=', 1) for h in CONF.coalesce.handlers])
+
+# Dependency guards: circuit breaker window/thresholds, call timeouts and mail spool
+API_GUARD_WINDOW            = CONF.guard.window
+API_GUARD_MIN_CALLS         = CONF.guard.min_calls
+API_GUARD_FAILURE_RATE      = CONF.guard.failure_rate
+API_GUARD_RESET             = CONF.guard.reset_timeout
+API_GUARD_MAX_INFLIGHT      = CONF.guard.max_inflight
+API_GUARD_SMTP_TIMEOUT      = CONF.guard.smtp_timeout
+API_GUARD_SOCKET_TIMEOUT    = CONF.guard.socket_timeout
+API_GUARD_LDAP_TIMEOUT      = CONF.guard.ldap_timeout
+API_GUARD_MAIL_SPOOL        = CONF.guard.mail_spool
+API_GUARD_MAIL_RETRY        = CONF.guard.mail_retry
+API_GUARD_MAIL_MAX_AGE      = CONF.guard.mail_max_age
+API_GUARD_MAIL_MAX_ATTEMPTS = CONF.guard.mail_max_attempts
+
+# Request tracing: head sampling rate and batched span export to a file or OTLP/HTTP collector
+API_TRACING             = CONF.tracing.enable
+API_TRACING_SAMPLE_RATE = CONF.tracing.sample_rate
+API_TRACING_SINK        = CONF.tracing.sink
+API_TRACING_FILE        = CONF.tracing.file
+API_TRACING_OTLP        = CONF.tracing.otlp_endpoint
+API_TRACING_BATCH       = CONF.tracing.batch_size
+API_TRACING_FLUSH       = CONF.tracing.flush_interval
+API_TRACING_QUEUE       = CONF.tracing.queue_size
+API_TRACING_SERVICE     = CONF.tracing.service
+
 # Managed applications
 INSTALLED_APPS = get_applications([
     'django.contrib.admin',
@@ -87,7 +241,13 @@ INSTALLED_APPS = get_applications([
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
-    'django.contrib.staticfiles'                            
+    'django.contrib.staticfiles',
+    'lense.engine.api.apps.EngineConfig',
+    'lense.engine.api.objects.changes',
+    'lense.engine.api.objects.sketches',
+    'lense.engine.api.objects.sampling',
+    'lense.engine.api.objects.jobs',
+    'lense.engine.api.objects.idempotency'
 ])
 
 # Django middleware classes
@@ -97,4 +257,8 @@ MIDDLEWARE_CLASSES = (
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-)
\ No newline at end of file
+)
+
+# Query count / N+1 detection middleware
+if API_QUERY_AUDIT:
+    MIDDLEWARE_CLASSES += ('lense.engine.api.core.middleware.QueryCountMiddleware',)
\ No newline at end of file
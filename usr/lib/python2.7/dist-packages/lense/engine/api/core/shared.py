@@ -0,0 +1,125 @@
+import mmap
+from time import time
+from struct import Struct
+from hashlib import md5
+from threading import Lock
+from fcntl import flock, LOCK_EX, LOCK_UN
+from os import path, open as os_open, close as os_close, fstat, ftruncate, makedirs, O_RDWR, O_CREAT
+
+class SharedTable(object):
+    """
+    Fixed size hash table of float pairs stored in a memory mapped file, shared
+    between all engine processes on a host. Used as a local stand-in for an
+    external store wherever engine processes need to share small counters.
+
+    Each slot holds a 64 bit key hash, two double values and the time the key
+    was last written. Keys are placed with linear probing over at most PROBE
+    slots. With a TTL, keys not written for longer than the TTL are expired
+    and their slots reused. A key that finds no free slot is not stored:
+    updates see it as unset and are not written, so a full table fails open
+    instead of overwriting live keys.
+    """
+    SLOT  = Struct('<Qddd')
+    PROBE = 32
+
+    def __init__(self, filename, slots=4096, ttl=None):
+        self.filename = filename
+        self.slots    = slots
+        self.ttl      = ttl
+        self.lock     = Lock()
+
+        # Updates not stored because the table was full
+        self.full     = 0
+
+        # Make sure the parent directory exists
+        if not path.isdir(path.dirname(filename)):
+            makedirs(path.dirname(filename))
+
+        # Open and size the backing file, clearing a file of another size or layout
+        self.fd   = os_open(filename, O_RDWR|O_CREAT, 0o640)
+        size      = self.SLOT.size * slots
+        if fstat(self.fd).st_size != size:
+            ftruncate(self.fd, 0)
+            ftruncate(self.fd, size)
+        self.mmap = mmap.mmap(self.fd, size)
+
+    def _hash(self, key):
+        """
+        Map a key to a non-zero 64 bit hash. Zero marks an empty slot.
+        """
+        return int(md5(key).hexdigest()[:16], 16) or 1
+
+    def _find(self, khash):
+        """
+        Find the slot offset for a key hash. Returns the offset of the key and
+        True if present, otherwise the offset of a free or expired slot to
+        claim, or None if there is none, and False.
+        """
+        home    = khash % self.slots
+        expired = None
+        horizon = None if not self.ttl else time() - self.ttl
+        for i in range(min(self.PROBE, self.slots)):
+            offset  = ((home + i) % self.slots) * self.SLOT.size
+            current, a, b, written = self.SLOT.unpack_from(self.mmap, offset)
+            if current == khash:
+                if horizon and written < horizon:
+                    return offset, False
+                return offset, True
+            if current == 0:
+                return (offset if expired is None else expired), False
+            if expired is None and horizon and written < horizon:
+                expired = offset
+        return expired, False
+
+    def update(self, key, func):
+        """
+        Atomically read, transform and write the values for a key. The transform
+        function receives the current (a, b) tuple, or None if the key is not set,
+        and returns a tuple of (a, b, retval).
+
+        :param  key: The table key
+        :type   key: str
+        :param func: The transform function
+        :type  func: callable
+        :rtype: mixed
+        """
+        khash = self._hash(key)
+        with self.lock:
+            flock(self.fd, LOCK_EX)
+            try:
+                offset, found = self._find(khash)
+                values        = None if not found else self.SLOT.unpack_from(self.mmap, offset)[1:3]
+                a, b, retval  = func(values)
+
+                # Table full, leave it unchanged
+                if offset is None:
+                    self.full += 1
+                    return retval
+                self.SLOT.pack_into(self.mmap, offset, khash, a, b, time())
+                return retval
+            finally:
+                flock(self.fd, LOCK_UN)
+
+    def get(self, key, default=None):
+        """
+        Read the values for a key.
+
+        :param key: The table key
+        :type  key: str
+        :rtype: tuple
+        """
+        khash = self._hash(key)
+        with self.lock:
+            flock(self.fd, LOCK_EX)
+            try:
+                offset, found = self._find(khash)
+                return default if not found else self.SLOT.unpack_from(self.mmap, offset)[1:3]
+            finally:
+                flock(self.fd, LOCK_UN)
+
+    def close(self):
+        """
+        Release the memory map and file descriptor.
+        """
+        self.mmap.close()
+        os_close(self.fd)
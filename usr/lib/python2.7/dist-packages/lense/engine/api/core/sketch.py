@@ -0,0 +1,232 @@
+import atexit
+from math import log, ceil
+from time import time, sleep
+from struct import Struct
+from threading import Thread, Lock
+
+# Django Libraries
+from django.conf import settings
+from django.db import connections
+
+# Lense Libraries
+from lense.engine.api.core.log import LOG
+from lense.engine.api.objects.sketches.models import APILatencySketch
+
+# Binary sketch layout: version, zero count, bucket count, then buckets
+SKETCH_HEADER  = Struct('<BII')
+SKETCH_BUCKET  = Struct('<iI')
+SKETCH_VERSION = 1
+
+class QuantileSketch(object):
+    """
+    Mergeable quantile sketch with logarithmically sized buckets. Any quantile
+    is estimated within the configured relative accuracy, independent of the
+    number of values added. Sketches are merged by adding bucket counts, so
+    sketches from different processes and windows combine without loss.
+    """
+    def __init__(self, accuracy=None):
+        accuracy     = accuracy or settings.API_SKETCH_ACCURACY
+        self.gamma   = (1.0 + accuracy) / (1.0 - accuracy)
+        self.log_g   = log(self.gamma)
+        self.zero    = 0
+        self.count   = 0
+        self.buckets = {}
+
+    def add(self, value, n=1):
+        """
+        Add a value to the sketch.
+
+        :param value: The value, i.e. latency in milliseconds
+        :type  value: int|float
+        """
+        self.count += n
+        if value < 1:
+            self.zero += n
+            return
+        index = int(ceil(log(value) / self.log_g))
+        self.buckets[index] = self.buckets.get(index, 0) + n
+
+    def merge(self, other):
+        """
+        Merge another sketch with the same accuracy into this one.
+
+        :param other: The sketch to merge
+        :type  other: QuantileSketch
+        """
+        self.count += other.count
+        self.zero  += other.zero
+        for index, n in other.buckets.iteritems():
+            self.buckets[index] = self.buckets.get(index, 0) + n
+        return self
+
+    def quantile(self, q):
+        """
+        Estimate a quantile.
+
+        :param q: The quantile, between 0 and 1
+        :type  q: float
+        :rtype: float|None
+        """
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero
+        if seen > rank:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                return round(2.0 * (self.gamma ** index) / (self.gamma + 1), 2)
+        return round(2.0 * (self.gamma ** max(self.buckets)) / (self.gamma + 1), 2)
+
+    def dumps(self):
+        """
+        Serialize the sketch to a compact binary blob.
+
+        :rtype: str
+        """
+        return SKETCH_HEADER.pack(SKETCH_VERSION, self.zero, len(self.buckets)) + ''.join(
+            [SKETCH_BUCKET.pack(index, n) for index, n in sorted(self.buckets.iteritems())])
+
+    @classmethod
+    def loads(cls, blob, accuracy=None):
+        """
+        Load a sketch from a binary blob.
+
+        :param blob: The serialized sketch
+        :type  blob: str
+        :rtype: QuantileSketch
+        """
+        blob   = str(blob)
+        sketch = cls(accuracy)
+        version, sketch.zero, buckets = SKETCH_HEADER.unpack_from(blob, 0)
+        sketch.count = sketch.zero
+        for i in range(buckets):
+            index, n = SKETCH_BUCKET.unpack_from(blob, SKETCH_HEADER.size + (i * SKETCH_BUCKET.size))
+            sketch.buckets[index] = n
+            sketch.count += n
+        return sketch
+
+class LatencySketches(object):
+    """
+    Per handler latency sketches kept for fixed time windows. Sketches are
+    updated in-process at the end of each request and flushed as binary rows
+    by a background thread; percentiles are read by merging persisted rows
+    with the sketches not flushed yet.
+    """
+    def __init__(self):
+        self.lock     = Lock()
+        self.thread   = None
+        self.sketches = {}
+
+    def _window(self, timestamp):
+        return int(timestamp) - (int(timestamp) % settings.API_SKETCH_WINDOW)
+
+    def add(self, path, method, time_ms):
+        """
+        Record a request latency.
+
+        :param    path: The request path
+        :type     path: str
+        :param  method: The request method
+        :type   method: str
+        :param time_ms: The request processing time in milliseconds
+        :type  time_ms: int
+        """
+        self.start()
+        key = (path, method, self._window(time()))
+        with self.lock:
+            sketch = self.sketches.get(key)
+            if not sketch:
+                sketch = self.sketches[key] = QuantileSketch()
+            sketch.add(time_ms)
+
+    def flush(self):
+        """
+        Persist and reset the in-process sketches.
+        """
+        with self.lock:
+            sketches, self.sketches = self.sketches, {}
+        if not sketches:
+            return
+        try:
+            APILatencySketch.objects.bulk_create([APILatencySketch(
+                path   = path,
+                method = method,
+                window = window,
+                count  = sketch.count,
+                data   = sketch.dumps()
+            ) for (path, method, window), sketch in sketches.iteritems()])
+        except Exception as e:
+            LOG.exception('Failed to flush latency sketches: {0}', str(e))
+
+    def _run(self):
+        """
+        Background flush loop.
+        """
+        while True:
+            sleep(settings.API_SKETCH_FLUSH)
+            self.flush()
+            connections.close_all()
+
+    def start(self):
+        """
+        Start the background flush thread if not already running.
+        """
+        if self.thread:
+            return
+        with self.lock:
+            if not self.thread:
+                self.thread = Thread(target=self._run, name='lense-sketches')
+                self.thread.daemon = True
+                self.thread.start()
+                atexit.register(self.flush)
+
+    def percentiles(self, start, end, points, path=None, method=None):
+        """
+        Get latency percentiles per handler over a time range.
+
+        :param  start: Range start timestamp
+        :type   start: int
+        :param    end: Range end timestamp
+        :type     end: int
+        :param points: The percentiles to compute
+        :type  points: list
+        :param   path: Optional request path filter
+        :type    path: str
+        :param method: Optional request method filter
+        :type  method: str
+        :rtype: dict
+        """
+        merged = {}
+        def _merge(key, sketch):
+            if key in merged:
+                merged[key].merge(sketch)
+            else:
+                merged[key] = QuantileSketch().merge(sketch)
+
+        # Persisted sketches
+        rows = APILatencySketch.objects.filter(window__gte=self._window(start), window__lte=end)
+        if path:
+            rows = rows.filter(path=path)
+        if method:
+            rows = rows.filter(method=method)
+        for row in rows.only('path', 'method', 'data'):
+            _merge((row.path, row.method), QuantileSketch.loads(row.data))
+
+        # Sketches not yet flushed
+        with self.lock:
+            pending = [(key, QuantileSketch().merge(sketch)) for key, sketch in self.sketches.iteritems()]
+        for (p, m, window), sketch in pending:
+            if (self._window(start) <= window <= end) and (not path or p == path) and (not method or m == method):
+                _merge((p, m), sketch)
+
+        # Percentiles per handler
+        response = {}
+        for (p, m), sketch in merged.iteritems():
+            response['{0}:{1}'.format(m, p)] = dict([('p{0:g}'.format(point), sketch.quantile(point / 100.0)) for point in points])
+            response['{0}:{1}'.format(m, p)]['count'] = sketch.count
+        return response
+
+# Per handler latency sketches, if enabled
+SKETCHES = None if not settings.API_SKETCHES else LatencySketches()
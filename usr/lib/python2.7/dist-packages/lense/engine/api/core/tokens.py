@@ -0,0 +1,188 @@
+import hmac
+from fcntl import flock, LOCK_EX, LOCK_UN
+from hashlib import sha256
+from threading import Lock
+from time import time
+from json import dumps as json_dumps, loads as json_loads
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from os import path, stat, rename, makedirs, getpid
+
+# Django Libraries
+from django.conf import settings
+
+# Stateless token prefix / revocation store refresh interval in seconds
+TOKEN_PREFIX  = 'lst1'
+STORE_REFRESH = 1
+
+class TokenRevocations(object):
+    """
+    Versioned per-user revocation counters. Every stateless token carries the
+    version of its user at the time it was issued; bumping the version revokes
+    all outstanding tokens for that user. Counters are kept in a small JSON file
+    shared by all engine processes, and only re-read when the file changes.
+    """
+    def __init__(self, store):
+        self.store    = store
+        self.lock     = Lock()
+
+        # Cached versions / last seen modification time / last check time
+        self._versions = {}
+        self._mtime    = None
+        self._checked  = 0
+
+    def _refresh(self):
+        """
+        Reload the revocation store if it has changed on disk. The file is only
+        stat'd once every STORE_REFRESH seconds.
+        """
+        now = time()
+        if (now - self._checked) < STORE_REFRESH:
+            return
+        self._checked = now
+
+        try:
+            mtime = stat(self.store).st_mtime
+        except OSError:
+            self._versions, self._mtime = {}, None
+            return
+
+        # Store unchanged
+        if mtime == self._mtime:
+            return
+
+        with self.lock:
+            with open(self.store, 'r') as f:
+                self._versions = json_loads(f.read() or '{}')
+            self._mtime = mtime
+
+    def version(self, user):
+        """
+        Get the current token version for a user.
+
+        :param user: The username
+        :type  user: str
+        :rtype: int
+        """
+        self._refresh()
+        return self._versions.get(user, 0)
+
+    def revoke(self, user):
+        """
+        Revoke all outstanding stateless tokens for a user.
+
+        :param user: The username
+        :type  user: str
+        :rtype: int
+        """
+        store_dir = path.dirname(self.store)
+        if not path.isdir(store_dir):
+            makedirs(store_dir)
+
+        # Serialize writers across processes
+        with open('{0}.lock'.format(self.store), 'a') as lock:
+            flock(lock, LOCK_EX)
+            try:
+                versions = {}
+                if path.isfile(self.store):
+                    with open(self.store, 'r') as f:
+                        versions = json_loads(f.read() or '{}')
+                versions[user] = versions.get(user, 0) + 1
+
+                # Atomically replace the store
+                tmp = '{0}.{1}'.format(self.store, getpid())
+                with open(tmp, 'w') as f:
+                    f.write(json_dumps(versions))
+                rename(tmp, self.store)
+            finally:
+                flock(lock, LOCK_UN)
+
+        # Force a reload on the next check
+        self._checked = 0
+        return versions[user]
+
+class StatelessToken(object):
+    """
+    Issue and verify HMAC signed API tokens. Tokens carry the user, group, expiry
+    and revocation version, and can be verified in-process without touching the
+    database.
+    """
+    def __init__(self):
+        self.secret      = settings.SECRET_KEY
+        self.life        = settings.API_TOKEN_LIFE * 3600
+        self.revocations = TokenRevocations(settings.API_TOKEN_REVOCATIONS)
+
+    def _sign(self, body):
+        """
+        Generate the signature for a token body.
+        """
+        return urlsafe_b64encode(hmac.new(str(self.secret), body, sha256).digest()).rstrip('=')
+
+    @staticmethod
+    def is_stateless(token):
+        """
+        Check if a token string looks like a stateless token.
+
+        :param token: The token string
+        :type  token: str
+        :rtype: bool
+        """
+        return isinstance(token, basestring) and token.startswith('{0}.'.format(TOKEN_PREFIX))
+
+    def issue(self, user, group):
+        """
+        Issue a new stateless token.
+
+        :param  user: The username
+        :type   user: str
+        :param group: The group UUID
+        :type  group: str
+        :rtype: str
+        """
+        body = urlsafe_b64encode(json_dumps({
+            'u': user,
+            'g': group,
+            'e': int(time()) + self.life,
+            'v': self.revocations.version(user)
+        }, separators=(',', ':'))).rstrip('=')
+        return '{0}.{1}.{2}'.format(TOKEN_PREFIX, body, self._sign(body))
+
+    def verify(self, token, user, group):
+        """
+        Verify a stateless token against the requesting user and group. Returns
+        the token claims if valid, otherwise None.
+
+        :param token: The token string
+        :type  token: str
+        :param  user: The requesting username
+        :type   user: str
+        :param group: The requesting group UUID
+        :type  group: str
+        :rtype: dict|None
+        """
+        try:
+            prefix, body, sig = str(token).split('.')
+        except ValueError:
+            return None
+
+        # Bad signature
+        if not hmac.compare_digest(sig, self._sign(body)):
+            return None
+        claims = json_loads(urlsafe_b64decode(body + '=' * (-len(body) % 4)))
+
+        # Wrong user/group, expired or revoked
+        if (claims['u'] != user) or (claims['g'] != group):
+            return None
+        if claims['e'] < time():
+            return None
+        if claims['v'] != self.revocations.version(user):
+            return None
+        return claims
+
+    def revoke(self, user):
+        """
+        Revoke all stateless tokens for a user.
+        """
+        return self.revocations.revoke(user)
+
+# Stateless token manager
+TOKENS = StatelessToken()
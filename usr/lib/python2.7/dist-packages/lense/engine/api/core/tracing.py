@@ -0,0 +1,345 @@
+import re
+import os
+import atexit
+import urllib2
+from time import time
+from random import random
+from binascii import hexlify
+from threading import Thread, Lock, local
+from Queue import Queue, Full, Empty
+from json import dumps as json_dumps
+
+# Django Libraries
+from django.conf import settings
+from django.db import connections
+
+# Lense Libraries
+from lense.engine.api.core.log import LOG
+from lense.engine.api.core.metrics import METRICS
+from lense.engine.api.core.middleware import sql_shape
+
+# Trace context of the current thread
+_LOCAL      = local()
+
+# W3C trace context header
+HEADER_TRACEPARENT = 'HTTP_TRACEPARENT'
+TRACEPARENT        = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+# OTLP span kinds / status codes
+KIND_INTERNAL = 1
+KIND_SERVER   = 2
+KIND_CLIENT   = 3
+STATUS_OK     = 1
+STATUS_ERROR  = 2
+
+# Metrics key for tracing counters
+METRICS_KEY   = 'tracing'
+
+def _id(size):
+    return hexlify(os.urandom(size))
+
+def _attributes(attrs):
+    """
+    Convert span attributes to OTLP key/value pairs.
+    """
+    values = []
+    for k, v in attrs.iteritems():
+        if isinstance(v, bool):
+            value = {'boolValue': v}
+        elif isinstance(v, (int, long)):
+            value = {'intValue': str(v)}
+        elif isinstance(v, float):
+            value = {'doubleValue': v}
+        else:
+            value = {'stringValue': unicode(v)}
+        values.append({'key': k, 'value': value})
+    return values
+
+class NoSpan(object):
+    """
+    Span used when the current request is not sampled. Does nothing.
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+NO_SPAN = NoSpan()
+
+class Span(object):
+    """
+    A timed operation within a sampled trace. Spans are entered as context
+    managers, nest through a per-thread stack, and are handed to the exporter
+    when they end.
+    """
+    def __init__(self, tracer, name, trace_id, parent_id, kind, attrs):
+        self.tracer     = tracer
+        self.name       = name
+        self.trace_id   = trace_id
+        self.span_id    = _id(8)
+        self.parent_id  = parent_id
+        self.kind       = kind
+        self.attributes = attrs
+        self.status     = {'code': STATUS_OK}
+        self.start      = None
+        self.end        = None
+
+    def set(self, **attrs):
+        """
+        Set span attributes.
+        """
+        self.attributes.update(attrs)
+
+    def __enter__(self):
+        _LOCAL.stack.append(self)
+        self.start = time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end = time()
+        if exc_type:
+            self.status = {'code': STATUS_ERROR, 'message': str(exc)}
+        _LOCAL.stack.pop()
+        self.tracer.exporter.put(self)
+        return False
+
+    def dump(self):
+        """
+        Dump the span as OTLP JSON.
+
+        :rtype: dict
+        """
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(int(self.start * 1e9)),
+            'endTimeUnixNano': str(int(self.end * 1e9)),
+            'attributes': _attributes(self.attributes),
+            'status': self.status
+        }
+        if self.parent_id:
+            span['parentSpanId'] = self.parent_id
+        return span
+
+class SpanExporter(object):
+    """
+    Export finished spans in batches from a background thread, as OTLP JSON
+    either appended to a file (one batch per line) or posted to an OTLP/HTTP
+    collector. Spans are dropped, and counted, when the queue is full.
+    """
+    def __init__(self):
+        self.queue  = Queue(settings.API_TRACING_QUEUE)
+        self.lock   = Lock()
+        self.thread = None
+
+    def put(self, span):
+        self.start()
+        try:
+            self.queue.put_nowait(span)
+        except Full:
+            METRICS.incr(METRICS_KEY, dropped=1)
+
+    def _payload(self, spans):
+        return json_dumps({'resourceSpans': [{
+            'resource': {'attributes': _attributes({'service.name': settings.API_TRACING_SERVICE})},
+            'scopeSpans': [{
+                'scope': {'name': 'lense.engine'},
+                'spans': [span.dump() for span in spans]
+            }]
+        }]})
+
+    def _export(self, spans):
+        """
+        Write a batch of spans to the configured sink.
+        """
+        try:
+            if settings.API_TRACING_SINK == 'otlp':
+                request = urllib2.Request(settings.API_TRACING_OTLP, self._payload(spans), {'Content-Type': 'application/json'})
+                urllib2.urlopen(request, timeout=settings.API_TRACING_FLUSH).read()
+            else:
+                with open(settings.API_TRACING_FILE, 'a') as sink:
+                    sink.write(self._payload(spans) + '\n')
+            METRICS.incr(METRICS_KEY, exported=len(spans), batches=1)
+        except Exception as e:
+            METRICS.incr(METRICS_KEY, export_errors=1)
+            LOG.error('Failed to export {0} trace spans: {1}', len(spans), str(e))
+
+    def _batch(self):
+        """
+        Collect a batch of spans, waiting up to the flush interval.
+        """
+        spans = []
+        while len(spans) < settings.API_TRACING_BATCH:
+            try:
+                span = self.queue.get(timeout=settings.API_TRACING_FLUSH if not spans else 0.1)
+            except Empty:
+                break
+            if span is None:
+                return spans, True
+            spans.append(span)
+        return spans, False
+
+    def _run(self):
+        while True:
+            spans, stop = self._batch()
+            if spans:
+                self._export(spans)
+            if stop:
+                break
+
+    def stop(self):
+        """
+        Export pending spans and stop the exporter.
+        """
+        self.queue.put(None)
+        self.thread.join()
+
+    def start(self):
+        """
+        Start the background exporter if not already running.
+        """
+        if self.thread:
+            return
+        with self.lock:
+            if not self.thread:
+                self.thread = Thread(target=self._run, name='lense-trace-exporter')
+                self.thread.daemon = True
+                self.thread.start()
+                atexit.register(self.stop)
+
+class TracedCursor(object):
+    """
+    Database cursor wrapper recording each query as a client span.
+    """
+    def __init__(self, cursor, conn):
+        self.cursor = cursor
+        self.conn   = conn
+
+    def __getattr__(self, attr):
+        return getattr(self.cursor, attr)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _span(self, sql):
+
+        # Only reduce the statement to its shape for sampled requests
+        if not TRACER.sampled():
+            return NO_SPAN
+        return TRACER.span('db.query', KIND_CLIENT, **{
+            'db.system': self.conn.vendor,
+            'db.name': self.conn.alias,
+            'db.statement': sql_shape(sql)
+        })
+
+    def execute(self, sql, params=None):
+        with self._span(sql):
+            return self.cursor.execute(sql, params)
+
+    def executemany(self, sql, param_list):
+        with self._span(sql):
+            return self.cursor.executemany(sql, param_list)
+
+class Tracer(object):
+    """
+    Request tracing with W3C trace context and head-based sampling. The
+    sampling decision is made once per request: an incoming traceparent header
+    decides through its sampled flag, otherwise a share of requests set by the
+    sample rate is traced. Spans of unsampled requests cost nothing beyond a
+    thread local lookup.
+    """
+    def __init__(self):
+        self.exporter = SpanExporter()
+
+    def _instrument(self):
+        """
+        Wrap the cursors of this thread's database connections.
+        """
+        for conn in connections.all():
+            if getattr(conn, 'lense_traced', False):
+                continue
+            make_cursor, make_debug_cursor = conn.make_cursor, conn.make_debug_cursor
+            conn.make_cursor       = lambda cursor, make=make_cursor, conn=conn: TracedCursor(make(cursor), conn)
+            conn.make_debug_cursor = lambda cursor, make=make_debug_cursor, conn=conn: TracedCursor(make(cursor), conn)
+            conn.lense_traced      = True
+
+    def start(self, request):
+        """
+        Start the trace of a request and return its root span.
+
+        :param request: The Django request object
+        :type  request: HttpRequest
+        :rtype: Span|NoSpan
+        """
+        _LOCAL.stack = []
+        incoming     = TRACEPARENT.match(request.META.get(HEADER_TRACEPARENT, '').strip().lower())
+        if incoming:
+            trace_id, parent_id, sampled = incoming.group(1), incoming.group(2), int(incoming.group(3), 16) & 1
+        else:
+            trace_id, parent_id, sampled = _id(16), None, random() < settings.API_TRACING_SAMPLE_RATE
+
+        # Not traced, only propagate the incoming context
+        if not (settings.API_TRACING and sampled):
+            _LOCAL.traceparent = None if not incoming else incoming.group(0)
+            return NO_SPAN
+
+        METRICS.incr(METRICS_KEY, sampled=1)
+        self._instrument()
+        root = Span(self, 'dispatch', trace_id, parent_id, KIND_SERVER, {
+            'http.method': request.method,
+            'http.target': request.path
+        })
+        _LOCAL.traceparent = '00-{0}-{1}-01'.format(trace_id, root.span_id)
+        return root
+
+    def sampled(self):
+        """
+        Check if the request on the current thread is sampled, so callers can
+        skip building span attributes otherwise.
+
+        :rtype: bool
+        """
+        return bool(getattr(_LOCAL, 'stack', None))
+
+    def span(self, name, kind=KIND_INTERNAL, **attrs):
+        """
+        Start a child span of the current span, if the request is sampled.
+
+        :param name: The span name
+        :type  name: str
+        :param kind: The OTLP span kind
+        :type  kind: int
+        :rtype: Span|NoSpan
+        """
+        stack = getattr(_LOCAL, 'stack', None)
+        if not stack:
+            return NO_SPAN
+        return Span(self, name, stack[-1].trace_id, stack[-1].span_id, kind, attrs)
+
+    def propagate(self, response):
+        """
+        Set the trace context of the finished request on the response.
+
+        :param response: The HTTP response
+        :type  response: HttpResponse
+        :rtype: HttpResponse
+        """
+        traceparent, _LOCAL.traceparent = getattr(_LOCAL, 'traceparent', None), None
+        if traceparent:
+            response['traceparent'] = traceparent
+        return response
+
+# Request tracer
+TRACER = Tracer()
@@ -10,3 +10,35 @@ init_project('ENGINE')
 # Start the API WSGI application
 from django.core.wsgi import get_wsgi_application
 application = get_wsgi_application()
+
+def start_jobs():
+    """
+    Fork the background job workers. Called from the job process of the
+    prefork server, before any threads are started.
+    """
+    from lense.engine.api.core.jobs import JOBS
+    if JOBS:
+        JOBS.start()
+
+def start_process():
+    """
+    Start the background services of a serving process.
+    """
+
+    # Start the credentials worker processes
+    from lense.engine.api.core.credentials import CREDENTIALS
+    CREDENTIALS.start()
+
+    # Retry spooled emails
+    from lense.engine.api.core.guard import MAIL_SPOOL
+    MAIL_SPOOL.start()
+
+    # Move engine log I/O to a background writer
+    from lense.engine.api.core.log import LOG
+    LOG.install()
+
+# The prefork server (core/server.py) starts these per process after forking.
+# Job workers are never forked from here: under mod_wsgi this module is imported
+# by a request thread of each daemon process, run them with "manage.py run_jobs"
+if not os.environ.get('LENSE_ENGINE_PREFORK'):
+    start_process()
@@ -1,10 +1,21 @@
+import logging
 from os import path
 from re import match
 from uuid import uuid4
+from django.conf import settings
 
 # Lense Libraries
 from lense import MODULE_ROOT
 from lense.common.utils import mod_has_class, rstring
+from lense.engine.api.core.log import LOG
+from lense.engine.api.core.changes import CHANGES
+from lense.engine.api.core.invalidation import INVALIDATION
+from lense.engine.api.core.pool import POOL
+from lense.engine.api.core.patch import patch_object
+from lense.engine.api.core.schema import get_schema
+from lense.engine.api.core.tokens import TOKENS
+from lense.engine.api.core.jobs import JOBS
+from lense.engine.api.core.guard import send_mail
 
 class RequestOK(object):
     """
@@ -19,26 +30,51 @@ class RequestHandler(object):
     """
     Parent class for defining common/shortcut methods for request handlers.
     """
+    
+    # Request data schema, same format as templates/api/base/socket.json
+    schema = None
+    
     def __init__(self):
-        self.obj    = LENSE.OBJECTS.HANDLER.get_internal(path=LENSE.REQUEST.path,method=LENSE.REQUEST.method)
-        self.logpre = '<HANDLERS:{0}:{1}@{2}>'.format(
-            self.__class__.__name__, 
-            LENSE.REQUEST.USER.name, 
-            LENSE.REQUEST.client
-        )
+        self.obj     = LENSE.OBJECTS.HANDLER.get_internal(path=LENSE.REQUEST.path,method=LENSE.REQUEST.method)
+        self._logpre = None
     
         # Objects map
-        self.objmap = LENSE.REQUEST.path.upper()
+        self.objmap  = LENSE.REQUEST.path.upper()
+    
+    @property
+    def logpre(self):
+        """
+        Log message prefix, only constructed when a message is logged.
+        """
+        if getattr(self, '_logpre', None) is None:
+            self._logpre = '<HANDLERS:{0}:{1}@{2}>'.format(
+                self.__class__.__name__, 
+                LENSE.REQUEST.USER.name, 
+                LENSE.REQUEST.client
+            )
+        return self._logpre
+    
+    @property
+    def data(self):
+        """
+        Request data, validated against the handler schema and with defaults
+        applied on first access. Handlers without a schema get the raw data.
+        """
+        if getattr(self, '_data', None) is None:
+            self._data = LENSE.REQUEST.data if not self.schema else get_schema(self.__class__).validate(LENSE.REQUEST.data)
+        return self._data
         
     def rstring(self, *args, **kwargs):
         return rstring(*args, **kwargs)
     
-    def log(self, msg, level='info'):
+    def log(self, msg, *args, **kwargs):
         """
-        Log wrapper per handler.
+        Log wrapper per handler. Format arguments are only applied to the
+        message if the log level is enabled.
         """
-        logger = getattr(LENSE.LOG, level, 'info')
-        logger('{0} {1}'.format(self.logpre, msg))
+        level = kwargs.get('level', 'info')
+        if LOG.enabled(getattr(logging, level.upper(), logging.INFO)):
+            getattr(LENSE.LOG, level, LENSE.LOG.info)('{0} {1}'.format(self.logpre, msg if not args else msg.format(*args)))
     
     def mod_has_class(self, mod, cls, **kwargs):
         """
@@ -87,8 +123,79 @@ class RequestHandler(object):
         :param key: The key to delete from request data
         :type  key: str
         """
-        if key in LENSE.REQUEST.data:
-            del LENSE.REQUEST.data[key]
+        for data in [LENSE.REQUEST.data, getattr(self, '_data', None) or {}]:
+            if key in data:
+                del data[key]
+    
+    def concurrent(self, *calls):
+        """
+        Run independent lookups concurrently on the worker pool.
+        
+        :param calls: One or more (func, kwargs) tuples
+        :type  calls: tuple
+        :rtype: list
+        """
+        return POOL.run(*calls)
+    
+    def patch(self, obj, attrs):
+        """
+        Write changed attributes of a loaded object in a single UPDATE.
+        
+        :param   obj: The loaded model object
+        :type    obj: Model
+        :param attrs: The new attribute values
+        :type  attrs: dict
+        :rtype: dict
+        """
+        return patch_object(obj, attrs)
+    
+    def record_change(self, obj_type, uuid, action, data=None):
+        """
+        Append a change to the change journal, and invalidate cached objects of
+        the type in all engine processes. Inside a transaction both are held
+        back until it has ended, and no sequence number is returned.
+        
+        :param obj_type: The object type (user, group, handler)
+        :type  obj_type: str
+        :param     uuid: The object UUID
+        :type      uuid: str
+        :param   action: The change action
+        :type    action: str
+        :param     data: Changed attributes
+        :type      data: dict
+        """
+        seq = CHANGES.record(obj_type, uuid, action, data)
+        INVALIDATION.bump(obj_type)
+        return seq
+    
+    def revoke_tokens(self, user):
+        """
+        Revoke any outstanding stateless tokens for a user.
+        
+        :param user: The username to revoke tokens for
+        :type  user: str
+        """
+        if settings.API_TOKEN_STATELESS:
+            TOKENS.revoke(user)
+    
+    def send_mail(self, *args):
+        """
+        Send an email through the SMTP guard. If the relay is unavailable the
+        email is spooled and retried later, and the request carries on.
+        """
+        send_mail(*args)
+    
+    def progress(self, progress, message=None):
+        """
+        Report progress when running as a background job.
+        
+        :param progress: Progress in percent
+        :type  progress: int
+        :param  message: Optional status message
+        :type   message: str
+        """
+        if JOBS:
+            JOBS.progress(progress, message)
     
     def ok(self, message='Request successfull', data={}):
         """
@@ -109,48 +216,22 @@ class RequestHandler(object):
         :type  required: bool
         :rtype: mixed
         """
-        retval = default
+        retval = self.data
         
-        def _walk_data(keys, data):
-            """
-            Recursively walk through the data structure for nested keys.
-            
-            :param keys: The keys to walk through
-            :type  keys: list
-            :param data: The current level of data object
-            :type  data: dict
-            :rtype: str
-            """
-            current = k[0]
-            
-            # On the last key
-            if len(keys) == 1:
-                return d.get(keys, default)
-            
-            # More keys to go
-            else:
-                if not current in data:
-                    return default
-        
-                # Go to the next level
-                keys.pop(0)
-                return _walk_data(keys, data.get(current))
-        
-        # Nested keys
-        if '/' in key:
-            retval = _walk_data(key.split('/'), LENSE.REQUEST.data)
-        
-        # Single key
-        else:
-            retval = LENSE.REQUEST.data.get(key, default)
+        # Walk through nested keys
+        for k in key.split('/'):
+            if not isinstance(retval, dict) or not k in retval:
+                retval = default
+                break
+            retval = retval[k]
     
         # If the key is required and missing
         if required:
             self.ensure(retval,
                 isnot = None,
-                error = 'Missing value for required key: {0}'.format(key),
-                debug = 'Required key "{0}" present'.format(key),
+                error = 'Missing value for required key: {0}'.format(key) if retval is None else None,
                 code  = 400)
+            self.log('Required key "{0}" present', key, level='debug')
         return retval
     
     def ensure(self, *args, **kwargs):
@@ -158,8 +239,14 @@ class RequestHandler(object):
         Wrapper method for LENSE.REQUEST.ensure()
         """
         
+        # Skip debug messages unless debug logging is enabled for this request
+        if 'debug' in kwargs and not LOG.enabled(logging.DEBUG):
+            del kwargs['debug']
+        
         # Prepend log prefix
         for k in ['debug', 'error', 'log']:
-            if k in kwargs:
+            if kwargs.get(k) is not None:
                 kwargs[k] = '{0} {1}'.format(self.logpre, kwargs[k])
+            elif k in kwargs:
+                del kwargs[k]
         return LENSE.REQUEST.ensure(*args, **kwargs)
\ No newline at end of file
@@ -0,0 +1,150 @@
+from django.conf import settings
+from django.db import transaction
+
+# Lense Libraries
+from lense.engine.api.core.log import LOG
+from lense.engine.api.core.request import RequestManager
+from lense.engine.api.core.changes import CHANGES
+from lense.engine.api.core.invalidation import INVALIDATION
+from lense.engine.api.core.schema import compile_schema
+from lense.engine.api.core.ratelimit import RateLimited
+from lense.engine.api.handlers import RequestHandler
+from lense.common.exceptions import RequestError, EnsureError, AuthError, ManifestError
+
+# Sub-request validator
+validate_request = compile_schema({
+    '_type': 'dict',
+    '_required': ['method', 'path'],
+    '_optional': ['data'],
+    '_children': {
+        'method': {
+            '_type': 'str'
+        },
+        'path': {
+            '_type': 'str'
+        },
+        'data': {
+            '_type': 'dict',
+            '_optional': ['*'],
+            '_default': {}
+        }
+    }
+}, path='requests')
+
+class BatchRollback(Exception):
+    """
+    Raised to roll back an atomic batch after a failed sub-request.
+    """
+    pass
+
+class Batch_Execute(RequestHandler):
+    """
+    Run an ordered list of API requests in a single HTTP round trip. The batch
+    request is authenticated once; every sub-request is then mapped, checked
+    against the ACLs and rate limits of its own handler and run through it as
+    the same user. A failed sub-request, including an unexpected server error,
+    only fails its own result.
+
+    POST http://apiserver.mydomain.com/batch
+
+    REQUIRED PARAMETERS:
+    - requests=[{"method": "POST", "path": "group", "data": {...}}, ...]
+
+    OPTIONAL PARAMETERS:
+    - stop_on_error=True|False, stop at the first failed sub-request
+    - atomic=True|False, run all sub-requests in one transaction, rolling back
+      everything (and stopping) on the first failure
+    """
+    schema = {
+        '_type': 'dict',
+        '_required': ['requests'],
+        '_optional': ['stop_on_error', 'atomic'],
+        '_children': {
+            'requests': {
+                '_type': 'list'
+            },
+            'stop_on_error': {
+                '_type': 'bool',
+                '_default': False
+            },
+            'atomic': {
+                '_type': 'bool',
+                '_default': False
+            }
+        }
+    }
+
+    def _run_request(self, request):
+        """
+        Run a single sub-request and return its result.
+        """
+        try:
+            request = validate_request(request)
+
+            # Nested batches are not supported
+            self.ensure(request['path'].strip('/'),
+                isnot = LENSE.REQUEST.path,
+                error = 'Batch requests cannot be nested',
+                code  = 400)
+            response = RequestManager.subrequest(request['method'], request['path'].strip('/'), request['data'])
+            return {'code': 200, 'message': response.message, 'data': response.data}
+
+        # Sub-request rate limited
+        except RateLimited as e:
+            return {'code': e.code, 'error': e.message, 'retry': e.retry}
+
+        # Sub-request failed
+        except (EnsureError, RequestError, AuthError, ManifestError) as e:
+            return {'code': e.code, 'error': e.message}
+
+        # Critical sub-request error, earlier results are kept
+        except Exception as e:
+            LOG.exception('Batch request failed: {0}', str(e))
+            return {'code': 500, 'error': str(e)}
+
+    def _run_all(self, stop_on_error):
+        """
+        Run all sub-requests in order.
+        """
+        results = []
+        for request in self.data['requests']:
+            results.append(self._run_request(request))
+            if stop_on_error and results[-1]['code'] >= 400:
+                break
+        return results
+
+    def launch(self):
+        """
+        Worker method for running a batch of requests.
+        """
+        self.ensure(len(self.data['requests']) <= settings.API_BATCH_MAX,
+            error = 'Batch exceeds the maximum of {0} requests'.format(settings.API_BATCH_MAX),
+            code  = 400)
+
+        # Run without a transaction
+        if not self.data['atomic']:
+            results = self._run_all(self.data['stop_on_error'])
+            return self.ok('Ran {0} batch request(s)'.format(len(results)), {
+                'results': results,
+                'rolled_back': False
+            })
+
+        # Run in a single transaction
+        results, committed = [], False
+        try:
+            with transaction.atomic():
+                results = self._run_all(True)
+                if results and results[-1]['code'] >= 400:
+                    raise BatchRollback()
+            committed = True
+        except BatchRollback:
+            self.log('Rolled back atomic batch after failed request {0}', len(results) - 1)
+
+        # Changes and cache invalidations deferred by the transaction
+        finally:
+            CHANGES.flush(committed)
+            INVALIDATION.flush()
+        return self.ok('Ran {0} batch request(s)'.format(len(results)), {
+            'results': results,
+            'rolled_back': bool(results) and results[-1]['code'] >= 400
+        })
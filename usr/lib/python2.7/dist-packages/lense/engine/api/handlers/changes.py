@@ -0,0 +1,68 @@
+from urllib import unquote
+from django.conf import settings
+
+# Lense Libraries
+from lense.engine.api.core.changes import CHANGES
+from lense.engine.api.core.ratelimit import ADMISSION
+from lense.engine.api.handlers import RequestHandler
+
+class Changes_Get(RequestHandler):
+    """
+    Retrieve changes to users, groups and handlers from the change journal.
+
+    GET http://apiserver.mydomain.com/changes
+
+    OPTIONAL PARAMETERS:
+    - since=<seq>, only return changes after this sequence number
+    - types=user|group|handler, one or more object types delimited by "|", or
+      a list of object types
+    - limit=<count>, maximum number of changes to return
+    - wait=<seconds>, block until a matching change is available or the wait
+      expires. Capped at the configured changes timeout; only a limited number
+      of requests per engine process wait at the same time.
+    """
+    def _number(self, key, default):
+        """
+        Get an optional non-negative integer parameter.
+        """
+        value = self.get_data(key, default, required=False)
+        self.ensure(str(value).isdigit(),
+            error = 'Value for "{0}" must be a non-negative integer'.format(key),
+            code  = 400)
+        return int(value)
+
+    def _types(self):
+        """
+        Get the optional list of object types. Query string values may still
+        be percent-encoded once the request data is parsed.
+        """
+        types = self.get_data('types', None, required=False)
+        if not types:
+            return None
+        if isinstance(types, list):
+            return [str(t) for t in types]
+        return unquote(str(types)).split('|')
+
+    def launch(self):
+        """
+        Worker method for retrieving changes.
+        """
+        since = self._number('since', 0)
+        types = self._types()
+        limit = min(self._number('limit', settings.API_CHANGES_LIMIT), settings.API_CHANGES_LIMIT)
+        wait  = min(self._number('wait', 0), settings.API_CHANGES_TIMEOUT)
+
+        # Get available changes
+        if not wait:
+            seq, changes = CHANGES.since(since, types, limit)
+
+        # Long-poll without holding an admission slot
+        else:
+            with ADMISSION.suspend():
+                seq, changes = CHANGES.poll(since, types, limit, wait)
+
+        # Return the changes and the sequence to resume from
+        return self.ok(data={
+            'seq': seq,
+            'changes': changes
+        })
@@ -23,17 +23,22 @@ class GroupMember_Remove(RequestHandler):
             error = 'No user UUID found in request data',
             code  = 400)
 
+        # Look up the user and group objects concurrently
+        user_obj, group_obj = self.concurrent(
+            (LENSE.OBJECTS.USER.get, {'uuid': user}),
+            (LENSE.OBJECTS.GROUP.get, {'uuid': group}))
+
         # Get the user object
-        user = self.ensure(LENSE.OBJECTS.USER.get(uuid=user),
+        user = self.ensure(user_obj,
             isnot = None,
             error = 'Could not retrieve user "{0}"'.format(user),
             code  = 404)
 
         # Get the group object
-        group = self.ensure(LENSE.OBJECTS.GROUP.get(uuid=group),
+        group = self.ensure(group_obj,
             error = 'Could not locate group object {0}'.format(group),
-            debug = 'Group object {0} exists, retrieved object'.format(group),
             code  = 404)
+        self.log('Group object {0} exists, retrieved object', group.uuid, level='debug')
 
         # Cannot remove admin user from admin group
         remove_admin = False if not (user.uuid == USERS.ADMIN.UUID) and not (group == GROUPS.ADMIN.UUID) else True
@@ -53,8 +58,14 @@ class GroupMember_Remove(RequestHandler):
         # Remove the user from the group
         self.ensure(LENSE.OBJECTS.GROUP.remove_member(group.uuid, user.uuid),
             error = 'Failed to remove user {0} from group {1}'.format(user.uuid, group.uuid),
-            log   = 'Removed user {0} from group {1}'.format(user.uuid, group.uuid),
             code  = 500)
+        self.log('Removed user {0} from group {1}', user.uuid, group.uuid)
+        
+        # Revoke stateless tokens issued for the old membership
+        self.revoke_tokens(user.username)
+        
+        # Record the change
+        self.record_change('group', group.uuid, 'member_remove', {'member': user.uuid})
         
         # Return the response
         return self.ok('Successfully removed group member', {
@@ -82,18 +93,23 @@ class GroupMember_Add(RequestHandler):
             error = 'No user UUID found in request data',
             code  = 400)
 
+        # Look up the user and group objects concurrently
+        user_obj, group_obj = self.concurrent(
+            (LENSE.OBJECTS.USER.get, {'uuid': user}),
+            (LENSE.OBJECTS.GROUP.get, {'uuid': group}))
+
         # Get the user object
-        user = self.ensure(LENSE.OBJECTS.USER.get(uuid=user),
+        user = self.ensure(user_obj,
             isnot = None,
             error = 'Could not retrieve user "{0}"'.format(user),
             code  = 404)
 
         # Get the group object
-        group = self.ensure(LENSE.OBJECTS.GROUP.get(uuid=group),
+        group = self.ensure(group_obj,
             isnot = None,
             error = 'Could not locate group object {0}'.format(group),
-            debug = 'Group object {0} exists, retrieved object'.format(group),
             code  = 404)
+        self.log('Group object {0} exists, retrieved object', group.uuid, level='debug')
         
         # Check if the user is already a member of the group
         self.ensure(LENSE.OBJECTS.GROUP.has_member(group.uuid, user.uuid),
@@ -104,8 +120,11 @@ class GroupMember_Add(RequestHandler):
         # Add the user to the group
         self.ensure(LENSE.OBJECTS.GROUP.add_member(group.uuid, user.uuid),
             error = 'Failed to add user {0} to group {1}'.format(user.uuid, group.uuid),
-            log   = 'Added user {0} to group {1}'.format(user.uuid, group.uuid),
             code  = 500)
+        self.log('Added user {0} to group {1}', user.uuid, group.uuid)
+        
+        # Record the change
+        self.record_change('group', group.uuid, 'member_add', {'member': user.uuid})
         
         # Return the response
         return self.ok('Successfully added group member', {
@@ -124,14 +143,14 @@ class Group_Delete(RequestHandler):
         """
         target = self.ensure(self.get_data('uuid', False),
             error = ERR_NO_UUID,
-            debug = 'Launching {0} for group object {1}'.format(__name__, self.get_data('uuid')),
             code  = 400)
+        self.log('Launching {0} for group object {1}', __name__, self.get_data('uuid'), level='debug')
 
         # Get the group
         group = self.ensure(LENSE.OBJECTS.GROUP.get(uuid=target),
             error = 'Could not locate group object {0}'.format(target),
-            debug = 'Group object {0} exists, retrieved object'.format(target),
             code  = 404)
+        self.log('Group object {0} exists, retrieved object', target, level='debug')
 
         # Make sure the group isn't protected
         self.ensure(group.protected, 
@@ -148,8 +167,11 @@ class Group_Delete(RequestHandler):
         # Delete the group
         self.ensure(LENSE.OBJECTS.GROUP.delete(uuid=group.uuid),
             error = 'Failed to delete group {0}'.format(group.uuid),
-            log   = 'Deleted group {0}'.format(group.uuid),      
             code  = 500)
+        self.log('Deleted group {0}', group.uuid)
+        
+        # Record the change
+        self.record_change('group', group.uuid, 'delete')
         
         # Return the response
         return self.ok('Successfully deleted group', {
@@ -161,11 +183,7 @@ class Group_Update(RequestHandler):
     API class designed to handle updating attributes and permissions for a group.
     """
     def __init__(self):
-
-        # Group name change and return name value
-        self.name_change = False
-        self.name_return = None
-        self.name_old    = None
+        super(Group_Update, self).__init__()
 
         # Target group / group object
         self.group       = LENSE.AUTH.ACL.target_object()
@@ -173,48 +191,26 @@ class Group_Update(RequestHandler):
         
     def _update_profile(self):
         """
-        Update the group profile
+        Update the group profile, writing only the changed attributes.
+        
+        :rtype: dict
         """
-        if self.get_data('profile', False):
-            try:
-                p = self.get_data('profile')
-    
-                # Changing group protected state
-                if 'protected' in p:
-                    if not (self.group_obj.protected == p['protected']):
-                        
-                        # Cannot disable protected for default administrator group
-                        if (self.group == GROUPS.ADMIN.UUID) and (p['protected'] != True):
-                            return self.invalid('Cannot disable the protected flag for the default administrator group')
-                        
-                        # Update the protected flag
-                        self.group_obj.protected = p['protected']
-                        self.group_obj.save()
-    
-                # Changing the group description
-                if 'desc' in p:
-                    if not (self.group_obj.desc == p['desc']):
-                        self.group_obj.desc = p['desc']
-                        self.group_obj.save()
+        p = self.get_data('profile', {}, required=False)
+        
+        # Profile attributes to update
+        attrs = dict([(k, p[k]) for k in ['protected', 'desc', 'name'] if k in p])
+        
+        # Cannot disable protected for default administrator group
+        if (self.group == GROUPS.ADMIN.UUID) and ('protected' in attrs):
+            self.ensure(attrs['protected'],
+                value = True,
+                error = 'Cannot disable the protected flag for the default administrator group',
+                code  = 400)
         
-                # Changing the group name
-                if 'name' in p:
-                    if not (self.group_obj.name == p['name']):
-                        LENSE.API.LOG.info('Renaming group <{0}> to <{1}>'.format(self.group_obj.name, p['name']))
-                        
-                        # Toggle the name change flag and rename the group
-                        self.name_change = True
-                        self.name_old    = self.group_obj.name
-                        self.group_obj.name = p['name']
-                        self.group_obj.save()
-                        
-                        # Set the new group name to be returned
-                        self.name_return = p['name']
-            except Exception as e:
-                return self.invalid(LENSE.API.LOG.exception('Failed to update group profile: {0}'.format(str(e))))
-        else:
-            self.name_return = self.group_obj.name
-        return self.valid()
+        # Renaming the group
+        if ('name' in attrs) and (attrs['name'] != self.group_obj.name):
+            self.log('Renaming group <{0}> to <{1}>', self.group_obj.name, attrs['name'])
+        return self.patch(self.group_obj, attrs)
     
     def launch(self):
         """
@@ -225,23 +221,27 @@ class Group_Update(RequestHandler):
         auth_groups = LENSE.AUTH.ACL.authorized_objects('group', path='group', method=HTTP_GET)
 
         # If the group does not exist or access denied
-        if not self.group in auth_groups.ids:
-            return self.invalid('Failed to update group <{0}>, not found in database or access denied'.format(self.group))
+        self.ensure(self.group in auth_groups.ids,
+            error = 'Failed to update group <{0}>, not found in database or access denied'.format(self.group),
+            code  = 404)
         
         # Load the group object
         self.group_obj = LENSE.OBJECTS.GROUP.get(uuid=self.group)
+        name_old       = self.group_obj.name
         
         # Update the group profile
-        profile_status = self._update_profile()
-        if not profile_status['valid']:
-            return profile_status
+        changed = self._update_profile()
+        
+        # Record the change
+        if changed:
+            self.record_change('group', self.group, 'update', changed)
         
         # Return the response
         return self.ok('Successfully updated group properties', {
-            'name_change': self.name_change,
+            'name_change': 'name' in changed,
             'group_uuid':  self.group,
-            'group_name':  self.name_return,
-            'old_name':    False if not self.name_change else self.name_old
+            'group_name':  self.group_obj.name,
+            'old_name':    False if not 'name' in changed else name_old
         })
 
 class Group_Create(RequestHandler):
@@ -287,8 +287,11 @@ class Group_Create(RequestHandler):
         self.ensure(LENSE.OBJECTS.GROUP.create(**attrs),
             isnot = False,
             error = 'Failed to create group: {0}'.format(attrs_str),
-            log   = 'Created group: {0}'.format(attrs_str),
             code  = 500)
+        self.log('Created group: {0}', attrs_str)
+        
+        # Record the change
+        self.record_change('group', attrs['uuid'], 'create', attrs)
         
         # Return the response
         return self.ok('Successfully created group', attrs)
@@ -6,6 +6,23 @@ from lense.engine.api.handlers import RequestHandler
 
 ERR_NO_UUID='No handler UUID found in request data'
 
+def list_handlers():
+    """
+    List the available request handlers. Also answers anonymous requests
+    before engine setup, see core/public.py.
+
+    :rtype: list
+    """
+    handlers = []
+    for h in LENSE.OBJECTS.HANDLER.get_internal():
+        handlers.append({
+            'path': h.path,
+            'method': h.method,
+            'name': h.name,
+            'desc': h.desc
+        })
+    return handlers
+
 class Handler_Delete(RequestHandler):
     """
     Delete an existing API handler.
@@ -17,22 +34,22 @@ class Handler_Delete(RequestHandler):
         target = self.ensure(self.get_data('uuid', None),
             isnot = None,
             error = ERR_NO_UUID,
-            code  = 400,
-            debug = 'Launching {0} for handler object {1}'.format(__name__, self.get_data('uuid')))
+            code  = 400)
+        self.log('Launching {0} for handler object {1}', __name__, self.get_data('uuid'), level='debug')
         
         # Look for the handler
         handler = self.ensure(LENSE.OBJECTS.HANDLER.get(uuid=target), 
             isnot = None, 
             error = 'Could not find handler: {0}'.format(target),
-            debug = 'Handler {0} exists, retrieved object'.format(target),
             code  = 404)
+        self.log('Handler {0} exists, retrieved object', target, level='debug')
         
         # Make sure the handler isn't protected
         self.ensure(handler.protected, 
             value = False, 
             error = 'Cannot delete a protected handler', 
-            debug = 'Handler is protected: {0}'.format(repr(handler.protected)),
             code  = 403)
+        self.log('Handler is protected: {0!r}', handler.protected, level='debug')
         
         # Make sure the handler isn't locked
         self.ensure(handler.locked,
@@ -43,8 +60,11 @@ class Handler_Delete(RequestHandler):
         # Delete the handler
         self.ensure(handler.delete(),
             error = 'Failed to delete the handler: {0}'.format(target),
-            log   = 'Deleted handler {0}'.format(target),
             code  = 500)
+        self.log('Deleted handler {0}', target)
+        
+        # Record the change
+        self.record_change('handler', target, 'delete')
         
         # OK
         return self.ok('Successfully deleted handler', {'uuid': target})
@@ -53,43 +73,95 @@ class Handler_Create(RequestHandler):
     """
     Create a new API handler.
     """
+    schema = {
+        '_type': 'dict',
+        '_required': ['name', 'path', 'desc', 'method', 'mod', 'cls', 'protected', 'enabled'],
+        '_optional': ['uuid', 'allow_anon', 'locked', 'locked_by', 'use_manifest', 'manifest', 'validate', '*'],
+        '_children': {
+            'uuid': {
+                '_type': 'str'
+            },
+            'name': {
+                '_type': 'str'
+            },
+            'path': {
+                '_type': 'str'
+            },
+            'desc': {
+                '_type': 'str'
+            },
+            'method': {
+                '_type': 'str'
+            },
+            'mod': {
+                '_type': 'str'
+            },
+            'cls': {
+                '_type': 'str'
+            },
+            'protected': {
+                '_type': 'bool'
+            },
+            'enabled': {
+                '_type': 'bool'
+            },
+            'allow_anon': {
+                '_type': 'bool',
+                '_default': False
+            },
+            'locked': {
+                '_type': 'bool',
+                '_default': False
+            },
+            'locked_by': {
+                '_type': 'str',
+                '_nullable': True,
+                '_default': None
+            },
+            'use_manifest': {
+                '_type': 'bool',
+                '_default': False
+            },
+            'manifest': {
+                '_type': 'any',
+                '_default': False
+            },
+            'validate': {
+                '_type': 'bool',
+                '_default': True
+            }
+        }
+    }
+    
     def launch(self):
         """
         Worker method for creating a new handler.
         """
-        manifest = self.get_data('manifest', False, required=False)
+        manifest = self.data['manifest']
         
         # Creation parameters
-        params = {
-            'uuid':         self.get_data('uuid', self.create_uuid()),
-            'name':         self.get_data('name'),
-            'path':         self.get_data('path'),
-            'desc':         self.get_data('desc'),
-            'method':       self.get_data('method'),
-            'mod':          self.get_data('mod'),
-            'cls':          self.get_data('cls'),
-            'protected':    self.get_data('protected'),
-            'enabled':      self.get_data('enabled'),
-            'allow_anon':   self.get_data('allow_anon', False, required=False),
-            'locked':       self.get_data('locked', False, required=False),
-            'locked_by':    self.get_data('locked_by', None, required=False),
-            'use_manifest': self.get_data('use_manifest', False, required=False),
+        params = dict([(k, self.data[k]) for k in [
+            'name', 'path', 'desc', 'method', 'mod', 'cls', 'protected', 'enabled', 
+            'allow_anon', 'locked', 'locked_by', 'use_manifest'
+        ]])
+        params.update({
+            'uuid': self.data.get('uuid') or self.create_uuid(),
             'permissions': {
                 'all_read': True
             }
-        }    
+        })
         
         # If disabling validation
-        if self.get_data('validate', True):
+        if self.data['validate']:
             self.ensure(LENSE.OBJECTS.HANDLER.check_object(params['mod'], params['cls']),
                 error = 'Failed to validate handler object',
                 code  = 400)
         
         # If manually specifying a UUID
-        if self.get_data('uuid', False):
+        if self.data.get('uuid'):
             
             # Make sure the UUID is free
-            self.ensure(LENSE.OBJECTS.HANDLER.exists(uuid=self.get_data('uuid')),
+            self.ensure(LENSE.OBJECTS.HANDLER.exists(uuid=params['uuid']),
                 value = False,
                 error = 'Handler UUID already exists',
                 code  = 400)
@@ -101,12 +173,15 @@ class Handler_Create(RequestHandler):
         self.ensure(LENSE.OBJECTS.HANDLER.create(**params),
             isnot = False,
             error = 'Failed to create handler: {0}'.format(attrs_str),
-            log   = 'Created handler: {0}'.format(attrs_str),
             code  = 500)
+        self.log('Created handler: {0}', attrs_str)
          
         # If using a manifest
         if manifest and params['use_manifest']:
             LENSE.OBJECTS.HANDLER.createManifest(params['uuid'], manifest)
+        
+        # Record the change
+        self.record_change('handler', params['uuid'], 'create', dict([(k, params[k]) for k in ['name', 'path', 'method', 'desc', 'enabled', 'protected']]))
             
         # OK
         return self.ok('Successfully created handler', {
@@ -129,15 +204,15 @@ class Handler_Update(RequestHandler):
         target = self.ensure(self.get_data('uuid', None),
             isnot = None,
             error = ERR_NO_UUID,
-            code  = 400,
-            debug = 'Launching {0} for handler object {1}'.format(__name__, self.get_data('uuid')))
+            code  = 400)
+        self.log('Launching {0} for handler object {1}', __name__, self.get_data('uuid'), level='debug')
         
         # Get the handler object
         handler = self.ensure(LENSE.OBJECTS.HANDLER.get(uuid=target), 
             isnot = None, 
             error = 'Could not find handler: {0}'.format(target),
-            debug = 'Handler {0} exists, retrieved object'.format(target),
             code  = 404)
+        self.log('Handler {0} exists, retrieved object', target, level='debug')
     
         # Update parameters
         params = {
@@ -154,15 +229,16 @@ class Handler_Update(RequestHandler):
             'allow_anon': self.get_data('allow_anon', handler.allow_anon)
         }
 
-        # Handler attributes string
-        attrs_str = 'uuid={0}, name={1}, path={2}, method={3}'.format(handler.uuid, params['name'], params['path'], params['method'])
-
-        # Attempt to update the handler
-        self.ensure(LENSE.OBJECTS.HANDLER.select(**{'uuid': handler.uuid}).update(**params),
-            isnot = False,
-            log   = 'Updated handler: {0}'.format(attrs_str),
-            error = 'Failed to update handler: {0}'.format(attrs_str),
-            code  = 500)
+        # Update the changed handler attributes
+        changed = self.patch(handler, params)
+        
+        # Nothing to update
+        if not changed:
+            return self.ok(data='Handler unchanged.')
+        self.log('Updated handler: uuid={0}, changed={1}', handler.uuid, ', '.join(sorted(changed.keys())))
+        
+        # Record the change
+        self.record_change('handler', handler.uuid, 'update', changed)
 
         # Successfully updated handler
         return self.ok(data='Successfully updated handler.')
@@ -192,14 +268,14 @@ class Handler_Validate(RequestHandler):
         # Make sure the path string is valid
         self.ensure(self.match(r'^[a-z0-9][a-z0-9\/]*[a-z0-9]$', default['path']),
             error = 'Failed to validate handler {0}, invalid "path" value: {1}'.format(handler.uuid, default['path']),
-            debug = 'Handler {0} path {1} OK'.format(handler.uuid, default['path']),
             code  = 400)
+        self.log('Handler {0} path {1} OK', handler.uuid, default['path'], level='debug')
     
         # Make sure the method is valid
         self.ensure(self.in_list(default['method'], HTTP_METHODS),
             error = 'Failed to validate handler {0}, invalid "method" value: {1}'.format(handler.uuid, default['method']),
-            debug = 'Handler {0} method {1} OK'.format(handler.uuid, default['method']),
             code  = 400)
+        self.log('Handler {0} method {1} OK', handler.uuid, default['method'], level='debug')
     
         # Make sure the object type is supported
         self.ensure(self.acl_object_supported(default.get('object', None)),
@@ -226,15 +302,15 @@ class Handler_Validate(RequestHandler):
         target = self.ensure(self.get_data('uuid', None),
             isnot = None,
             error = ERR_NO_UUID,
-            code  = 400,
-            debug = 'Launching {0} for handler object {1}'.format(__name__, self.get_data('uuid')))
+            code  = 400)
+        self.log('Launching {0} for handler object {1}', __name__, self.get_data('uuid'), level='debug')
         
         # Make sure the handler exists
         handler = self.ensure(LENSE.OBJECTS.HANDLER.get(uuid=target), 
             isnot = None, 
             error = 'Could not find handler: {0}'.format(target),
-            debug = 'Handler {0} exists, retrieved object'.format(target),
             code  = 404)
+        self.log('Handler {0} exists, retrieved object', target, level='debug')
 
         # Validate the handler attributes
         self._validate(handler)
@@ -253,15 +329,15 @@ class Handler_Close(RequestHandler):
         target = self.ensure(self.get_data('uuid', None),
             isnot = None,
             error = ERR_NO_UUID,
-            code  = 400,
-            debug = 'Launching {0} for handler object {1}'.format(__name__, self.get_data('uuid')))
+            code  = 400)
+        self.log('Launching {0} for handler object {1}', __name__, self.get_data('uuid'), level='debug')
     
         # Make sure the handler exists
         handler = self.ensure(LENSE.OBJECTS.HANDLER.get(uuid=target), 
             isnot = None, 
             error = 'Could not find handler: {0}'.format(target),
-            debug = 'Handler {0} exists, retrieved object'.format(target),
             code  = 404)
+        self.log('Handler {0} exists, retrieved object', target, level='debug')
         
         # Check if the handler is already close
         if not handler.locked:
@@ -271,8 +347,11 @@ class Handler_Close(RequestHandler):
         self.ensure(LENSE.OBJECTS.HANDLER.select(**{'uuid': handler.uuid}).update(**{
             'locked': False,
             'locked_by': None
-        }), error = 'Failed to check in handler {0}'.format(target),
-            log   = 'Checking in hander {0}: locked=False'.format(target))
+        }), error = 'Failed to check in handler {0}'.format(target))
+        self.log('Checking in hander {0}: locked=False', target)
+        
+        # Record the change
+        self.record_change('handler', target, 'close', {'locked': False, 'locked_by': None})
         
         # Handler checked in
         return self.ok(data='Handler checked in')
@@ -288,15 +367,15 @@ class Handler_Open(RequestHandler):
         target = self.ensure(self.get_data('uuid', None),
             isnot = None,
             error = ERR_NO_UUID,
-            code  = 400,
-            debug = 'Launching {0} for handler object {1}'.format(__name__, self.get_data('uuid')))
+            code  = 400)
+        self.log('Launching {0} for handler object {1}', __name__, self.get_data('uuid'), level='debug')
     
         # Make sure the handler exists
         handler = self.ensure(LENSE.OBJECTS.HANDLER.get(uuid=target), 
             isnot = False, 
             error = 'Could not find handler: {0}'.format(target),
-            debug = 'Handler {0} exists, retrieved object'.format(target),
             code  = 404)
+        self.log('Handler {0} exists, retrieved object', target, level='debug')
 
         # Check if the handler is locked
         if handler.locked == True:
@@ -310,8 +389,11 @@ class Handler_Open(RequestHandler):
         self.ensure(LENSE.OBJECTS.HANDLER.select(**{'uuid': handler.uuid}).update(**{
             'locked': True,
             'locked_by': LENSE.REQUEST.USER.name
-        }), error = 'Failed to check out handler {0}'.format(target),
-            log   = 'Checking out hander {0}: locked=True'.format(target))
+        }), error = 'Failed to check out handler {0}'.format(target))
+        self.log('Checking out hander {0}: locked=True', target)
+        
+        # Record the change
+        self.record_change('handler', target, 'open', {'locked': True, 'locked_by': LENSE.REQUEST.USER.name})
         
         # Handler checked in
         return self.ok(data='Handler checked out')
@@ -321,19 +403,7 @@ class Handler_List(RequestHandler):
     Public endpoint for listing available request handlers.
     """
     def launch(self):
-        handlers = []
-        
-        # Construct available handlers
-        for h in LENSE.OBJECTS.HANDLER.get_internal():
-            handlers.append({
-                'path': h.path,
-                'method': h.method,
-                'name': h.name,
-                'desc': h.desc
-            })
-            
-        # OK
-        return self.ok(data=handlers)
+        return self.ok(data=list_handlers())
         
 class Handler_Get(RequestHandler):
     """
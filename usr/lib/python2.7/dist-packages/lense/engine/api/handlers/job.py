@@ -0,0 +1,30 @@
+from lense.engine.api.core.jobs import JOBS
+from lense.engine.api.handlers import RequestHandler
+
+class Job_Get(RequestHandler):
+    """
+    Retrieve the status, progress and result of a background job. Jobs are
+    only visible to the user that submitted them.
+
+    GET http://apiserver.mydomain.com/job
+
+    REQUIRED PARAMETERS:
+    - uuid=<job_uuid>
+    """
+    def launch(self):
+        """
+        Worker method for retrieving a background job.
+        """
+        self.ensure(JOBS,
+            isnot = None,
+            error = 'Background jobs are not enabled',
+            code  = 400)
+        uuid = self.get_data('uuid')
+
+        # Get the job
+        job = self.ensure(JOBS.get(uuid, LENSE.REQUEST.USER.name),
+            isnot = None,
+            error = 'Could not find job: {0}'.format(uuid),
+            code  = 404)
+        self.log('Retrieved job: {0}', uuid, level='debug')
+        return self.ok(data=job)
@@ -1,16 +1,79 @@
+from django.conf import settings
+
+# Lense Libraries
 from lense.engine.api.handlers import RequestHandler
+from lense.engine.api.core.manifest import ManifestExecution, ManifestGraph
 from lense.common.manifest.interface import ManifestInterface
 
+# Accepted values for boolean flags given as strings
+FLAG_TRUE  = ['1', 'true', 'yes']
+FLAG_FALSE = ['0', 'false', 'no', '']
+
+def get_flag(handler, key):
+    """
+    Get an optional boolean flag from the request data, given as a boolean or
+    as a string.
+
+    :param handler: The request handler
+    :type  handler: RequestHandler
+    :param     key: The data key
+    :type      key: str
+    :rtype: bool
+    """
+    value = handler.get_data(key, False, required=False)
+    if isinstance(value, bool):
+        return value
+    handler.ensure(str(value).lower() in FLAG_TRUE + FLAG_FALSE,
+        error = 'Value for "{0}" must be true or false'.format(key),
+        code  = 400)
+    return str(value).lower() in FLAG_TRUE
+
 class Manifest_Compile(RequestHandler):
     """
     Compile a request handler manifest.
+    
+    OPTIONAL PARAMETERS:
+    - graph=True|False, return the step dependency graph and the stages of
+      mutually independent steps along with the compiled manifest. Stages only
+      show potential parallelism, manifest steps are run in order
     """
     def launch(self):
-        return self.ok(data=ManifestInterface(self.get_data('manifest')).compile(dump=True))
+        manifest = self.get_data('manifest')
+        compiled = ManifestInterface(manifest).compile(dump=True)
+        
+        # Include the step dependency graph
+        if get_flag(self, 'graph'):
+            return self.ok(data={'manifest': compiled, 'graph': ManifestGraph(manifest).dump()})
+        return self.ok(data=compiled)
     
 class Manifest_Execute(RequestHandler):
     """
     Execute a request handler manifest.
+    
+    OPTIONAL PARAMETERS:
+    - timeout=<seconds>, capped at the configured manifest timeout
+    - step_timeout=<seconds>, capped at the configured manifest step timeout
+    - profile=True|False, return the step level execution profile
     """
+    def _seconds(self, key, limit):
+        """
+        Get a time budget in seconds, capped at the configured limit.
+        """
+        value = self.get_data(key, limit, required=False)
+        self.ensure(str(value).isdigit() and int(value) > 0,
+            error = 'Value for "{0}" must be a positive number of seconds'.format(key),
+            code  = 400)
+        return min(int(value), limit)
+    
     def launch(self):
-        return self.ok(data=ManifestInterface(self.get_data('manifest')).execute())
\ No newline at end of file
+        profile   = get_flag(self, 'profile')
+        execution = ManifestExecution(self.get_data('manifest'),
+            timeout      = self._seconds('timeout', settings.API_MANIFEST_TIMEOUT),
+            step_timeout = self._seconds('step_timeout', settings.API_MANIFEST_STEP_TIMEOUT),
+            profile      = profile)
+        output    = execution.execute()
+        
+        # Include the execution profile
+        if profile:
+            return self.ok(data={'output': output, 'profile': execution.profile})
+        return self.ok(data=output)
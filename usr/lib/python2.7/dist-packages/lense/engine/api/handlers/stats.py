@@ -1,16 +1,28 @@
 import re
+from time import time
 from django.db.models import Q
 
 # Lense Libraries
 from lense.common.utils import set_response
 from lense.engine.api.handlers import RequestHandler
+from lense.engine.api.core.metrics import METRICS
+from lense.engine.api.core.sketch import SKETCHES
+from lense.engine.api.core.sampling import SAMPLER
 from lense.common.objects.stats.models import APIRequestStats
+from lense.engine.api.objects.sampling.models import APIRequestWeight
 
-def log_request_stats(params):
+# Request stats row IDs per weight query, SQLite allows 999 parameters
+WEIGHTS_PAGE = 500
+
+def log_request_stats(params, weight=1):
     """
-    Helper method for logging request stats.
+    Helper method for logging request stats. Sampled rows standing for more
+    than one request get their weight stored alongside.
     """
-    APIRequestStats(**params).save()
+    stats = APIRequestStats(**params)
+    stats.save()
+    if weight > 1:
+        APIRequestWeight(stats=stats.id, weight=weight).save()
 
 class StatsRequest_Get(RequestHandler):
     """
@@ -19,6 +31,7 @@ class StatsRequest_Get(RequestHandler):
     GET http://apiserver.mydomain.com/stats/requests
     
     OPTIONAL PARAMETERS:
+    - mode=requests|metrics|percentiles|counters
     - path=/some/path
     - method=GET|POST|PUT|DELETE
     - client_ip=xxx.xxx.xxx.xxx
@@ -32,6 +45,26 @@ class StatsRequest_Get(RequestHandler):
     - rsp_time_ms=gt:<time_ms>;lt:<time_ms>;
     - from=<timestamp>
     - to=<timestamp>
+    - points=50,95,99
+    
+    The "metrics" mode returns the in-process per-handler counters (requests,
+    errors, time, dispatch phase times, query counts, RSS deltas and sampled
+    top allocators) of the engine process serving the request. The
+    "request:context" entry counts requests and how many of them built each
+    costly piece: engine setup, authentication, ACL checks, normalized request
+    data and client details. Requests that did not map to a handler are
+    counted under "unmatched" in all modes but "requests".
+    
+    The "percentiles" mode returns latency percentiles per handler between the
+    "from" and "to" UNIX timestamps (default: the last hour), merged from the
+    latency sketches of all engine processes. The "path" and "method" filters
+    apply; no raw request rows are read.
+    
+    When request stats sampling is enabled, successful fast requests are only
+    logged at a rate of 1 in N and each returned row carries the "weight" it
+    stands for; sum the weights rather than counting rows. The "counters" mode
+    returns the exact request, error, slow, logged and total time counters per
+    handler between "from" and "to", with the same filters as "percentiles".
     """
     def __init__(self):
         super(StatsRequest_Get, self).__init__()
@@ -97,18 +130,81 @@ class StatsRequest_Get(RequestHandler):
         for k in self._filter_keys['generic']:
             self._filter_generic(k)
         
+    def _range(self):
+        """
+        Time range from the "from" and "to" parameters, default the last hour.
+        """
+        end   = int(self.get_data('to', time(), required=False))
+        start = int(self.get_data('from', end - 3600, required=False))
+        return start, end
+        
+    def _weights(self, rows):
+        """
+        Add the sampling weight to request stats rows. The row IDs are looked
+        up in pages, to stay below the query parameter limit of the database.
+        """
+        ids     = [row['id'] for row in rows]
+        weights = {}
+        for i in range(0, len(ids), WEIGHTS_PAGE):
+            weights.update(APIRequestWeight.objects.filter(stats__in=ids[i:i + WEIGHTS_PAGE]).values_list('stats', 'weight'))
+        for row in rows:
+            row['weight'] = weights.get(row['id'], 1)
+        return rows
+        
+    def counters(self):
+        """
+        Exact request counters per handler.
+        """
+        self.ensure(SAMPLER,
+            isnot = None,
+            error = 'Request stats sampling is not enabled',
+            code  = 400)
+        start, end = self._range()
+        return self.ok(data=SAMPLER.totals(start, end,
+            path   = self.get_data('path', None, required=False),
+            method = self.get_data('method', None, required=False)))
+        
+    def percentiles(self):
+        """
+        Latency percentiles per handler, merged from the latency sketches.
+        """
+        self.ensure(SKETCHES,
+            isnot = None,
+            error = 'Latency sketches are not enabled',
+            code  = 400)
+        start, end = self._range()
+        points = [float(p) for p in str(self.get_data('points', '50,95,99', required=False)).split(',')]
+        return self.ok(data=SKETCHES.percentiles(start, end, points,
+            path   = self.get_data('path', None, required=False),
+            method = self.get_data('method', None, required=False)))
+        
     def launch(self):
         """
         Worker method for retrieving API request statistics.
         """
         
+        mode = self.get_data('mode', 'requests', required=False)
+        
+        # In-process handler metrics
+        if mode == 'metrics':
+            return self.ok(data=METRICS.dump())
+        
+        # Latency percentiles from sketches
+        if mode == 'percentiles':
+            return self.percentiles()
+        
+        # Exact request counters
+        if mode == 'counters':
+            return self.counters()
+        
         # Run the filters
         self._run_generic_filters()
         self._run_range_filters()
         
         # Get the request stats
-        return self.ok(data=self.ensure(LENSE.OBJECTS.STATS.get(), 
+        rows = self.ensure(LENSE.OBJECTS.STATS.get(), 
             isnot = None, 
             error = 'Failed to retrieve request statistics',
             debug = 'Retrieved request statistics',
-            code  = 500))
\ No newline at end of file
+            code  = 500)
+        return self.ok(data=rows if not SAMPLER else self._weights(rows))
\ No newline at end of file
@@ -1,3 +1,7 @@
+from django.conf import settings
+
+# Lense Libraries
+from lense.engine.api.core.tokens import TOKENS
 from lense.engine.api.handlers import RequestHandler
 
 class Token_Get(RequestHandler):
@@ -10,10 +14,20 @@ class Token_Get(RequestHandler):
         key is valid and authorized.
         """
         user  = LENSE.REQUEST.USER.name
-        token = self.ensure(LENSE.OBJECTS.USER.get_token(user),
-            error = 'Could not retrieve token for user: {0}'.format(user),
-            debug = 'Retrieved token for user: {0}'.format(user),
-            code  = 500)
+        
+        # Stateless signed token
+        if settings.API_TOKEN_STATELESS:
+            token = self.ensure(TOKENS.issue(user, LENSE.REQUEST.USER.group),
+                error = 'Could not issue stateless token for user: {0}'.format(user),
+                code  = 500)
+            self.log('Issued stateless token for user: {0}', user, level='debug')
+        
+        # Database token
+        else:
+            token = self.ensure(LENSE.OBJECTS.USER.get_token(user),
+                error = 'Could not retrieve token for user: {0}'.format(user),
+                code  = 500)
+            self.log('Retrieved token for user: {0}', user, level='debug')
         
         # Return the token
-        return self.ok(data={'token': token})
\ No newline at end of file
+        return self.ok(data={'token': token})
@@ -1,6 +1,7 @@
 from lense.common.vars import USERS
 from lense.engine.api.handlers import RequestHandler
 from lense.common.utils import rstring
+from lense.engine.api.core.credentials import CREDENTIALS
 
 ERR_NO_UUID='No user UUID found in request data'
 
@@ -15,15 +16,15 @@ class User_Delete(RequestHandler):
         target = self.ensure(self.get_data('uuid', None),
             isnot = None,
             error = ERR_NO_UUID,
-            code  = 400,
-            debug = 'Launching {0} for handler object {1}'.format(__name__, self.get_data('uuid')))
+            code  = 400)
+        self.log('Launching {0} for handler object {1}', __name__, self.get_data('uuid'), level='debug')
         
         # Look for the user
         user = self.ensure(LENSE.OBJECTS.USER.get(uuid=target), 
             isnot = None, 
             error = 'Could not find user: {0}'.format(target),
-            debug = 'User {0} exists, retrieved object'.format(target),
             code  = 404)
+        self.log('User {0} exists, retrieved object', target, level='debug')
         
         # Cannot delete the default administrator
         self.ensure(target,
@@ -34,8 +35,14 @@ class User_Delete(RequestHandler):
         # Delete the account
         self.ensure(LENSE.OBJECTS.USER.delete(uuid=target),
             error = 'Failed to delete user {0}'.format(target),
-            log   = 'Deleted user account {0}'.format(target),
             code  = 500)
+        self.log('Deleted user account {0}', target)
+        
+        # Revoke stateless tokens
+        self.revoke_tokens(user.username)
+        
+        # Record the change
+        self.record_change('user', target, 'delete')
 
         # OK
         return self.ok('Deleted user account: {0}'.format(target), {
@@ -53,15 +60,15 @@ class User_Enable(RequestHandler):
         target = self.ensure(self.get_data('uuid', None),
             isnot = None,
             error = ERR_NO_UUID,
-            code  = 400,
-            debug = 'Launching {0} for user object {1}'.format(__name__, self.get_data('uuid')))
+            code  = 400)
+        self.log('Launching {0} for user object {1}', __name__, self.get_data('uuid'), level='debug')
         
         # Look for the user
         user = self.ensure(LENSE.OBJECTS.USER.get(uuid=target), 
             isnot = None, 
             error = 'Could not find user: {0}'.format(target),
-            debug = 'User {0} exists, retrieved object'.format(target),
             code  = 404)
+        self.log('User {0} exists, retrieved object', target, level='debug')
         
         # Cannot enable/disable the default administrator
         self.ensure(target,
@@ -70,10 +77,12 @@ class User_Enable(RequestHandler):
             code  = 400)
         
         # Enable the user account
-        self.ensure(LENSE.OBJECTS.USER.select(**{'uuid': target}).update(uuid=target, is_active=False), 
-            error = 'Failed to enable user account {0}'.format(target),
-            log   = 'Enabled user account {0}'.format(target),
-            code  = 500)
+        changed = self.patch(user, {'is_active': True})
+        self.log('Enabled user account {0}', target)
+        
+        # Record the change
+        if changed:
+            self.record_change('user', target, 'enable', changed)
         
         # OK
         return self.ok('Enabled user account: {0}'.format(target), {
@@ -91,15 +100,15 @@ class User_Disable(RequestHandler):
         target = self.ensure(self.get_data('uuid', None),
             isnot = None,
             error = ERR_NO_UUID,
-            code  = 400,
-            debug = 'Launching {0} for user object {1}'.format(__name__, self.get_data('uuid')))
+            code  = 400)
+        self.log('Launching {0} for user object {1}', __name__, self.get_data('uuid'), level='debug')
         
         # Look for the user
         user = self.ensure(LENSE.OBJECTS.USER.get(uuid=target), 
             isnot = None, 
             error = 'Could not find user: {0}'.format(target),
-            debug = 'User {0} exists, retrieved object'.format(target),
             code  = 404)
+        self.log('User {0} exists, retrieved object', target, level='debug')
         
         # Cannot enable/disable the default administrator
         self.ensure(target,
@@ -108,10 +117,15 @@ class User_Disable(RequestHandler):
             code  = 400)
         
         # Disable the user account
-        self.ensure(LENSE.OBJECTS.USER.select(**{'uuid': target}).update(uuid=target, is_active=False), 
-            error = 'Failed to disable user account {0}'.format(target),
-            log   = 'Disabled user account {0}'.format(target),
-            code  = 500)
+        changed = self.patch(user, {'is_active': False})
+        self.log('Disabled user account {0}', target)
+        
+        # Revoke stateless tokens
+        self.revoke_tokens(user.username)
+        
+        # Record the change
+        if changed:
+            self.record_change('user', target, 'disable', changed)
         
         # OK
         return self.ok('Disabled user account: {0}'.format(target), {
@@ -129,36 +143,39 @@ class User_ResetPassword(RequestHandler):
         target = self.ensure(self.get_data('uuid', None),
             isnot = None,
             error = ERR_NO_UUID,
-            code  = 400,
-            debug = 'Launching {0} for user object {1}'.format(__name__, self.get_data('uuid')))
+            code  = 400)
+        self.log('Launching {0} for user object {1}', __name__, self.get_data('uuid'), level='debug')
         
         # Look for the user
         user = self.ensure(LENSE.OBJECTS.USER.get(uuid=target), 
             isnot = None, 
             error = 'Could not find user: {0}'.format(target),
-            debug = 'User {0} exists, retrieved object'.format(target),
             code  = 404)
+        self.log('User {0} exists, retrieved object', target, level='debug')
         
         # Generate a new random password
         new_passwd = rstring()
 
         # Update the user password
-        user.set_password(new_passwd)
+        user.password = CREDENTIALS.hash_password(new_passwd)
         self.ensure(user.save(),
             error = 'Failed to reset user password for {0}'.format(target),
-            log   = 'Reset password for user {0}'.format(target),
             code  = 500)
+        self.log('Reset password for user {0}', target)
+        
+        # Revoke stateless tokens
+        self.revoke_tokens(user.username)
 
         # Confirmation email attributes
-        email_attrs = {
-            'sub':  'Lense Password Reset: {0}'.format(user.username),
-            'txt':  'Your password has been reset. You may login with your new password: {0}'.format(new_passwd),
-            'from': 'noreply@lense.com',
-            'to':   [user.email]
-        }
+        email_attrs = [
+            ('sub', 'Lense Password Reset: {0}'.format(user.username)),
+            ('txt', 'Your password has been reset. You may login with your new password: {0}'.format(new_passwd)),
+            ('from', 'noreply@lense.com'),
+            ('to', [user.email])
+        ]
         
         # Send the confirmation email
-        LENSE.MAIL.send(*[x[1] for x in email_attrs])
+        self.send_mail(*[x[1] for x in email_attrs])
         
         # OK
         return self.ok(data='Reset password for user: {0}'.format(target))
@@ -167,79 +184,101 @@ class User_Create(RequestHandler):
     """
     API class designed to create a new user account.
     """
+    schema = {
+        '_type': 'dict',
+        '_required': ['username', 'email', 'group'],
+        '_optional': ['password', 'password_confirm', 'uuid', '*'],
+        '_children': {
+            'username': {
+                '_type': 'str'
+            },
+            'email': {
+                '_type': 'str'
+            },
+            'group': {
+                '_type': 'str'
+            },
+            'password': {
+                '_type': 'str'
+            },
+            'password_confirm': {
+                '_type': 'str'
+            },
+            'uuid': {
+                '_type': 'str'
+            }
+        }
+    }
+    
     def launch(self):
         """
         Worker method used to handle creation of a new user account.
         """
-        username = self.get_data('username')
-        passwd   = self.get_data('password', rstring())
-        passwd_c = self.get_data('password_confirm', None)
-        group    = self.get_data('group', required=True)
+        username = self.data['username']
+        passwd   = self.data.get('password') or rstring()
+        group    = self.data['group']
+        uuid     = self.data.get('uuid')
         
         # Make sure the user doesn't exist
         self.ensure(LENSE.OBJECTS.USER.exists(username=username), 
             value = False,
             error = 'User "{0}" already exists'.format(username),
-            debug = 'User "{0}" doesn\'t exist, OK to create'.format(username),
             code  = 400)
+        self.log('User "{0}" doesn\'t exist, OK to create', username, level='debug')
         
         # If setting a user supplied password
-        if self.get_data('password', None):
+        if self.data.get('password'):
             
             # Make sure the password meets strength requirements if specifying
-            self.ensure(LENSE.AUTH.check_pw_strength(passwd),
+            self.ensure(CREDENTIALS.check_strength(passwd),
                 error = 'Password does not meet strength requirements',
-                debug = 'Password strength for user "{0}" OK'.format(username),
                 code  = 400)
+            self.log('Password strength for user "{0}" OK', username, level='debug')
             
             # Make sure confirmation password matches
             self.ensure(passwd, 
-                value = passwd_c,
+                value = self.data.get('password_confirm'),
                 error = 'Confirmation password does not match',
-                debug = 'New user "{0}" data keys "password" and "password_confirm" match'.format(username),
                 code  = 400)
+            self.log('New user "{0}" data keys "password" and "password_confirm" match', username, level='debug')
             
         # If setting a user supplied UUID
-        if self.get_data('uuid', False):
-            self.ensure(LENSE.OBJECTS.USER.exists(uuid=self.get_data('uuid')),
+        if uuid:
+            self.ensure(LENSE.OBJECTS.USER.exists(uuid=uuid),
                 isnot = True,
-                error = 'Cannot create user with duplicate UUID: {0}'.format(self.get_data('uuid')),
+                error = 'Cannot create user with duplicate UUID: {0}'.format(uuid),
                 code  = 400)
         
         # Map new user attributes
-        attrs = LENSE.REQUEST.map_data([
-            'username', 
-            'email', 
-            'password'                          
-        ])
+        attrs = dict([(k, self.data[k]) for k in ['username', 'email', 'password'] if k in self.data])
         
         # Set the user UUID
-        if self.get_data('uuid', None):
-            attrs['uuid'] = self.get_data('uuid')
+        if uuid:
+            attrs['uuid'] = uuid
         
         # Create the user account
         user = self.ensure(LENSE.OBJECTS.USER.create(**attrs),
             isnot = False,
             error = 'Failed to create user account: username={0}, email={1}'.format(attrs['username'], attrs['email']),
-            log   = 'Created user account: username={0}, email={1}'.format(attrs['username'], attrs['email']),
             code  = 500)
+        self.log('Created user account: username={0}, email={1}', attrs['username'], attrs['email'])
         
         # Store the user password hash
-        user.set_password(passwd)
-        user.save()
+        user.password = CREDENTIALS.hash_password(passwd)
+        user.save(update_fields=['password'])
         
         # Get the group object
         group = self.ensure(LENSE.OBJECTS.GROUP.get(uuid=group),
             isnot = None,
             error = 'Could not locate group object {0}'.format(group),
-            debug = 'Group object {0} exists, retrieved object'.format(group),
             code  = 404)
+        self.log('Group object {0} exists, retrieved object', group.uuid, level='debug')
 
         # Add the user to the group
         self.ensure(LENSE.OBJECTS.GROUP.add_member(group.uuid, user.uuid),
             error = 'Failed to add user {0} to group {1}'.format(user.uuid, group.uuid),
-            log   = 'Added user {0} to group {1}'.format(user.uuid, group.uuid),
             code  = 500)
+        self.log('Added user {0} to group {1}', user.uuid, group.uuid)
         
         # Grant the user an API key
         api_key = self.ensure(LENSE.OBJECTS.USER.grant_key(user),
@@ -254,15 +293,22 @@ class User_Create(RequestHandler):
             code  = 500)
         
         # Confirmation email attributes
-        email_attrs = {
-            'sub':  'Lense New Account: {0}'.format(user.username),
-            'txt':  'Your account has been created. You may login with your password: {0}'.format(passwd),
-            'from': 'noreply@lense.com',
-            'to':   [user.email]
-        }
+        email_attrs = [
+            ('sub', 'Lense New Account: {0}'.format(user.username)),
+            ('txt', 'Your account has been created. You may login with your password: {0}'.format(passwd)),
+            ('from', 'noreply@lense.com'),
+            ('to', [user.email])
+        ]
         
         # Send the confirmation email
-        LENSE.MAIL.send(*[x[1] for x in email_attrs])
+        self.send_mail(*[x[1] for x in email_attrs])
+        
+        # Record the new user
+        self.record_change('user', user.uuid, 'create', {
+            'username': user.username,
+            'email': user.email,
+            'group': group.uuid
+        })
         
         # OK
         return self.ok('Created user account: {0}'.format(user.uuid), {
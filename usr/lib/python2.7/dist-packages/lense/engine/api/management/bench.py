@@ -0,0 +1,75 @@
+from time import time
+from threading import Thread, Lock
+
+# Django Libraries
+from django.test import Client
+
+# Lense Libraries
+from lense.common import init_project
+
+def init_engine():
+    """
+    Initialize the Lense engine commons for running requests in-process, as
+    done by the WSGI application.
+    """
+    init_project('ENGINE')
+
+def percentiles(values, points=(50, 95, 99)):
+    """
+    Compute percentiles for a list of values.
+
+    :param values: The sample values
+    :type  values: list
+    :param points: The percentiles to compute
+    :type  points: tuple
+    :rtype: dict
+    """
+    ordered = sorted(values)
+    if not ordered:
+        return dict([('p{0}'.format(p), None) for p in points])
+    return dict([('p{0}'.format(p), ordered[min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))]) for p in points])
+
+def api_headers(user=None, group=None, key=None, token=None):
+    """
+    Construct API authentication headers for the in-process test client.
+    """
+    headers = {}
+    for header, value in [('USER', user), ('GROUP', group), ('KEY', key), ('TOKEN', token)]:
+        if value:
+            headers['HTTP_LENSE_API_{0}'.format(header)] = value
+    return headers
+
+class LatencyProbe(object):
+    """
+    Issue in-process GET requests from a number of threads until stopped and
+    record their latencies in milliseconds.
+    """
+    def __init__(self, path, threads, headers):
+        self.path      = '/{0}'.format(path.strip('/'))
+        self.threads   = threads
+        self.headers   = headers
+        self.lock      = Lock()
+        self.latencies = []
+        self.running   = False
+        self.workers   = []
+
+    def _probe(self):
+        client = Client()
+        while self.running:
+            start = time()
+            client.get(self.path, **self.headers)
+            elapsed = (time() - start) * 1000
+            with self.lock:
+                self.latencies.append(elapsed)
+
+    def start(self):
+        self.running = True
+        self.workers = [Thread(target=self._probe) for i in range(self.threads)]
+        for worker in self.workers:
+            worker.start()
+
+    def stop(self):
+        self.running = False
+        for worker in self.workers:
+            worker.join()
+        return self.latencies
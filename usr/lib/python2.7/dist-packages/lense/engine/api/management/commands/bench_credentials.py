@@ -0,0 +1,70 @@
+from time import time, sleep
+from threading import Thread
+
+# Django Libraries
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Lense Libraries
+from lense.engine.api.core.credentials import CREDENTIALS, _hash_password
+from lense.engine.api.management.bench import init_engine, percentiles, api_headers, LatencyProbe
+
+class Command(BaseCommand):
+    """
+    Measure in-process GET latency during a burst of password hashing, with
+    hashing run inline on request threads versus in the credentials pool.
+    """
+    help = 'Benchmark concurrent GET latency during a bulk user creation burst'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='handler', help='GET request path to probe')
+        parser.add_argument('--readers', type=int, default=8, help='Concurrent GET threads')
+        parser.add_argument('--creators', type=int, default=8, help='Concurrent hashing threads')
+        parser.add_argument('--creates', type=int, default=200, help='Passwords hashed per burst')
+        parser.add_argument('--user', help='API user for authenticated paths')
+        parser.add_argument('--group', help='API group for authenticated paths')
+        parser.add_argument('--key', help='API key for authenticated paths')
+
+    def _burst(self, hasher, options):
+        """
+        Run a hashing burst while probing GET latency.
+        """
+        probe = LatencyProbe(options['path'], options['readers'], api_headers(options['user'], options['group'], options['key']))
+        per_thread = max(1, options['creates'] / options['creators'])
+
+        def _create():
+            for i in range(per_thread):
+                hasher('bench-password-{0}'.format(i))
+        creators = [Thread(target=_create) for i in range(options['creators'])]
+
+        # Run the burst
+        probe.start()
+        start = time()
+        for creator in creators:
+            creator.start()
+        for creator in creators:
+            creator.join()
+        elapsed = time() - start
+        return elapsed, probe.stop()
+
+    def _report(self, mode, elapsed, latencies):
+        stats = percentiles(latencies)
+        self.stdout.write('{0:<10} {1:>8} {2:>10.1f} {3:>10.1f} {4:>10.1f} {5:>10.1f}'.format(
+            mode, len(latencies), stats['p50'] or 0, stats['p95'] or 0, stats['p99'] or 0, elapsed))
+
+    def handle(self, *args, **options):
+        init_engine()
+        if not settings.API_CREDENTIALS_WORKERS:
+            raise CommandError('credentials.workers must be greater than 0 to benchmark the pool')
+        CREDENTIALS.start()
+
+        # Baseline latency without a burst
+        probe = LatencyProbe(options['path'], options['readers'], api_headers(options['user'], options['group'], options['key']))
+        probe.start()
+        sleep(2)
+        baseline = probe.stop()
+
+        self.stdout.write('{0:<10} {1:>8} {2:>10} {3:>10} {4:>10} {5:>10}'.format('mode', 'gets', 'p50_ms', 'p95_ms', 'p99_ms', 'burst_s'))
+        self._report('idle', 2.0, baseline)
+        self._report('inline', *self._burst(_hash_password, options))
+        self._report('pool', *self._burst(CREDENTIALS.hash_password, options))
@@ -0,0 +1,88 @@
+from time import time, sleep
+from threading import Thread
+
+# Django Libraries
+from django.db import connections
+from django.core.management.base import BaseCommand
+
+# Lense Libraries
+from lense.common.objects.stats.models import APIRequestStats
+from lense.engine.api.core.router import STATS_DB
+from lense.engine.api.management.bench import init_engine, percentiles, api_headers, LatencyProbe
+
+class Command(BaseCommand):
+    """
+    Measure in-process GET latency against the primary database while stats
+    rows are written and scanned, with stats stored in the primary database
+    versus the dedicated stats database.
+    """
+    help = 'Benchmark primary database contention with stats on the primary versus the stats database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='user', help='GET request path to probe')
+        parser.add_argument('--readers', type=int, default=8, help='Concurrent GET threads')
+        parser.add_argument('--writers', type=int, default=8, help='Concurrent stats insert threads')
+        parser.add_argument('--scanners', type=int, default=2, help='Concurrent stats scan threads')
+        parser.add_argument('--seconds', type=int, default=10, help='Duration of each run')
+        parser.add_argument('--user', help='API user for authenticated paths')
+        parser.add_argument('--group', help='API group for authenticated paths')
+        parser.add_argument('--key', help='API key for authenticated paths')
+
+    def _load(self, database, options):
+        """
+        Write and scan stats rows in a database while probing GET latency.
+        """
+        running = [True]
+
+        def _write():
+            while running[0]:
+                APIRequestStats(
+                    path         = 'bench',
+                    method       = 'GET',
+                    client_ip    = '127.0.0.1',
+                    client_user  = 'bench',
+                    client_group = 'bench',
+                    endpoint     = 'localhost',
+                    user_agent   = 'bench_stats',
+                    retcode      = 200,
+                    req_size     = 0,
+                    rsp_size     = 0,
+                    rsp_time_ms  = 0
+                ).save(using=database)
+            connections.close_all()
+
+        def _scan():
+            while running[0]:
+                list(APIRequestStats.objects.using(database).filter(rsp_time_ms__gt=-1).order_by('-rsp_time_ms')[:1000])
+            connections.close_all()
+
+        load  = [Thread(target=_write) for i in range(options['writers'])]
+        load += [Thread(target=_scan) for i in range(options['scanners'])]
+        for thread in load:
+            thread.start()
+        latencies = self._probe(options)
+        running[0] = False
+        for thread in load:
+            thread.join()
+
+        # Remove the benchmark rows
+        APIRequestStats.objects.using(database).filter(user_agent='bench_stats').delete()
+        return latencies
+
+    def _probe(self, options):
+        probe = LatencyProbe(options['path'], options['readers'], api_headers(options['user'], options['group'], options['key']))
+        probe.start()
+        sleep(options['seconds'])
+        return probe.stop()
+
+    def _report(self, mode, latencies, seconds):
+        stats = percentiles(latencies)
+        self.stdout.write('{0:<10} {1:>8} {2:>10.1f} {3:>10.1f} {4:>10.1f} {5:>10.1f}'.format(
+            mode, len(latencies), len(latencies) / float(seconds), stats['p50'] or 0, stats['p95'] or 0, stats['p99'] or 0))
+
+    def handle(self, *args, **options):
+        init_engine()
+        self.stdout.write('{0:<10} {1:>8} {2:>10} {3:>10} {4:>10} {5:>10}'.format('stats', 'gets', 'gets/s', 'p50_ms', 'p95_ms', 'p99_ms'))
+        self._report('off', self._probe(options), options['seconds'])
+        self._report('primary', self._load('default', options), options['seconds'])
+        self._report('stats', self._load(STATS_DB, options), options['seconds'])
@@ -0,0 +1,125 @@
+from time import time, sleep
+from threading import Thread, Lock
+from Queue import Queue
+from json import loads as json_loads, dumps as json_dumps
+
+# Django Libraries
+from django.test import Client
+from django.core.management.base import BaseCommand, CommandError
+
+# Lense Libraries
+from lense.engine.api.management.bench import init_engine, percentiles, api_headers
+
+class Command(BaseCommand):
+    """
+    Re-issue a traffic capture against the in-process engine, preserving the
+    recorded request spacing divided by a speed-up factor, and compare replay
+    latencies with the recorded originals per handler. Credentials are stripped
+    from captures, so every request is replayed as the given API user.
+    """
+    help = 'Replay a captured request log and report per-handler latency percentiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('capture', help='Capture file (NDJSON) to replay')
+        parser.add_argument('--speedup', type=float, default=1.0, help='Replay speed-up factor, 0 for as fast as possible')
+        parser.add_argument('--concurrency', type=int, default=8, help='Concurrent replay threads')
+        parser.add_argument('--methods', default='GET', help='Comma separated request methods to replay, or "*"')
+        parser.add_argument('--user', help='API user to replay requests as')
+        parser.add_argument('--group', help='API group to replay requests as')
+        parser.add_argument('--key', help='API key to replay requests as')
+
+    def _load(self, capture, methods):
+        """
+        Load capture records, filtered by request method and ordered by time.
+        """
+        records = []
+        try:
+            with open(capture, 'r') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    record = json_loads(line)
+                    if methods == ['*'] or record['method'] in methods:
+                        records.append(record)
+        except (IOError, ValueError) as e:
+            raise CommandError('Failed to load capture file "{0}": {1}'.format(capture, str(e)))
+        return sorted(records, key=lambda r: r['ts'])
+
+    def _request(self, client, record, headers):
+        """
+        Replay a single record and return the status code and latency.
+        """
+        path  = '/{0}'.format(record['path'].strip('/'))
+        start = time()
+        if record['method'] == 'GET':
+            response = client.get(path, record['data'] or {}, **headers)
+        else:
+            response = client.generic(record['method'], path, json_dumps(record['data'] or {}), 'application/json', **headers)
+        return response.status_code, (time() - start) * 1000
+
+    def _replay(self, records, options):
+        """
+        Replay records from a pool of threads, scheduling each one at its
+        recorded offset divided by the speed-up factor.
+        """
+        headers = api_headers(options['user'], options['group'], options['key'])
+        queue   = Queue(options['concurrency'] * 4)
+        lock    = Lock()
+        results = []
+
+        def _worker():
+            client = Client()
+            while True:
+                record = queue.get()
+                if record is None:
+                    break
+                code, elapsed = self._request(client, record, headers)
+                with lock:
+                    results.append((record, code, elapsed))
+        workers = [Thread(target=_worker) for i in range(options['concurrency'])]
+        for worker in workers:
+            worker.start()
+
+        # Schedule the records
+        start = time()
+        for record in records:
+            if options['speedup'] > 0:
+                delay = ((record['ts'] - records[0]['ts']) / options['speedup']) - (time() - start)
+                if delay > 0:
+                    sleep(delay)
+            queue.put(record)
+        for worker in workers:
+            queue.put(None)
+        for worker in workers:
+            worker.join()
+        return results, time() - start
+
+    def _report(self, results, elapsed):
+        handlers = {}
+        for record, code, latency in results:
+            handler = handlers.setdefault('{0}:{1}'.format(record['method'], record['path'].strip('/')), {
+                'recorded': [], 'replayed': [], 'mismatched': 0
+            })
+            handler['recorded'].append(record['time_ms'])
+            handler['replayed'].append(latency)
+            if code != record['code']:
+                handler['mismatched'] += 1
+
+        self.stdout.write('{0:<40} {1:>7} {2:>7} {3:>10} {4:>10} {5:>10} {6:>10}'.format(
+            'handler', 'count', 'status', 'rec_p50', 'rep_p50', 'rec_p95', 'rep_p95'))
+        for name, handler in sorted(handlers.iteritems()):
+            recorded = percentiles(handler['recorded'], (50, 95))
+            replayed = percentiles(handler['replayed'], (50, 95))
+            self.stdout.write('{0:<40} {1:>7} {2:>7} {3:>10.1f} {4:>10.1f} {5:>10.1f} {6:>10.1f}'.format(
+                name, len(handler['replayed']), handler['mismatched'],
+                recorded['p50'], replayed['p50'], recorded['p95'], replayed['p95']))
+        self.stdout.write('Replayed {0} requests in {1:.1f}s ("status" counts responses differing from the capture)'.format(len(results), elapsed))
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency must be at least 1')
+        records = self._load(options['capture'], [m.strip().upper() for m in options['methods'].split(',')])
+        if not records:
+            raise CommandError('No matching requests found in capture file "{0}"'.format(options['capture']))
+        init_engine()
+        self._report(*self._replay(records, options))
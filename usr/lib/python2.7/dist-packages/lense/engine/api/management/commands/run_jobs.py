@@ -0,0 +1,23 @@
+# Django Libraries
+from django.core.management.base import BaseCommand, CommandError
+
+# Lense Libraries
+from lense.engine.api.core.jobs import JOBS
+from lense.engine.api.management.bench import init_engine
+
+class Command(BaseCommand):
+    """
+    Run the background job workers in the foreground. Used by deployments
+    without the prefork server, i.e. mod_wsgi, where the serving processes
+    must not fork workers themselves. One instance per host is enough.
+    """
+    help = 'Run the background job workers'
+
+    def handle(self, *args, **options):
+        if not JOBS:
+            raise CommandError('Background jobs are disabled, set jobs.enable to run job workers')
+        init_engine()
+        JOBS.start()
+        self.stdout.write('Started {0} job workers'.format(len(JOBS.workers)))
+        for worker in JOBS.workers:
+            worker.join()
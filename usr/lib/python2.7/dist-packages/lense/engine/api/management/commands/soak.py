@@ -0,0 +1,108 @@
+import gc
+from time import time
+from threading import Thread, Lock
+from itertools import cycle
+
+# Django Libraries
+from django.db import reset_queries
+from django.test import Client
+from django.core.management.base import BaseCommand, CommandError
+
+# Lense Libraries
+from lense.engine.api.core.memory import rss_kb, object_counts, count_growth
+from lense.engine.api.management.bench import init_engine, percentiles, api_headers
+
+# Default request mix
+DEFAULT_PATHS = 'health/live,handler,user,group,stats/requests?mode=metrics'
+
+class Command(BaseCommand):
+    """
+    Run a long mix of in-process GET requests and fail if the memory retained
+    by the process grows past a threshold. Memory is measured after a warm-up
+    so caches and lazy imports filled by the first requests are not counted.
+    """
+    help = 'Soak test the engine in-process and fail on retained memory growth'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100000, help='Total requests to run after warm-up')
+        parser.add_argument('--warmup', type=int, default=1000, help='Warm-up requests before measuring')
+        parser.add_argument('--threads', type=int, default=4, help='Concurrent request threads')
+        parser.add_argument('--paths', default=DEFAULT_PATHS, help='Comma separated GET paths to cycle through')
+        parser.add_argument('--threshold', type=int, default=20480, help='Maximum retained RSS growth in KB')
+        parser.add_argument('--user', help='API user for authenticated paths')
+        parser.add_argument('--group', help='API group for authenticated paths')
+        parser.add_argument('--key', help='API key for authenticated paths')
+
+    def _run(self, total, options):
+        """
+        Issue requests from a number of threads, cycling through the paths.
+        Returns the number of requests, the latency percentiles and the number
+        of server errors. The latencies are reduced to percentiles here, so
+        they are not retained when memory is measured.
+        """
+        headers   = api_headers(options['user'], options['group'], options['key'])
+        paths     = cycle(['/{0}'.format(p.strip().strip('/')) for p in options['paths'].split(',')])
+        lock      = Lock()
+        remaining = [total]
+        latencies = []
+        errors    = [0]
+
+        def _worker():
+            client = Client()
+            while True:
+                with lock:
+                    if not remaining[0]:
+                        return
+                    remaining[0] -= 1
+                    path = next(paths)
+                start    = time()
+                response = client.get(path, **headers)
+                elapsed  = (time() - start) * 1000
+                with lock:
+                    latencies.append(elapsed)
+                    if response.status_code >= 500:
+                        errors[0] += 1
+        workers = [Thread(target=_worker) for i in range(options['threads'])]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        requests, stats = len(latencies), percentiles(latencies)
+        del latencies[:]
+        return requests, stats, errors[0]
+
+    def _measure(self):
+        """
+        Collect garbage and measure retained memory.
+        """
+        reset_queries()
+        gc.collect()
+        return rss_kb(), object_counts()
+
+    def handle(self, *args, **options):
+        if options['threads'] < 1:
+            raise CommandError('--threads must be at least 1')
+        init_engine()
+
+        # Warm up and take the baseline
+        self._run(options['warmup'], options)
+        rss_start, objects_start = self._measure()
+
+        # Soak
+        start = time()
+        requests, stats, errors = self._run(options['requests'], options)
+        elapsed = time() - start
+        rss_end, objects_end = self._measure()
+
+        # Report
+        growth = rss_end - rss_start
+        self.stdout.write('requests={0} errors={1} elapsed_s={2:.1f} p50_ms={3:.1f} p95_ms={4:.1f} p99_ms={5:.1f}'.format(
+            requests, errors, elapsed, stats['p50'] or 0, stats['p95'] or 0, stats['p99'] or 0))
+        self.stdout.write('rss_start_kb={0} rss_end_kb={1} retained_kb={2} threshold_kb={3}'.format(
+            rss_start, rss_end, growth, options['threshold']))
+        for name, delta in count_growth(objects_start, objects_end, 10):
+            self.stdout.write('  +{0:<10} {1}'.format(delta, name))
+
+        # Fail on retained growth
+        if growth > options['threshold']:
+            raise CommandError('Retained memory grew by {0}KB, exceeding the {1}KB threshold'.format(growth, options['threshold']))
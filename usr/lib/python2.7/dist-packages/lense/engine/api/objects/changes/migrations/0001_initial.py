@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='APIChange',
+            fields=[
+                ('seq', models.AutoField(serialize=False, primary_key=True)),
+                ('type', models.CharField(max_length=32, db_index=True)),
+                ('uuid', models.CharField(max_length=36)),
+                ('action', models.CharField(max_length=32)),
+                ('data', models.TextField(default='{}')),
+                ('user', models.CharField(max_length=64, null=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'api_changes',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+from django.db import models
+
+class APIChange(models.Model):
+    """
+    Append-only journal of changes to users, groups and handlers. The sequence
+    number increases monotonically and is used by clients to fetch deltas.
+    """
+    seq     = models.AutoField(primary_key=True)
+    type    = models.CharField(max_length=32, db_index=True)
+    uuid    = models.CharField(max_length=36)
+    action  = models.CharField(max_length=32)
+    data    = models.TextField(default='{}')
+    user    = models.CharField(max_length=64, null=True)
+    created = models.DateTimeField(auto_now_add=True)
+    
+    # Custom model metadata
+    class Meta:
+        db_table = 'api_changes'
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='APIIdempotencyKey',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('user', models.CharField(max_length=64)),
+                ('key', models.CharField(max_length=128)),
+                ('fingerprint', models.CharField(max_length=40)),
+                ('status', models.CharField(max_length=16, default='pending')),
+                ('code', models.IntegerField(null=True)),
+                ('content', models.TextField(null=True)),
+                ('content_type', models.CharField(max_length=128, null=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('expires', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'db_table': 'api_idempotency_keys',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='apiidempotencykey',
+            unique_together=set([('user', 'key')]),
+        ),
+    ]
@@ -0,0 +1,22 @@
+from django.db import models
+
+class APIIdempotencyKey(models.Model):
+    """
+    Response stored for a client supplied idempotency key. The row is created
+    as pending when the first request with a key starts, and holds the final
+    response once it completes.
+    """
+    user         = models.CharField(max_length=64)
+    key          = models.CharField(max_length=128)
+    fingerprint  = models.CharField(max_length=40)
+    status       = models.CharField(max_length=16, default='pending')
+    code         = models.IntegerField(null=True)
+    content      = models.TextField(null=True)
+    content_type = models.CharField(max_length=128, null=True)
+    created      = models.DateTimeField(auto_now_add=True)
+    expires      = models.DateTimeField(db_index=True)
+    
+    # Custom model metadata
+    class Meta:
+        db_table        = 'api_idempotency_keys'
+        unique_together = ('user', 'key')
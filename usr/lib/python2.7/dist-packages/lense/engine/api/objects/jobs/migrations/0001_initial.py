@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='APIJob',
+            fields=[
+                ('uuid', models.CharField(max_length=36, serialize=False, primary_key=True)),
+                ('type', models.CharField(max_length=32, db_index=True)),
+                ('method', models.CharField(max_length=8)),
+                ('path', models.CharField(max_length=128)),
+                ('data', models.TextField(default='{}')),
+                ('user', models.CharField(max_length=64, null=True)),
+                ('group', models.CharField(max_length=36, null=True)),
+                ('status', models.CharField(max_length=16, db_index=True, default='queued')),
+                ('progress', models.IntegerField(default=0)),
+                ('message', models.TextField(null=True)),
+                ('result', models.TextField(null=True)),
+                ('worker', models.IntegerField(null=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('started', models.DateTimeField(null=True)),
+                ('finished', models.DateTimeField(null=True)),
+            ],
+            options={
+                'db_table': 'api_jobs',
+            },
+        ),
+    ]
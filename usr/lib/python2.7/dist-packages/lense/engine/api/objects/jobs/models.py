@@ -0,0 +1,26 @@
+from django.db import models
+
+class APIJob(models.Model):
+    """
+    Background job for a long running request. Jobs are queued by the engine
+    process that accepted the request and claimed by the job workers.
+    """
+    uuid     = models.CharField(max_length=36, primary_key=True)
+    type     = models.CharField(max_length=32, db_index=True)
+    method   = models.CharField(max_length=8)
+    path     = models.CharField(max_length=128)
+    data     = models.TextField(default='{}')
+    user     = models.CharField(max_length=64, null=True)
+    group    = models.CharField(max_length=36, null=True)
+    status   = models.CharField(max_length=16, db_index=True, default='queued')
+    progress = models.IntegerField(default=0)
+    message  = models.TextField(null=True)
+    result   = models.TextField(null=True)
+    worker   = models.IntegerField(null=True)
+    created  = models.DateTimeField(auto_now_add=True)
+    started  = models.DateTimeField(null=True)
+    finished = models.DateTimeField(null=True)
+    
+    # Custom model metadata
+    class Meta:
+        db_table = 'api_jobs'
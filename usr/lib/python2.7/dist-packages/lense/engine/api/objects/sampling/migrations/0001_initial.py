@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='APIRequestWeight',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('stats', models.IntegerField(unique=True)),
+                ('weight', models.IntegerField(default=1)),
+            ],
+            options={
+                'db_table': 'api_request_weights',
+            },
+        ),
+        migrations.CreateModel(
+            name='APIRequestCounter',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('path', models.CharField(max_length=128)),
+                ('method', models.CharField(max_length=8)),
+                ('window', models.IntegerField(db_index=True)),
+                ('requests', models.IntegerField(default=0)),
+                ('errors', models.IntegerField(default=0)),
+                ('slow', models.IntegerField(default=0)),
+                ('logged', models.IntegerField(default=0)),
+                ('time_ms', models.BigIntegerField(default=0)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'api_request_counters',
+            },
+        ),
+    ]
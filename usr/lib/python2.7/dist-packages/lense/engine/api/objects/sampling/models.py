@@ -0,0 +1,32 @@
+from django.db import models
+
+class APIRequestWeight(models.Model):
+    """
+    Sampling weight of a request stats row. A row logged at a sample rate of 1
+    in N stands for N requests; rows without a weight stand for one.
+    """
+    stats   = models.IntegerField(unique=True)
+    weight  = models.IntegerField(default=1)
+    
+    # Custom model metadata
+    class Meta:
+        db_table = 'api_request_weights'
+
+class APIRequestCounter(models.Model):
+    """
+    Exact request counters for a handler path and method over a time window.
+    Each engine process writes its own rows; rows are summed on read.
+    """
+    path     = models.CharField(max_length=128)
+    method   = models.CharField(max_length=8)
+    window   = models.IntegerField(db_index=True)
+    requests = models.IntegerField(default=0)
+    errors   = models.IntegerField(default=0)
+    slow     = models.IntegerField(default=0)
+    logged   = models.IntegerField(default=0)
+    time_ms  = models.BigIntegerField(default=0)
+    created  = models.DateTimeField(auto_now_add=True)
+    
+    # Custom model metadata
+    class Meta:
+        db_table = 'api_request_counters'
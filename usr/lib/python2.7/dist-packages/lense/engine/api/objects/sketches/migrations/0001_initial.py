@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='APILatencySketch',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('path', models.CharField(max_length=128)),
+                ('method', models.CharField(max_length=8)),
+                ('window', models.IntegerField(db_index=True)),
+                ('count', models.IntegerField(default=0)),
+                ('data', models.BinaryField()),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'api_latency_sketches',
+            },
+        ),
+    ]
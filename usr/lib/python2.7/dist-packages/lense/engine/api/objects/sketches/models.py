@@ -0,0 +1,17 @@
+from django.db import models
+
+class APILatencySketch(models.Model):
+    """
+    Persisted latency sketch for a handler path and method over a time window.
+    Each engine process writes its own rows; rows are merged on read.
+    """
+    path    = models.CharField(max_length=128)
+    method  = models.CharField(max_length=8)
+    window  = models.IntegerField(db_index=True)
+    count   = models.IntegerField(default=0)
+    data    = models.BinaryField()
+    created = models.DateTimeField(auto_now_add=True)
+    
+    # Custom model metadata
+    class Meta:
+        db_table = 'api_latency_sketches'
@@ -0,0 +1,5 @@
+"""
+Engine tests. Run from the API directory with:
+
+    python manage.py test lense.engine.api.tests
+"""
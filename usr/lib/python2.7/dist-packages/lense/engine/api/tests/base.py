@@ -0,0 +1,64 @@
+import __builtin__
+from shutil import rmtree
+from tempfile import mkdtemp
+from os import path
+
+# Lense Libraries
+from lense.engine.api.core.context import start_context, end_context
+
+class FakeUser(object):
+    def __init__(self, name, group):
+        self.name  = name
+        self.group = group
+
+class FakeRequest(object):
+    """
+    Stand-in for LENSE.REQUEST with the attributes the engine core reads.
+    """
+    def __init__(self, user='tester', group='testers', method='GET', path='user', data=None):
+        self.USER         = FakeUser(user, group)
+        self.method       = method
+        self.path         = path
+        self.data         = data or {}
+        self.is_anonymous = False
+
+class FakeLense(object):
+    def __init__(self, **kwargs):
+        self.REQUEST = FakeRequest(**kwargs)
+
+class EngineTestMixin(object):
+    """
+    Give each test a scratch directory and a fake LENSE global, restored when
+    the test ends.
+    """
+    def setUp(self):
+        super(EngineTestMixin, self).setUp()
+        self.tmp = mkdtemp(prefix='lense-test-')
+        self.addCleanup(rmtree, self.tmp, True)
+
+        # Fake the LENSE global for the duration of the test
+        saved = getattr(__builtin__, 'LENSE', None)
+        self.addCleanup(setattr, __builtin__, 'LENSE', saved)
+        self.lense(**self.request_defaults())
+
+    def request_defaults(self):
+        return {}
+
+    def lense(self, **kwargs):
+        """
+        Install a fake LENSE global for a request.
+        """
+        __builtin__.LENSE = FakeLense(**kwargs)
+        return __builtin__.LENSE
+
+    def tmpfile(self, name):
+        return path.join(self.tmp, name)
+
+    def context(self):
+        """
+        Start the request context of a dispatched and mapped request.
+        """
+        context = start_context(None)
+        context.mapped = True
+        self.addCleanup(end_context)
+        return context
@@ -0,0 +1,69 @@
+from time import sleep
+from threading import Thread, Event
+from django.test import SimpleTestCase, override_settings
+from django.http import HttpResponse
+
+# Lense Libraries
+from lense.engine.api.core.coalesce import RequestCoalescer
+from lense.engine.api.core.context import start_context, end_context
+from lense.engine.api.tests.base import EngineTestMixin
+
+@override_settings(API_COALESCE_SCOPE='user', API_COALESCE_HANDLERS={'GET:handler': 'global', 'GET:stats': 'none'}, API_COALESCE_TIMEOUT=5)
+class RequestCoalescerTest(EngineTestMixin, SimpleTestCase):
+    """
+    Coalescing keys per ACL scope, and shared executions.
+    """
+    def setUp(self):
+        super(RequestCoalescerTest, self).setUp()
+        self.coalescer = RequestCoalescer()
+        self.request   = self.context()
+
+    def key(self, user, group, path='user', scope=None):
+        self.lense(user=user, group=group, path=path)
+        if not scope:
+            return self.coalescer._key(self.request)
+        with self.settings(API_COALESCE_SCOPE=scope):
+            return self.coalescer._key(self.request)
+
+    def test_user_scope_shared_by_same_user_only(self):
+        self.assertEqual(self.key('alice', 'admins'), self.key('alice', 'admins'))
+        self.assertNotEqual(self.key('alice', 'admins'), self.key('bob', 'admins'))
+        self.assertNotEqual(self.key('alice', 'admins'), self.key('alice', 'users'))
+
+    def test_group_scope_shared_within_group(self):
+        self.assertEqual(self.key('alice', 'admins', scope='group'), self.key('bob', 'admins', scope='group'))
+        self.assertNotEqual(self.key('alice', 'admins', scope='group'), self.key('carol', 'users', scope='group'))
+
+    def test_handler_scope_overrides_default(self):
+        self.assertEqual(self.key('alice', 'admins', path='handler'), self.key('carol', 'users', path='handler'))
+        self.assertIsNone(self.key('alice', 'admins', path='stats'))
+
+    def test_request_data_is_part_of_key(self):
+        first = self.key('alice', 'admins')
+        LENSE.REQUEST.data = {'uuid': 'other'}
+        self.assertNotEqual(first, self.coalescer._key(self.request))
+
+    def test_follower_shares_leader_response(self):
+        started, calls = Event(), []
+
+        def _lead():
+            calls.append('leader')
+            started.set()
+            sleep(0.2)
+            return HttpResponse('shared', content_type='text/plain')
+
+        def _leader():
+            start_context(None).mapped = True
+            try:
+                self.coalescer.run(_lead)
+            finally:
+                end_context()
+
+        # The flight is registered before the leader runs, so this request joins it
+        leader = Thread(target=_leader)
+        leader.start()
+        started.wait(5)
+        response = self.coalescer.run(lambda: calls.append('follower'))
+        leader.join(5)
+        self.assertEqual(calls, ['leader'])
+        self.assertEqual(response.content, 'shared')
@@ -0,0 +1,81 @@
+from datetime import timedelta
+from django.test import TestCase, override_settings
+from django.http import HttpResponse
+from django.utils import timezone
+
+# Lense Libraries
+from lense.common.exceptions import RequestError
+from lense.engine.api.core.idempotency import IdempotentRequests, HEADER_REPLAYED
+from lense.engine.api.objects.idempotency.models import APIIdempotencyKey
+from lense.engine.api.tests.base import EngineTestMixin
+
+@override_settings(API_IDEMPOTENCY_WAIT=1, API_IDEMPOTENCY_POLL=10, API_MANIFEST_TIMEOUT=1)
+class IdempotentRequestsTest(EngineTestMixin, TestCase):
+    """
+    Stored responses, retries and pending key leases.
+    """
+    def setUp(self):
+        super(IdempotentRequestsTest, self).setUp()
+        self.calls    = []
+        self.request  = self.context()
+        self.requests = IdempotentRequests()
+
+    def request_defaults(self):
+        return {'user': 'alice', 'method': 'POST', 'path': 'user', 'data': {'username': 'bob'}}
+
+    def respond(self, code=200):
+        def _respond():
+            self.calls.append(code)
+            return HttpResponse('{"username": "bob"}', status=code, content_type='application/json')
+        return _respond
+
+    def pending(self, expires):
+        return APIIdempotencyKey.objects.create(
+            user        = 'alice',
+            key         = 'k1',
+            fingerprint = self.requests._fingerprint(self.request),
+            expires     = timezone.now() + timedelta(seconds=expires))
+
+    def test_retry_replays_stored_response(self):
+        first  = self.requests.run('k1', self.respond())
+        second = self.requests.run('k1', self.respond())
+        self.assertEqual(self.calls, [200])
+        self.assertEqual(second.status_code, first.status_code)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second[HEADER_REPLAYED], 'true')
+
+    def test_key_reused_for_other_request(self):
+        self.requests.run('k1', self.respond())
+        LENSE.REQUEST.data = {'username': 'carol'}
+        with self.assertRaises(RequestError) as raised:
+            self.requests.run('k1', self.respond())
+        self.assertEqual(raised.exception.code, 422)
+
+    def test_keys_are_per_user(self):
+        self.requests.run('k1', self.respond())
+        self.lense(**dict(self.request_defaults(), user='bob'))
+        self.requests.run('k1', self.respond())
+        self.assertEqual(self.calls, [200, 200])
+
+    def test_server_error_releases_key(self):
+        self.requests.run('k1', self.respond(500))
+        self.requests.run('k1', self.respond())
+        self.assertEqual(self.calls, [500, 200])
+
+    def test_pending_key_conflicts_while_leased(self):
+        self.pending(expires=60)
+        with self.assertRaises(RequestError) as raised:
+            self.requests.run('k1', self.respond())
+        self.assertEqual(raised.exception.code, 409)
+        self.assertEqual(self.calls, [])
+
+    def test_expired_lease_is_taken_over(self):
+        self.pending(expires=-1)
+        self.requests.run('k1', self.respond())
+        self.assertEqual(self.calls, [200])
+        self.assertEqual(APIIdempotencyKey.objects.get(user='alice', key='k1').status, 'complete')
+
+    def test_completed_key_outlives_lease(self):
+        self.requests.run('k1', self.respond())
+        row = APIIdempotencyKey.objects.get(user='alice', key='k1')
+        self.assertGreater(row.expires, timezone.now() + timedelta(seconds=self.requests.lease))
@@ -0,0 +1,73 @@
+from datetime import timedelta
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+# Lense Libraries
+from lense.engine.api.core.invalidation import InvalidationBus, GENERATION_KEY
+from lense.engine.api.objects.changes.models import APIChange
+from lense.engine.api.tests.base import EngineTestMixin
+
+@override_settings(API_INVALIDATION_SYNC=0, API_INVALIDATION_BROADCAST=False, API_CHANGES_GAP_WAIT=5)
+class InvalidationBusTest(EngineTestMixin, TestCase):
+    """
+    Generation bumps, deferral inside transactions and journal sync.
+    """
+    def setUp(self):
+        super(InvalidationBusTest, self).setUp()
+        with self.settings(API_INVALIDATION_STORE=self.tmpfile('invalidation.table')):
+            self.bus = InvalidationBus()
+
+    def generation(self, obj_type):
+        values = self.bus.table.get(GENERATION_KEY.format(obj_type))
+        return 0 if not values else int(values[0])
+
+    def change(self, seq, obj_type, age=0):
+        change = APIChange.objects.create(seq=seq, type=obj_type, uuid=str(seq), action='update')
+        APIChange.objects.filter(seq=seq).update(created=timezone.now() - timedelta(seconds=age))
+        return change
+
+    def test_bump_deferred_until_flush(self):
+
+        # Test cases run inside a transaction
+        self.bus.bump('user')
+        self.assertEqual(self.generation('user'), 0)
+        self.bus.flush()
+        self.assertEqual(self.generation('user'), 1)
+
+    def test_first_sync_starts_from_latest_change(self):
+        self.change(1, 'user')
+        self.assertEqual(self.bus.sync(), 0)
+        self.assertEqual(self.generation('user'), 0)
+
+    def test_sync_bumps_changed_types(self):
+        self.change(1, 'user')
+        self.bus.sync()
+        self.change(2, 'group')
+        self.change(3, 'group')
+        self.assertEqual(self.bus.sync(), 2)
+        self.assertEqual(self.generation('group'), 1)
+        self.assertEqual(self.generation('user'), 0)
+
+        # Nothing new
+        self.assertEqual(self.bus.sync(), 0)
+        self.assertEqual(self.generation('group'), 1)
+
+    def test_sync_waits_at_recent_gap(self):
+        self.change(1, 'user')
+        self.bus.sync()
+
+        # Change 2 is not committed yet, change 3 must not be skipped past it
+        self.change(3, 'handler')
+        self.assertEqual(self.bus.sync(), 0)
+        self.assertEqual(self.generation('handler'), 0)
+        self.change(2, 'group')
+        self.assertEqual(self.bus.sync(), 2)
+        self.assertEqual(self.generation('group'), 1)
+        self.assertEqual(self.generation('handler'), 1)
+
+    def test_sync_moves_past_old_gap(self):
+        self.change(1, 'user')
+        self.bus.sync()
+        self.change(3, 'handler', age=60)
+        self.assertEqual(self.bus.sync(), 1)
+        self.assertEqual(self.generation('handler'), 1)
@@ -0,0 +1,90 @@
+from uuid import uuid4
+from datetime import timedelta
+from django.test import TestCase
+from django.utils import timezone
+
+# Lense Libraries
+from lense.engine.api.core.jobs import JobQueue
+from lense.engine.api.objects.jobs.models import APIJob
+from lense.engine.api.tests.base import EngineTestMixin
+
+class JobQueueTest(EngineTestMixin, TestCase):
+    """
+    Claiming background jobs and storing their outcome.
+    """
+    def setUp(self):
+        super(JobQueueTest, self).setUp()
+        self.queue = JobQueue()
+        settings   = self.settings(API_JOBS_LOCK=self.tmpfile('jobs.lock'), API_JOBS_TIMEOUT=60, API_JOBS_LIMIT=2, API_JOBS_LIMITS={'export': 1})
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def job(self, job_type='export', age=0, **kwargs):
+        job = APIJob.objects.create(uuid=str(uuid4()), type=job_type, method='POST', path='export', user='alice', **kwargs)
+
+        # Backdate jobs to order them, creation times may share a second
+        APIJob.objects.filter(uuid=job.uuid).update(created=timezone.now() - timedelta(seconds=age))
+        return job
+
+    def test_claim_marks_oldest_job_running(self):
+        first, second = self.job(age=2), self.job('import', age=1)
+        claimed = self.queue.claim()
+        self.assertEqual(claimed.uuid, first.uuid)
+        job = APIJob.objects.get(uuid=first.uuid)
+        self.assertEqual(job.status, 'running')
+        self.assertIsNotNone(job.worker)
+        self.assertIsNotNone(job.started)
+
+    def test_claim_respects_type_limit(self):
+        self.job()
+        self.job()
+        self.assertIsNotNone(self.queue.claim())
+        self.assertIsNone(self.queue.claim())
+
+    def test_job_claimed_elsewhere_is_skipped(self):
+        taken, free = self.job(age=2), self.job('import', age=1)
+        original    = APIJob.objects.filter
+
+        # Another worker claims the job between the lookup and the update
+        def _filter(*args, **kwargs):
+            if kwargs == {'uuid': taken.uuid, 'status': 'queued'}:
+                original(uuid=taken.uuid).update(status='running', worker=0)
+            return original(*args, **kwargs)
+        APIJob.objects.filter = _filter
+        self.addCleanup(delattr, APIJob.objects, 'filter')
+
+        self.assertEqual(self.queue.claim().uuid, free.uuid)
+        self.assertEqual(APIJob.objects.get(uuid=taken.uuid).worker, 0)
+
+    def test_timed_out_job_failed_on_claim(self):
+        job = self.job(status='running', worker=0, started=timezone.now() - timedelta(seconds=120))
+        self.queue.claim()
+        job = APIJob.objects.get(uuid=job.uuid)
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.message, 'Job timed out')
+
+    def test_finish_after_timeout_keeps_failure(self):
+        self.job()
+        job = self.queue.claim()
+        APIJob.objects.filter(uuid=job.uuid).update(status='failed', message='Job timed out')
+        self.queue._finish(job, 'complete', 'Done', {'ok': True})
+        job = APIJob.objects.get(uuid=job.uuid)
+        self.assertEqual(job.status, 'failed')
+        self.assertIsNone(job.result)
+
+    def test_finish_stores_outcome(self):
+        self.job()
+        job = self.queue.claim()
+        self.queue._finish(job, 'complete', 'Done', {'ok': True})
+        job = APIJob.objects.get(uuid=job.uuid)
+        self.assertEqual(job.status, 'complete')
+        self.assertEqual(job.progress, 100)
+
+    def test_failed_job_keeps_reported_progress(self):
+        self.job()
+        job = self.queue.claim()
+        APIJob.objects.filter(uuid=job.uuid).update(progress=40)
+        self.queue._finish(job, 'failed', 'Failed')
+        job = APIJob.objects.get(uuid=job.uuid)
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.progress, 40)
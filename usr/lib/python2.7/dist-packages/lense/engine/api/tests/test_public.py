@@ -0,0 +1,73 @@
+from django.test import SimpleTestCase, RequestFactory
+
+# Lense Libraries
+from lense.engine.api.core.metrics import METRICS
+from lense.engine.api.core.context import start_context, end_context, materialize, METRICS_KEY
+from lense.engine.api.core.public import PublicHandlers
+from lense.engine.api.handlers.handler import list_handlers
+from lense.engine.api.tests.base import EngineTestMixin
+
+class FakeHandler(object):
+    def __init__(self, path, method, cls, allow_anon=True):
+        self.path       = path
+        self.method     = method
+        self.cls        = cls
+        self.allow_anon = allow_anon
+        self.name       = cls
+        self.desc       = ''
+
+class FakeHandlers(object):
+    def __init__(self, handlers):
+        self.handlers = handlers
+
+    def get_internal(self):
+        return self.handlers
+
+class FakeObjects(object):
+    def __init__(self, handlers):
+        self.HANDLER = FakeHandlers(handlers)
+
+class FakeCache(object):
+    def get(self, key, loader):
+        return loader()
+
+class PublicHandlersTest(EngineTestMixin, SimpleTestCase):
+    """
+    Anonymous requests for public handlers answered without engine setup.
+    """
+    def setUp(self):
+        super(PublicHandlersTest, self).setUp()
+        LENSE.OBJECTS = FakeObjects([
+            FakeHandler('handler/list', 'GET', 'Handler_List'),
+            FakeHandler('handler', 'GET', 'Handler_Get'),
+            FakeHandler('locked/list', 'GET', 'Handler_List', allow_anon=False)
+        ])
+        self.public       = PublicHandlers()
+        self.public.cache = FakeCache()
+
+    def request(self, path, **headers):
+        return RequestFactory().get('/{0}'.format(path), **headers)
+
+    def test_anonymous_public_request_answered(self):
+        self.assertIs(self.public.responder(self.request('handler/list/')), list_handlers)
+
+    def test_request_with_credentials_takes_normal_path(self):
+        self.assertIsNone(self.public.responder(self.request('handler/list', HTTP_LENSE_API_USER='alice')))
+        self.assertIsNone(self.public.responder(self.request('handler/list', HTTP_LENSE_API_TOKEN='token')))
+
+    def test_handlers_without_responder_or_anonymous_access(self):
+        self.assertIsNone(self.public.responder(self.request('handler')))
+        self.assertIsNone(self.public.responder(self.request('locked/list')))
+
+    def test_context_counts_pieces_once_per_request(self):
+        before  = METRICS.dump().get(METRICS_KEY, {})
+        start_context(None)
+        materialize('setup')
+        materialize('acl')
+        materialize('acl')
+        end_context()
+        after   = METRICS.dump()[METRICS_KEY]
+        self.assertEqual(after['requests'] - before.get('requests', 0), 1)
+        self.assertEqual(after['setup'] - before.get('setup', 0), 1)
+        self.assertEqual(after['acl'] - before.get('acl', 0), 1)
+        self.assertEqual(after.get('auth', 0) - before.get('auth', 0), 0)
@@ -0,0 +1,89 @@
+from json import dumps as json_dumps
+from django.test import SimpleTestCase, RequestFactory
+from django.core.exceptions import ImproperlyConfigured
+
+# Lense Libraries
+from lense.engine.api.core.ratelimit import RateLimiter, RateLimited
+from lense.engine.api.tests.base import EngineTestMixin
+
+class RateLimiterTest(EngineTestMixin, SimpleTestCase):
+    """
+    Token bucket limits per client IP, user and group.
+    """
+    rules = {
+        'default': {
+            'ip': {'rate': 1, 'burst': 3},
+            'user': {'rate': 1, 'burst': 2}
+        }
+    }
+
+    def limiter(self, slots=1024, proxies=None, rules=None):
+        with open(self.tmpfile('rules.json'), 'w') as f:
+            f.write(json_dumps(rules or self.rules))
+        with self.settings(
+            API_RATELIMIT_RULES   = self.tmpfile('rules.json'),
+            API_RATELIMIT_STORE   = self.tmpfile('ratelimit.table'),
+            API_RATELIMIT_SLOTS   = slots,
+            API_RATELIMIT_PROXIES = proxies or []):
+            return RateLimiter()
+
+    def request(self, remote, forwarded=None):
+        meta = {'REMOTE_ADDR': remote}
+        if forwarded:
+            meta['HTTP_X_FORWARDED_FOR'] = forwarded
+        return RequestFactory().get('/user', **meta)
+
+    def test_ip_limited_after_burst(self):
+        limiter = self.limiter()
+        for i in range(3):
+            self.assertIsNone(limiter.check(self.request('192.0.2.1')))
+        scope, retry = limiter.check(self.request('192.0.2.1'))
+        self.assertEqual(scope, 'ip')
+        self.assertGreaterEqual(retry, 1)
+
+        # Other clients have their own bucket
+        self.assertIsNone(limiter.check(self.request('192.0.2.2')))
+
+    def test_forwarded_for_ignored_without_trusted_proxy(self):
+        limiter = self.limiter()
+        for i in range(3):
+            limiter.check(self.request('192.0.2.1', forwarded='198.51.100.{0}'.format(i)))
+        self.assertIsNotNone(limiter.check(self.request('192.0.2.1', forwarded='198.51.100.9')))
+
+    def test_forwarded_for_from_trusted_proxy(self):
+        limiter = self.limiter(proxies=['10.0.0.1'])
+
+        # The client can't spoof earlier addresses added before the proxy
+        for i in range(3):
+            limiter.check(self.request('10.0.0.1', forwarded='203.0.113.{0}, 198.51.100.7'.format(i)))
+        self.assertEqual(limiter.check(self.request('10.0.0.1', forwarded='198.51.100.7'))[0], 'ip')
+        self.assertIsNone(limiter.check(self.request('10.0.0.1', forwarded='198.51.100.8')))
+
+    def test_user_limited_after_authentication(self):
+        limiter = self.limiter()
+        self.lense(user='alice', path='user')
+        for i in range(2):
+            limiter.check_user()
+        with self.assertRaises(RateLimited) as raised:
+            limiter.check_user()
+        self.assertEqual(raised.exception.code, 429)
+        self.assertGreaterEqual(raised.exception.retry, 1)
+
+        # Another user of the same group is not limited
+        self.lense(user='bob', path='user')
+        limiter.check_user()
+
+    def test_full_table_fails_open(self):
+        limiter = self.limiter(slots=1)
+        for i in range(3):
+            limiter.check(self.request('192.0.2.1'))
+
+        # No room for a second bucket, the client is not limited
+        for i in range(5):
+            self.assertIsNone(limiter.check(self.request('192.0.2.2')))
+        self.assertGreater(limiter.table.full, 0)
+
+    def test_non_positive_rate_rejected(self):
+        for rate in [0, -1, '1']:
+            with self.assertRaises(ImproperlyConfigured):
+                self.limiter(rules={'handlers': {'GET:user': {'ip': {'rate': rate, 'burst': 3}}}})
@@ -0,0 +1,53 @@
+from django.test import SimpleTestCase
+
+# Lense Libraries
+from lense.engine.api.core.tokens import StatelessToken
+from lense.engine.api.tests.base import EngineTestMixin
+
+class StatelessTokenTest(EngineTestMixin, SimpleTestCase):
+    """
+    Stateless token verification and revocation.
+    """
+    def setUp(self):
+        super(StatelessTokenTest, self).setUp()
+        with self.settings(API_TOKEN_REVOCATIONS=self.tmpfile('revocations.json'), API_TOKEN_LIFE=1):
+            self.tokens = StatelessToken()
+
+    def test_issued_token_verifies(self):
+        token  = self.tokens.issue('alice', 'admins')
+        claims = self.tokens.verify(token, 'alice', 'admins')
+        self.assertEqual(claims['u'], 'alice')
+        self.assertEqual(claims['g'], 'admins')
+
+    def test_token_bound_to_user_and_group(self):
+        token = self.tokens.issue('alice', 'admins')
+        self.assertIsNone(self.tokens.verify(token, 'bob', 'admins'))
+        self.assertIsNone(self.tokens.verify(token, 'alice', 'users'))
+
+    def test_tampered_token_rejected(self):
+        prefix, body, sig = self.tokens.issue('alice', 'admins').split('.')
+        other = self.tokens.issue('bob', 'admins').split('.')[1]
+        self.assertIsNone(self.tokens.verify('.'.join([prefix, other, sig]), 'bob', 'admins'))
+
+    def test_revoke_invalidates_outstanding_tokens(self):
+        token = self.tokens.issue('alice', 'admins')
+        self.tokens.revoke('alice')
+        self.assertIsNone(self.tokens.verify(token, 'alice', 'admins'))
+
+        # Tokens issued after the revocation are valid
+        self.assertIsNotNone(self.tokens.verify(self.tokens.issue('alice', 'admins'), 'alice', 'admins'))
+
+    def test_revoke_only_affects_user(self):
+        token = self.tokens.issue('bob', 'admins')
+        self.tokens.revoke('alice')
+        self.assertIsNotNone(self.tokens.verify(token, 'bob', 'admins'))
+
+    def test_revocation_seen_by_other_processes(self):
+        token = self.tokens.issue('alice', 'admins')
+        with self.settings(API_TOKEN_REVOCATIONS=self.tokens.revocations.store, API_TOKEN_LIFE=1):
+            other = StatelessToken()
+        other.revoke('alice')
+
+        # Force the next version check to stat the store
+        self.tokens.revocations._checked = 0
+        self.assertIsNone(self.tokens.verify(token, 'alice', 'admins'))